@@ -12,7 +12,7 @@ if [ "${APP_SERVICE}" = "web" ]
 elif [ "${APP_SERVICE}" = "rq" ]
   then
     cd /podcast/src && \
-    python -m rq_worker youtube_downloads --user podcast
+    python -m rq_worker
 
 elif [ "${APP_SERVICE}" = "test" ]
   then
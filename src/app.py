@@ -1,5 +1,6 @@
 import asyncio
 import logging
+from typing import Dict
 
 import aiohttp_i18n
 from redis import asyncio as aioredis
@@ -21,11 +22,14 @@ from sentry_sdk.integrations.logging import LoggingIntegration
 import settings
 import app_i18n
 from common import context_processors
+from common.cache import AsyncLRUCache
+from common.executors import shutdown_executors
 from common import jinja_filters
 from common.middlewares import request_user_middleware
 from common.jinja_template_tags import tags
 from common.models import database
 from common.utils import get_logger, database_init
+from modules.podcast.queues import get_queues
 
 logger = get_logger()
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
@@ -34,7 +38,8 @@ asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 class PodcastWebApp(web.Application):
     """Extended web Application for podcast-specific logic"""
 
-    rq_queue: rq.Queue = None
+    rq_queues: Dict[str, rq.Queue] = None
+    rss_cache: AsyncLRUCache = None
     objects: peewee_async.Manager = None
     redis_pool: aioredis.ConnectionPool = None
     gettext_translation: app_i18n.AioHttpGettextTranslations = None
@@ -44,6 +49,7 @@ async def shutdown_app(app):
     """Safe close server"""
     await app.redis_pool.disconnect()
     await app.objects.close()
+    shutdown_executors(wait=False)
 
 
 async def create_app() -> PodcastWebApp:
@@ -62,6 +68,7 @@ async def create_app() -> PodcastWebApp:
     app = PodcastWebApp(middlewares=middlewares, logger=logger, debug=settings.DEBUG)
     app.redis_pool = redis_pool
     app.gettext_translation = app_i18n.aiohttp_translations
+    app.rss_cache = AsyncLRUCache(max_size=settings.RSS_WEB_CACHE_SIZE)
     app.on_shutdown.append(shutdown_app)
 
     # db conn
@@ -98,11 +105,7 @@ async def create_app() -> PodcastWebApp:
     app.router.add_static("/static", settings.STATIC_PATH, name="static")
 
     app.logger = get_logger()
-    app.rq_queue = rq.Queue(
-        name="youtube_downloads",
-        connection=Redis(*settings.REDIS_CON),
-        default_timeout=settings.RQ_DEFAULT_TIMEOUT,
-    )
+    app.rq_queues = get_queues(connection=Redis(*settings.REDIS_CON))
 
     if settings.SENTRY_DSN:
         sentry_logging = LoggingIntegration(level=logging.INFO, event_level=logging.ERROR)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(NamedTuple):
+    version: Any
+    value: Any
+
+
+class SingleFlight:
+    """
+    In-process deduplication of concurrent async calls:
+    callers with the same key share result (or exception) of single call of the factory.
+    The call is performed by separate task: cancellation of any caller (even the first one)
+    doesn't cancel the call for other callers.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            task.add_done_callback(partial(self._on_done, key))
+            self._pending[key] = task
+        else:
+            logger.debug("Waiting for pending call %s", key)
+
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+
+        # exception is marked as retrieved: all callers could be cancelled already
+        if not task.cancelled():
+            task.exception()
+
+
+class AsyncLRUCache:
+    """
+    Bounded in-process LRU cache for async web handlers.
+    Entries are versioned: entry with outdated version is recreated on the next access.
+    Concurrent misses for the same key are collapsed into single call of the factory.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._creations = SingleFlight()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, version: Any = None):
+        self._entries[key] = CacheEntry(version=version, value=value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    async def get_or_create(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]], version: Any = None
+    ) -> Any:
+        """Get actual value from cache or create it by factory (single call for concurrent misses)"""
+
+        value = self.get(key, version)
+        if value is not None:
+            return value
+
+        async def create() -> Any:
+            created_value = await factory()
+            self.set(key, created_value, version)
+            return created_value
+
+        return await self._creations.run((key, version), create)
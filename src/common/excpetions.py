@@ -37,6 +37,14 @@ class YoutubeFetchError(Exception):
     ...
 
 
+class NotEnoughScratchSpaceError(Exception):
+    ...
+
+
+class StorageUploadError(Exception):
+    ...
+
+
 class SendRequestError(BaseApplicationError):
     status_code = 503
     message = "Got unexpected error for sending request"
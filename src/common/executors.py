@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+import settings
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+EXECUTOR_EXTRACTION = "extraction"  # yt-dlp's info extraction (slowest calls, seconds)
+EXECUTOR_STORAGE = "storage"  # S3 requests
+EXECUTOR_QUEUE = "queue"  # enqueueing of rq jobs
+EXECUTOR_REDIS = "redis"  # sync redis client calls
+EXECUTOR_RENDER = "render"  # rendering of templates (CPU-bound)
+
+
+class BoundedExecutor:
+    """
+    Named pool of threads for blocking calls from async code.
+    Each kind of work has own pool: slow calls of one kind can't starve calls of other kinds.
+    Keeps metrics of the pool: queue depth (calls which wait for free thread) and wait time.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def __str__(self):
+        return f"<BoundedExecutor {self.name} (max {self.max_workers} workers)>"
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # created lazily: threads aren't started in processes which don't use the executor
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"executor-{self.name}"
+                )
+            return self._executor
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run blocking func in the pool and wait for its result"""
+
+        submitted_at = time.monotonic()
+        with self._lock:
+            self._queued += 1
+
+        future = self.executor.submit(self._call, submitted_at, partial(func, *args, **kwargs))
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._running + self._completed
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "wait_time_avg": round(self._wait_time_total / started, 6) if started else 0.0,
+                "wait_time_max": round(self._wait_time_max, 6),
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor:
+            executor.shutdown(wait=wait)
+
+    def _call(self, submitted_at: float, func: Callable) -> Any:
+        wait_time = time.monotonic() - submitted_at
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_time_total += wait_time
+            self._wait_time_max = max(self._wait_time_max, wait_time)
+
+        if wait_time > settings.WEB_EXECUTOR_SLOW_WAIT:
+            logger.warning("%s: call %s waited for free thread %.3fs", self, func, wait_time)
+
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def _on_done(self, future: Future):
+        # call which was cancelled before its start leaves the queue without running
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """Get (or create) executor with size from settings.WEB_EXECUTORS"""
+
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = BoundedExecutor(name, max_workers=settings.WEB_EXECUTORS[name])
+        return _executors[name]
+
+
+async def run_in_executor(name: str, func: Callable, *args, **kwargs) -> Any:
+    return await get_executor(name).run(func, *args, **kwargs)
+
+
+def get_executors_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: get_executor(name).get_metrics() for name in settings.WEB_EXECUTORS}
+
+
+def shutdown_executors(wait: bool = True):
+    with _executors_lock:
+        executors = list(_executors.values())
+
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -1,7 +1,9 @@
-from typing import List
+import uuid
+from typing import List, Iterator
 
 import peewee
 import peewee_async
+from playhouse.postgres_ext import FetchManyCursor
 
 database = peewee_async.PostgresqlDatabase(None)
 
@@ -42,3 +44,22 @@ class BaseModel(peewee.Model):
 
     async def async_update(self, db_objects):
         return await db_objects.update(self)
+
+
+def iterate_server_side(query: peewee.ModelSelect, array_size: int = 1000) -> Iterator[BaseModel]:
+    """
+    Allows to iterate over query's results via postgres server-side (named) cursor.
+    Rows are fetched by chunks (array_size), so result isn't materialised in memory at once.
+    Named cursor lives inside transaction and is closed when iteration is finished (or stopped).
+    """
+    sql, params = query.sql()
+    model_database = query.model._meta.database
+    with model_database.atomic():
+        cursor = model_database.connection().cursor(name=f"cursor_{uuid.uuid4().hex}")
+        try:
+            cursor.execute(sql, params)
+            # peewee has no public API for wrapping of raw cursor (playhouse's ServerSide does so)
+            cursor_wrapper = query._get_cursor_wrapper(FetchManyCursor(cursor, array_size))
+            yield from cursor_wrapper.iterator()
+        finally:
+            cursor.close()
@@ -1,11 +1,13 @@
-import asyncio
 import json
 import os
 import logging
-from functools import partial
-from typing import Iterable, Any, Dict, Union, List
+import threading
+from typing import Iterable, Any, Dict, Union, List, Optional
 
 import redis
+from redis.exceptions import LockError
+
+from common.executors import run_in_executor, EXECUTOR_REDIS
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = os.getenv("REDIS_PORT", "6379")
@@ -28,6 +30,39 @@ class RedisClient:
     def set(self, key: str, value, ttl: int = 120):
         self.redis.set(key, json.dumps(value), ttl)
 
+    def set_many(self, items: Dict[str, Any], ttl: int = 120):
+        """Allows to set several values to redis for 1 request (via pipeline)"""
+        pipeline = self.redis.pipeline()
+        for key, value in items.items():
+            pipeline.set(key, json.dumps(value), ttl)
+        pipeline.execute()
+
+    def set_nx(self, key: str, value, ttl: int = 120) -> bool:
+        """Allows to set value only if key doesn't exist yet (returns True if value was set)"""
+        return bool(self.redis.set(key, json.dumps(value), ttl, nx=True))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.redis.incr(key, amount)
+
+    def hset(self, key: str, field: str, value, ttl: int = 120):
+        """Allows to set value of hash's field (ttl is applied to the whole hash)"""
+        pipeline = self.redis.pipeline()
+        pipeline.hset(key, field, json.dumps(value))
+        pipeline.expire(key, ttl)
+        pipeline.execute()
+
+    def hgetall(self, key: str) -> Dict[str, Any]:
+        return {
+            field.decode(): json.loads(value) for field, value in self.redis.hgetall(key).items()
+        }
+
+    def delete(self, *keys: str):
+        if keys:
+            self.redis.delete(*keys)
+
+    def lease_lock(self, key: str, ttl: int = 60) -> "LeaseLock":
+        return LeaseLock(self.redis, key, ttl=ttl)
+
     def get(self, key: str) -> Union[List[Any], Dict[str, Any]]:
         return json.loads(self.redis.get(key) or "null")
 
@@ -49,11 +84,77 @@ class RedisClient:
 
         return result
 
+    async def async_get(self, key: str) -> Union[List[Any], Dict[str, Any]]:
+        return await run_in_executor(EXECUTOR_REDIS, self.get, key)
+
+    async def async_set(self, key: str, value, ttl: int = 120):
+        await run_in_executor(EXECUTOR_REDIS, self.set, key, value, ttl=ttl)
+
+    async def async_set_many(self, items: Dict[str, Any], ttl: int = 120):
+        await run_in_executor(EXECUTOR_REDIS, self.set_many, items, ttl=ttl)
+
     async def async_get_many(self, keys: Iterable[str], pkey: str) -> dict:
-        loop = asyncio.get_running_loop()
-        get_many_handler = partial(self.get_many, keys, pkey=pkey)
-        return await loop.run_in_executor(None, get_many_handler)
+        return await run_in_executor(EXECUTOR_REDIS, self.get_many, keys, pkey=pkey)
 
     @staticmethod
     def get_key_by_filename(filename) -> str:
         return filename.partition(".")[0]
+
+
+class LeaseLock:
+    """
+    Redis-backed lease lock: lock expires after `ttl` seconds if its holder died,
+    alive holder renews the lease by heartbeat (background thread) until lock is released.
+    """
+
+    def __init__(self, redis_client: redis.Redis, key: str, ttl: int = 60):
+        self.key = key
+        self.ttl = ttl
+        self.heartbeat_interval = ttl / 3
+        self.lost = threading.Event()
+        self._lock = redis_client.lock(key, timeout=ttl, thread_local=False)
+        self._stopped = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "LeaseLock":
+        self.acquire(blocking=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def acquire(self, blocking: bool = False) -> bool:
+        """Try to take the lock (returns False if it is held by somebody else)"""
+        if not self._lock.acquire(blocking=blocking):
+            return False
+
+        self._stopped.clear()
+        self.lost.clear()
+        self._heartbeat = threading.Thread(
+            target=self._renew, name=f"lease:{self.key}", daemon=True
+        )
+        self._heartbeat.start()
+        logger.debug("Lease lock %s acquired (ttl %is)", self.key, self.ttl)
+        return True
+
+    def release(self):
+        self._stopped.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+        try:
+            self._lock.release()
+        except LockError as error:
+            logger.warning("Lease lock %s was already expired: %r", self.key, error)
+        else:
+            logger.debug("Lease lock %s released", self.key)
+
+    def _renew(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self._lock.reacquire()
+            except LockError as error:
+                logger.error("Lease lock %s was lost: %r", self.key, error)
+                self.lost.set()
+                return
@@ -1,19 +1,120 @@
-import asyncio
+import io
 import logging
 import mimetypes
 import os
-from functools import partial
-from typing import Callable, List, Optional, Tuple
+import threading
+import zlib
+from typing import Callable, List, Optional, Tuple, Iterable, Union, BinaryIO, NamedTuple, Iterator
 from urllib.parse import urljoin
 
 import boto3
 import botocore
+from boto3.s3.transfer import TransferConfig
 
 import settings
+from common.executors import run_in_executor, EXECUTOR_STORAGE
 
 logger = logging.getLogger(__name__)
 
 
+class ObjectPolicy(NamedTuple):
+    """Metadata policy for uploaded objects of specific type"""
+
+    cache_control: Optional[str] = None
+    content_type: Optional[str] = None
+    gzip: bool = False
+
+
+OBJECT_POLICIES = {
+    "audio": ObjectPolicy(cache_control=settings.S3_CACHE_CONTROL_AUDIO),
+    "rss": ObjectPolicy(cache_control=settings.S3_CACHE_CONTROL_RSS, gzip=settings.S3_GZIP_RSS),
+}
+
+
+def gzip_chunks(fileobj: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Allows to compress (gzip) content of file-like object chunk by chunk"""
+
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    while chunk := fileobj.read(chunk_size):
+        yield compressor.compress(chunk)
+
+    yield compressor.flush()
+
+
+def get_transfer_config(**overrides) -> TransferConfig:
+    """
+    Configuration of (multipart) transfers by settings (S3_MULTIPART_*, S3_MAX_*).
+    Any TransferConfig's option can be overridden for specific call.
+    """
+
+    options = {
+        "multipart_threshold": settings.S3_MULTIPART_THRESHOLD,
+        "multipart_chunksize": settings.S3_MULTIPART_CHUNK_SIZE,
+        "max_concurrency": settings.S3_MAX_CONCURRENCY,
+        "max_bandwidth": settings.S3_MAX_BANDWIDTH or None,
+    }
+    options.update(overrides)
+    return TransferConfig(**options)
+
+
+class BatchedCallback:
+    """
+    Progress callback which is called with accumulated bytes (at least `min_bytes` per call)
+    instead of each small chunk. Transfers call it from several threads, so it is thread-safe.
+    """
+
+    def __init__(self, callback: Callable[[int], None], min_bytes: int):
+        self.callback = callback
+        self.min_bytes = min_bytes
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk: int):
+        with self._lock:
+            self._pending += chunk
+            if self._pending < self.min_bytes:
+                return
+
+            pending, self._pending = self._pending, 0
+
+        self.callback(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, 0
+
+        if pending:
+            self.callback(pending)
+
+
+class IterableReader(io.RawIOBase):
+    """
+    Readable file-like object over iterable of str/bytes chunks
+    (allows to upload generated content without writing it to the local file).
+    """
+
+    def __init__(self, chunks: Iterable[Union[str, bytes]], encoding: str = "utf-8"):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._encoding = encoding
+        self._buffer = bytearray()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while len(self._buffer) < len(buffer):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk.encode(self._encoding) if isinstance(chunk, str) else chunk
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        return size
+
+
 class StorageS3:
     """Simple client (singleton) for access to S3 bucket"""
 
@@ -30,6 +131,10 @@ class StorageS3:
         return cls.__instance
 
     def __init__(self):
+        if getattr(self, "s3", None):
+            # singleton's client is already initialized (it is reused by all callers)
+            return
+
         logger.debug("Creating s3 client's session (boto3)...")
         session = boto3.session.Session(
             aws_access_key_id=settings.S3_AWS_ACCESS_KEY_ID,
@@ -66,6 +171,12 @@ class StorageS3:
 
         return self.CODE_OK, response
 
+    @staticmethod
+    def get_file_url(filename: str, remote_path: str = settings.S3_BUCKET_AUDIO_PATH) -> str:
+        """Public URL of file (which is uploaded or will be uploaded) on S3 storage"""
+        dst_path = os.path.join(remote_path, filename)
+        return urljoin(settings.S3_STORAGE_URL, os.path.join(settings.S3_BUCKET_NAME, dst_path))
+
     def head_file(
         self, filename: str, remote_path: str = settings.S3_BUCKET_AUDIO_PATH
     ) -> Optional[dict]:
@@ -79,28 +190,85 @@ class StorageS3:
         filename: str,
         callback: Callable = None,
         remote_path: str = settings.S3_BUCKET_AUDIO_PATH,
+        object_type: str = "audio",
+        transfer_config: TransferConfig = None,
     ) -> Optional[str]:
         """Upload file to S3 storage"""
 
-        mimetype, _ = mimetypes.guess_type(src_path)
+        if OBJECT_POLICIES[object_type].gzip:
+            with open(src_path, "rb") as fileobj:
+                return self.upload_fileobj(
+                    fileobj, filename, callback, remote_path, object_type, transfer_config
+                )
+
         dst_path = os.path.join(remote_path, filename)
+        callback = BatchedCallback(callback, settings.S3_CALLBACK_MIN_BYTES) if callback else None
         code, result = self.__call(
             self.s3.upload_file,
             Filename=src_path,
             Bucket=settings.S3_BUCKET_NAME,
             Key=dst_path,
             Callback=callback,
-            ExtraArgs={"ACL": "public-read", "ContentType": mimetype},
+            ExtraArgs=self._get_extra_args(src_path, object_type),
+            Config=transfer_config or get_transfer_config(),
         )
+        if callback:
+            callback.flush()
         if code != self.CODE_OK:
             return None
 
-        result_url = urljoin(
-            settings.S3_STORAGE_URL, os.path.join(settings.S3_BUCKET_NAME, dst_path)
+        result_url = self.get_file_url(filename, remote_path)
+        logger.info("File %s successful uploaded. Result URL: %s", filename, result_url)
+        return result_url
+
+    def upload_fileobj(
+        self,
+        fileobj: BinaryIO,
+        filename: str,
+        callback: Callable = None,
+        remote_path: str = settings.S3_BUCKET_AUDIO_PATH,
+        object_type: str = "audio",
+        transfer_config: TransferConfig = None,
+    ) -> Optional[str]:
+        """Upload content of readable file-like object to S3 storage (multipart if needed)"""
+
+        if OBJECT_POLICIES[object_type].gzip:
+            fileobj = IterableReader(gzip_chunks(fileobj))
+
+        dst_path = os.path.join(remote_path, filename)
+        callback = BatchedCallback(callback, settings.S3_CALLBACK_MIN_BYTES) if callback else None
+        code, result = self.__call(
+            self.s3.upload_fileobj,
+            Fileobj=fileobj,
+            Bucket=settings.S3_BUCKET_NAME,
+            Key=dst_path,
+            Callback=callback,
+            ExtraArgs=self._get_extra_args(filename, object_type),
+            Config=transfer_config or get_transfer_config(),
         )
+        if callback:
+            callback.flush()
+        if code != self.CODE_OK:
+            return None
+
+        result_url = self.get_file_url(filename, remote_path)
         logger.info("File %s successful uploaded. Result URL: %s", filename, result_url)
         return result_url
 
+    @staticmethod
+    def _get_extra_args(filename: str, object_type: str) -> dict:
+        """Headers (metadata) for uploaded object by policy of requested object's type"""
+
+        policy = OBJECT_POLICIES[object_type]
+        mimetype = policy.content_type or mimetypes.guess_type(filename)[0]
+        extra_args = {"ACL": "public-read", "ContentType": mimetype}
+        if policy.cache_control:
+            extra_args["CacheControl"] = policy.cache_control
+        if policy.gzip:
+            extra_args["ContentEncoding"] = "gzip"
+
+        return extra_args
+
     def get_file_info(
         self,
         filename: str,
@@ -144,15 +312,12 @@ class StorageS3:
     async def delete_files_async(
         self, filenames: List[str], remote_path: str = settings.S3_BUCKET_AUDIO_PATH
     ):
-        loop = asyncio.get_running_loop()
         for filename in filenames:
             dst_path = os.path.join(remote_path, filename)
-            await loop.run_in_executor(
-                None,
-                partial(
-                    self.__call,
-                    self.s3.delete_object,
-                    Key=dst_path,
-                    Bucket=self.BUCKET_NAME,
-                ),
+            await run_in_executor(
+                EXECUTOR_STORAGE,
+                self.__call,
+                self.s3.delete_object,
+                Key=dst_path,
+                Bucket=self.BUCKET_NAME,
             )
@@ -8,7 +8,9 @@ from typing import List
 import peewee_async
 from aiohttp import web
 
+from common.decorators import json_response, errors_api_wrapped, login_api_required
 from common.excpetions import InvalidParameterError
+from common.executors import get_executors_metrics
 from common.models import BaseModel
 
 
@@ -123,3 +125,13 @@ class BaseApiView(web.View):
             res[field] = value
 
         return res
+
+
+class ExecutorsMetricsApiView(web.View):
+    """Metrics of web app's executors for blocking calls (queue depth, wait time)"""
+
+    @json_response
+    @errors_api_wrapped
+    @login_api_required
+    async def get(self):
+        return get_executors_metrics(), 200
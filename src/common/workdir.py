@@ -0,0 +1,214 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, List, Optional, Set
+
+import settings
+from common.excpetions import NotEnoughScratchSpaceError
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+# tmp directories of processes contain PID of the owner (see settings.TMP_AUDIO_PATH)
+TMP_DIR_OWNER_PATTERN = re.compile(r"^podcast_[a-z]+__(?P<pid>\d+)_")
+
+
+class JobWorkDir:
+    """
+    Stable working directory of the job (it is kept between job's runs and worker's restarts).
+    Results of finished stages are stored with directory, so re-run of the job can skip them.
+    """
+
+    STAGES_FILE = "stages.json"
+
+    def __init__(self, name: str, root: str = None):
+        self.name = name
+        self.path = os.path.join(root or settings.WORK_DIR_ROOT, name)
+        os.makedirs(self.path, exist_ok=True)
+
+    @classmethod
+    def from_path(cls, path: str) -> "JobWorkDir":
+        return cls(os.path.basename(path), root=os.path.dirname(path))
+
+    def __str__(self):
+        return f"<JobWorkDir {self.path}>"
+
+    def file_path(self, filename: str) -> str:
+        return os.path.join(self.path, filename)
+
+    def is_done(self, stage: str) -> bool:
+        return stage in self._read_stages()
+
+    def get_result(self, stage: str) -> Optional[Any]:
+        return self._read_stages().get(stage)
+
+    def mark_done(self, stage: str, result: Any = True):
+        stages = self._read_stages()
+        stages[stage] = result
+        tmp_path = self.file_path(f"{self.STAGES_FILE}.tmp")
+        with open(tmp_path, "w") as fh:
+            json.dump(stages, fh)
+
+        # replacing is atomic: stages file is consistent even if worker is killed here
+        os.replace(tmp_path, self.file_path(self.STAGES_FILE))
+        logger.debug("%s: stage %s is done", self, stage)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        logger.debug("%s was removed", self)
+
+    def _read_stages(self) -> dict:
+        try:
+            with open(self.file_path(self.STAGES_FILE)) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except ValueError as error:
+            logger.warning("%s: stages file is broken (%r). All stages will be re-run", self, error)
+            return {}
+
+
+class ScratchSpace:
+    """
+    Manager of worker's scratch space (root for temporary files and work dirs of all jobs).
+    Root is configurable (settings.SCRATCH_ROOT), so it can be placed on tmpfs or fast SSD.
+    """
+
+    def __init__(self, root: str = None, jobs_root: str = None):
+        self.root = root or settings.SCRATCH_ROOT
+        self.jobs_root = jobs_root or settings.WORK_DIR_ROOT
+
+    def job_dir(self, name: str) -> JobWorkDir:
+        return JobWorkDir(name, root=self.jobs_root)
+
+    def admit(self, required_bytes: int):
+        """Check that job with estimated size can be placed (minimal free space is reserved)"""
+
+        os.makedirs(self.jobs_root, exist_ok=True)
+        free_bytes = shutil.disk_usage(self.jobs_root).free
+        if free_bytes - required_bytes < settings.SCRATCH_MIN_FREE_BYTES:
+            raise NotEnoughScratchSpaceError(
+                f"Not enough scratch space in {self.jobs_root}: required {required_bytes} bytes, "
+                f"free {free_bytes} bytes (reserved {settings.SCRATCH_MIN_FREE_BYTES} bytes)"
+            )
+
+    def sweep(self, ttl: int = None) -> int:
+        """
+        Remove orphaned files (left by failed jobs or dead processes) which weren't changed
+        for `ttl` seconds: whole work dirs of jobs and single files from other directories.
+        Empty tmp directories of dead processes (podcast_audio__<pid>_*, etc.) are removed too
+        (directories of running processes are kept even if they weren't changed).
+        :return: count of removed work dirs, files and tmp directories
+        """
+
+        deadline = time.time() - (ttl or settings.SCRATCH_ORPHAN_TTL)
+        removed = 0
+        # own tmp dirs are kept and touched: sweepers of other processes see them as alive
+        own_dirs = {settings.TMP_AUDIO_PATH, settings.TMP_RSS_PATH, settings.TMP_IMAGE_PATH}
+        for own_dir in own_dirs:
+            if os.path.isdir(own_dir):
+                os.utime(own_dir)
+
+        # modification time is taken before files' removing (it updates time of directory)
+        stale_dirs = self._get_stale_tmp_dirs(deadline, keep=own_dirs)
+        if os.path.isdir(self.jobs_root):
+            for entry in os.scandir(self.jobs_root):
+                if entry.is_dir() and self._last_modified(entry.path) < deadline:
+                    logger.info("Scratch space: removing orphaned work dir %s", entry.path)
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            dir_names[:] = [
+                dir_name
+                for dir_name in dir_names
+                if os.path.join(dir_path, dir_name) != self.jobs_root
+            ]
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    if os.path.getmtime(file_path) < deadline:
+                        logger.info("Scratch space: removing orphaned file %s", file_path)
+                        os.remove(file_path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+
+        for dir_path in stale_dirs:
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                continue  # directory isn't empty (or was removed already)
+
+            logger.info("Scratch space: orphaned tmp directory %s was removed", dir_path)
+            removed += 1
+
+        logger.info("Scratch space %s was swept: %i items removed", self.root, removed)
+        return removed
+
+    def start_sweeper(self, interval: int = None) -> threading.Thread:
+        """Run sweeping periodically in background (daemon) thread"""
+
+        interval = interval or settings.SCRATCH_SWEEP_INTERVAL
+
+        def sweep_periodically():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as error:
+                    logger.exception("Scratch space: sweeping failed: %r", error)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=sweep_periodically, name="scratch-sweeper", daemon=True)
+        thread.start()
+        return thread
+
+    def _get_stale_tmp_dirs(self, deadline: float, keep: Set[str]) -> List[str]:
+        """Tmp directories of processes (in the root of scratch space) which weren't changed"""
+
+        if not os.path.isdir(self.root):
+            return []
+
+        return [
+            entry.path
+            for entry in os.scandir(self.root)
+            if entry.is_dir()
+            and entry.path != self.jobs_root
+            and entry.path not in keep
+            and entry.stat().st_mtime < deadline
+            and not self._is_owner_alive(entry.name)
+        ]
+
+    @staticmethod
+    def _is_owner_alive(dir_name: str) -> bool:
+        """Check that process (PID from tmp directory's name) is still running on this host"""
+
+        match = TMP_DIR_OWNER_PATTERN.match(dir_name)
+        if not match:
+            return False  # owner is unknown: directory is removed by its age only
+
+        try:
+            os.kill(int(match.group("pid")), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # process exists, but it is owned by another user
+
+        return True
+
+    @staticmethod
+    def _last_modified(path: str) -> float:
+        """Time of the newest change inside of the directory"""
+
+        last_modified = os.path.getmtime(path)
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                try:
+                    file_modified = os.path.getmtime(os.path.join(dir_path, file_name))
+                except FileNotFoundError:
+                    continue
+                last_modified = max(last_modified, file_modified)
+
+        return last_modified
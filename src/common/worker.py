@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from rq import Worker, Queue
+from rq.job import Job
+from rq.timeouts import TimerDeathPenalty
+from rq.utils import utcnow
+
+import settings
+from common.models import database
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+SLOT_WAIT_INTERVAL = 5  # seconds between worker's heartbeats during waiting for free slot
+_stage_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_stage_semaphores_lock = threading.Lock()
+
+
+def parse_weighted_queues(queues: Iterable[str]) -> Dict[str, int]:
+    """
+    Allows to parse queues definition like ["rss:5", "downloads:2", "maintenance"]
+    :return: weights of queues (1 by default)
+    """
+
+    weighted_queues = {}
+    for queue in queues:
+        name, _, weight = queue.strip().partition(":")
+        if name:
+            weighted_queues[name] = max(int(weight or 1), 1)
+
+    return weighted_queues
+
+
+def _get_stage_semaphore(stage: str) -> threading.BoundedSemaphore:
+    with _stage_semaphores_lock:
+        if stage not in _stage_semaphores:
+            limit = settings.WORKER_STAGE_CONCURRENCY.get(stage) or 1
+            _stage_semaphores[stage] = threading.BoundedSemaphore(limit)
+
+        return _stage_semaphores[stage]
+
+
+@contextmanager
+def stage_slot(stage: str):
+    """
+    Allows to limit count of jobs (running in the same process) which perform
+    requested stage at once (e.g. CPU-bound ffmpeg is limited by count of cores)
+    """
+
+    semaphore = _get_stage_semaphore(stage)
+    if not semaphore.acquire(blocking=False):
+        start_time = time.monotonic()
+        semaphore.acquire()
+        logger.info("Stage %s: slot was acquired in %.3fs", stage, time.monotonic() - start_time)
+
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+class WeightedWorker(Worker):
+    """
+    RQ worker which checks its queues in weighted random order (instead of strict one):
+    queue with bigger weight is checked first more often, but other queues aren't starved.
+    """
+
+    def __init__(self, queues, *args, weights: Dict[str, int] = None, **kwargs):
+        super().__init__(queues, *args, **kwargs)
+        self.weights = weights or {}
+        self.reorder_queues(reference_queue=None)
+
+    def reorder_queues(self, reference_queue: Queue):
+        # weighted random sampling without replacement (Efraimidis-Spirakis)
+        keys = {
+            queue.name: random.random() ** (1 / self.weights.get(queue.name, 1))
+            for queue in self.queues
+        }
+        self._ordered_queues = sorted(self.queues, key=lambda queue: keys[queue.name], reverse=True)
+
+
+class ConcurrentWorker(WeightedWorker):
+    """
+    RQ worker which performs up to `concurrency` jobs at once (in threads of the same process).
+    The next job is dequeued only if there is a free slot, heavy stages of jobs are limited
+    separately (see `stage_slot`).
+
+    There is no work horse which is monitored by the worker: each running job renews its own
+    heartbeat (see `_maintain_job_heartbeat`). Worker's `current_job` (shared by all threads)
+    shows the most recent of running jobs.
+    """
+
+    # signal-based death penalty (SIGALRM) can be used in the main thread only
+    death_penalty_class = TimerDeathPenalty
+
+    def __init__(self, queues, *args, concurrency: int = 1, **kwargs):
+        super().__init__(queues, *args, **kwargs)
+        self.concurrency = concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rq-job")
+        self._running_jobs: Dict[int, str] = {}  # thread's ident -> ID of job which it performs
+        self._running_jobs_lock = threading.Lock()
+
+    def dequeue_job_and_maintain_ttl(
+        self, timeout: Optional[int], max_idle_time: Optional[int] = None
+    ) -> Optional[Tuple[Job, Queue]]:
+        while not self._slots.acquire(timeout=SLOT_WAIT_INTERVAL):
+            self.heartbeat()
+            if self._stop_requested:
+                return None
+
+        try:
+            result = super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        if result is None:
+            self._slots.release()
+
+        return result
+
+    def execute_job(self, job: Job, queue: Queue):
+        self._executor.submit(self._perform_job_in_slot, job, queue)
+
+    def teardown(self):
+        logger.info("Worker %s: waiting for running jobs...", self.key)
+        self._executor.shutdown(wait=True)
+        super().teardown()
+
+    def set_current_job_id(self, job_id: Optional[str] = None, pipeline=None):
+        # rq resets current job (job_id=None) after each job: another running job is kept instead
+        with self._running_jobs_lock:
+            if job_id is None:
+                self._running_jobs.pop(threading.get_ident(), None)
+                job_id = next(reversed(self._running_jobs.values()), None)
+            else:
+                self._running_jobs[threading.get_ident()] = job_id
+
+        super().set_current_job_id(job_id, pipeline=pipeline)
+
+    def _perform_job_in_slot(self, job: Job, queue: Queue):
+        finished = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=self._maintain_job_heartbeat, args=(job, finished), daemon=True
+        )
+        heartbeat_thread.start()
+        try:
+            with database.connection_context():
+                self.perform_job(job, queue)
+        except Exception as error:
+            logger.exception("Worker %s: job %s couldn't be performed: %r", self.key, job.id, error)
+        finally:
+            finished.set()
+            heartbeat_thread.join()
+            self._slots.release()
+
+    def _maintain_job_heartbeat(self, job: Job, finished: threading.Event):
+        """
+        Renews heartbeat of running job (like rq's `maintain_heartbeats` for work horse):
+        job without heartbeat is removed from StartedJobRegistry as abandoned one.
+        """
+
+        ttl = self.job_monitoring_interval + 60
+        while not finished.wait(self.job_monitoring_interval):
+            try:
+                with self.connection.pipeline() as pipeline:
+                    job.heartbeat(utcnow(), ttl, pipeline=pipeline, xx=True)
+                    results = pipeline.execute()
+
+                # hash of finished job (with result_ttl=0) was recreated by heartbeat
+                if results[0] == 1:
+                    self.connection.delete(job.key)
+            except Exception as error:
+                logger.warning("Worker %s: job %s heartbeat failed: %r", self.key, job.id, error)
@@ -1,25 +1,21 @@
 import argparse
 
-import rq
 from redis import Redis
 
 import settings
-from modules.podcast import tasks
+from modules.podcast import tasks, queues
 
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("task_name", choices=["regenerate_rss"])
+    p.add_argument("task_name", choices=["regenerate_rss", "retry_failed_downloads"])
     args = p.parse_args()
     print(
         f" ===== Run task {args.task_name} ===== ",
     )
-    rq_queue = rq.Queue(
-        name="youtube_downloads",
-        connection=Redis(*settings.REDIS_CON),
-        default_timeout=settings.RQ_DEFAULT_TIMEOUT,
-    )
-    rq_queue.enqueue(getattr(tasks, args.task_name))
+    task = getattr(tasks, args.task_name)
+    rq_queue = queues.get_queue(queues.route_task(task), connection=Redis(*settings.REDIS_CON))
+    rq_queue.enqueue(task)
 
 
 if __name__ == "__main__":
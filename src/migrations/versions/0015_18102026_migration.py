@@ -0,0 +1,26 @@
+""" 
+Created_at: 18 Oct. 2026 09:12:40
+Target: PODCASTS: add column rss_digest
+
+"""
+
+from playhouse.migrate import *
+from migrations.models import database
+
+previous = "0014_08062020_migration"
+
+# see details http://docs.peewee-orm.com/en/latest/peewee/playhouse.html#schema-migrations
+
+
+def upgrade():
+    migrator = PostgresqlMigrator(database)    
+    migrate(
+        migrator.add_column("podcast_podcasts", "rss_digest", CharField(max_length=64, null=True)),
+    )
+
+
+def downgrade():
+    migrator = PostgresqlMigrator(database)    
+    migrate(
+        migrator.drop_column("podcast_podcasts", "rss_digest"),
+    )
@@ -0,0 +1,58 @@
+""" 
+Created_at: 18 Oct. 2026 11:40:05
+Target: PODCASTS: add column rss_max_items | create feed archive pages
+
+"""
+from datetime import datetime
+
+import peewee
+from playhouse.migrate import PostgresqlMigrator, migrate
+
+from common.models import database, BaseModel
+from common.utils import database_init
+from migrations.utils import create_tables, remove_tables
+
+previous = "0015_18102026_migration"
+
+
+class Podcast(BaseModel):
+    ...
+
+    class Meta:
+        db_table = "podcast_podcasts"
+
+
+class FeedArchivePage(BaseModel):
+    """ Paged archive of podcast's RSS (RFC 5005) with older episodes """
+
+    podcast = peewee.ForeignKeyField(Podcast, on_delete="CASCADE")
+    page = peewee.IntegerField(null=False)
+    digest = peewee.CharField(max_length=64, null=False)
+    items_count = peewee.IntegerField(null=False, default=0)
+    rss_link = peewee.CharField(max_length=256, null=True)
+    updated_at = peewee.DateTimeField(default=datetime.utcnow, null=False)
+
+    class Meta:
+        db_table = "podcast_feed_archive_pages"
+        indexes = ((("podcast", "page"), True),)
+
+
+models = [FeedArchivePage]
+
+
+def upgrade():
+    database_init(database)
+    migrator = PostgresqlMigrator(database)
+    migrate(
+        migrator.add_column("podcast_podcasts", "rss_max_items", peewee.IntegerField(null=True)),
+    )
+    create_tables(models)
+
+
+def downgrade():
+    database_init(database)
+    remove_tables(models)
+    migrator = PostgresqlMigrator(database)
+    migrate(
+        migrator.drop_column("podcast_podcasts", "rss_max_items"),
+    )
@@ -0,0 +1,26 @@
+""" 
+Created_at: 18 Oct. 2026 14:05:17
+Target: PODCASTS: add column rss_published_at
+
+"""
+
+from playhouse.migrate import *
+from migrations.models import database
+
+previous = "0016_18102026_migration"
+
+# see details http://docs.peewee-orm.com/en/latest/peewee/playhouse.html#schema-migrations
+
+
+def upgrade():
+    migrator = PostgresqlMigrator(database)    
+    migrate(
+        migrator.add_column("podcast_podcasts", "rss_published_at", DateTimeField(null=True)),
+    )
+
+
+def downgrade():
+    migrator = PostgresqlMigrator(database)    
+    migrate(
+        migrator.drop_column("podcast_podcasts", "rss_published_at"),
+    )
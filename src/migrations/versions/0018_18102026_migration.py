@@ -0,0 +1,59 @@
+"""
+Created_at: 18 Oct. 2026 16:22:48
+Target: PODCASTS: create media files registry (filled from existing episodes)
+
+"""
+from datetime import datetime
+
+import peewee
+
+from common.models import database, BaseModel
+from common.utils import database_init
+from migrations.utils import create_tables, remove_tables
+
+previous = "0017_18102026_migration"
+
+
+class MediaFile(BaseModel):
+    """ Registry of media files (shared by all episodes with the same source_id) """
+
+    source_id = peewee.CharField(unique=True, index=True, max_length=32, null=False)
+    file_name = peewee.CharField(max_length=128, null=False)
+    remote_url = peewee.CharField(max_length=128, null=True)
+    size = peewee.IntegerField(null=False, default=0)
+    checksum = peewee.CharField(max_length=64, null=True)
+    ref_count = peewee.IntegerField(null=False, default=0)
+    created_at = peewee.DateTimeField(default=datetime.utcnow, null=False)
+    updated_at = peewee.DateTimeField(default=datetime.utcnow, null=False)
+
+    class Meta:
+        db_table = "podcast_media_files"
+
+
+models = [MediaFile]
+
+FILL_MEDIA_FILES_SQL = """
+    INSERT INTO podcast_media_files
+        (source_id, file_name, remote_url, size, ref_count, created_at, updated_at)
+    SELECT
+        source_id,
+        COALESCE(MAX(file_name), ''),
+        MAX(remote_url) FILTER (WHERE status = 'published'),
+        COALESCE(MAX(file_size) FILTER (WHERE status = 'published'), 0),
+        COUNT(id),
+        NOW(),
+        NOW()
+    FROM podcast_episodes
+    GROUP BY source_id
+"""
+
+
+def upgrade():
+    database_init(database)
+    create_tables(models)
+    database.execute_sql(FILL_MEDIA_FILES_SQL)
+
+
+def downgrade():
+    database_init(database)
+    remove_tables(models)
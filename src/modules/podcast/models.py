@@ -1,4 +1,5 @@
 import uuid
+from typing import Dict, List, Optional
 from _md5 import md5
 from urllib.parse import urljoin
 from xml.sax.saxutils import escape
@@ -28,6 +29,9 @@ class Podcast(BaseModel):
     created_by = peewee.ForeignKeyField(User, related_name="podcasts")
     download_automatically = peewee.BooleanField(default=True)
     rss_link = peewee.CharField(max_length=128, null=True)
+    rss_digest = peewee.CharField(max_length=64, null=True)
+    rss_published_at = peewee.DateTimeField(null=True)
+    rss_max_items = peewee.IntegerField(null=True)
     image_url = peewee.CharField(max_length=512, null=True)
 
     class Meta:
@@ -44,6 +48,13 @@ class Podcast(BaseModel):
             image_url = urljoin(settings.S3_STORAGE_URL, settings.S3_DEFAULT_PODCAST_IMAGE)
         return image_url
 
+    @property
+    def safe_rss_max_items(self) -> int:
+        """Max count of items in the main RSS feed (0 - unlimited)"""
+        if self.rss_max_items is None:
+            return settings.RSS_MAX_ITEMS
+        return self.rss_max_items
+
     @classmethod
     async def get_all(cls, objects, request_user_id):
         """Return all podcasts"""
@@ -140,3 +151,108 @@ class Episode(BaseModel):
     def content_type(self) -> str:
         file_name = self.file_name or "unknown"
         return f"audio/{file_name.split('.')[-1]}"
+
+
+class MediaFile(BaseModel):
+    """
+    Registry of media files: the file of source is shared by all episodes with the same source_id.
+    ref_count is count of episodes which use the file (the file can be removed after the last one)
+    """
+
+    source_id = peewee.CharField(unique=True, index=True, max_length=32, null=False)
+    file_name = peewee.CharField(max_length=128, null=False)
+    remote_url = peewee.CharField(max_length=128, null=True)
+    size = peewee.IntegerField(null=False, default=0)
+    checksum = peewee.CharField(max_length=64, null=True)
+    ref_count = peewee.IntegerField(null=False, default=0)
+    created_at = peewee.DateTimeField(default=datetime.utcnow, null=False)
+    updated_at = peewee.DateTimeField(default=datetime.utcnow, null=False)
+
+    class Meta:
+        db_table = "podcast_media_files"
+
+    def __str__(self):
+        return f"<MediaFile {self.source_id} {self.file_name} refs: {self.ref_count}>"
+
+    @property
+    def is_uploaded(self) -> bool:
+        return bool(self.remote_url and self.size)
+
+    @classmethod
+    def register_query(cls, source_id: str, file_name: str, count: int = 1) -> peewee.Query:
+        """Add references to the source's file (registry record is created for the first one)"""
+        return cls.register_many_query({source_id: file_name}, count=count)
+
+    @classmethod
+    def register_many_query(cls, file_names: Dict[str, str], count: int = 1) -> peewee.Query:
+        """Add references to the files of several sources by single query ({source_id: file_name})"""
+        rows = [
+            {"source_id": source_id, "file_name": file_name, "ref_count": count}
+            for source_id, file_name in file_names.items()
+        ]
+        return cls.insert_many(rows).on_conflict(
+            conflict_target=[cls.source_id],
+            update={
+                cls.ref_count: cls.ref_count + peewee.EXCLUDED.ref_count,
+                cls.updated_at: datetime.utcnow(),
+            },
+        )
+
+    @classmethod
+    def release_query(cls, source_ids: List[str], count: int = 1) -> peewee.Query:
+        """Remove references (`count` for each of sources) to the files"""
+        return cls.update(
+            ref_count=peewee.fn.GREATEST(cls.ref_count - count, 0), updated_at=datetime.utcnow()
+        ).where(cls.source_id.in_(source_ids))
+
+    @classmethod
+    def delete_unused_query(cls, source_ids: List[str]) -> peewee.Query:
+        """Remove records of files without references (returns file names for removing)"""
+        return (
+            cls.delete()
+            .where(cls.source_id.in_(source_ids), cls.ref_count <= 0)
+            .returning(cls.file_name)
+        )
+
+    @classmethod
+    def store_query(
+        cls, source_id: str, file_name: str, remote_url: str, size: int, checksum: Optional[str]
+    ) -> peewee.Query:
+        """Save uploaded file (registry record is created with count of source's episodes)"""
+        file_data = {
+            cls.file_name: file_name,
+            cls.remote_url: remote_url,
+            cls.size: size,
+            cls.checksum: checksum,
+        }
+        ref_count = Episode.select(peewee.fn.COUNT(Episode.id)).where(
+            Episode.source_id == source_id
+        )
+        insert_data = {cls.source_id: source_id, cls.ref_count: ref_count, **file_data}
+        return cls.insert(insert_data).on_conflict(
+            conflict_target=[cls.source_id],
+            update={**file_data, cls.updated_at: datetime.utcnow()},
+        )
+
+
+class FeedArchivePage(BaseModel):
+    """Paged archive of podcast's RSS (RFC 5005) with older episodes"""
+
+    podcast = peewee.ForeignKeyField(Podcast, related_name="archive_pages", on_delete="CASCADE")
+    page = peewee.IntegerField(null=False)
+    digest = peewee.CharField(max_length=64, null=False)
+    items_count = peewee.IntegerField(null=False, default=0)
+    rss_link = peewee.CharField(max_length=256, null=True)
+    updated_at = peewee.DateTimeField(default=datetime.utcnow, null=False)
+
+    class Meta:
+        order_by = ("page",)
+        db_table = "podcast_feed_archive_pages"
+        indexes = ((("podcast", "page"), True),)
+
+    def __str__(self):
+        return f"<FeedArchivePage #{self.id} podcast #{self.podcast_id} page {self.page}>"
+
+    @staticmethod
+    def get_file_name(publish_id: str, page: int) -> str:
+        return f"{publish_id}-archive-{page}.xml"
@@ -0,0 +1,50 @@
+from typing import Callable, Dict, Optional
+
+import rq
+from redis import Redis
+
+import settings
+
+QUEUE_NAMES = (
+    settings.RQ_QUEUE_RSS,
+    settings.RQ_QUEUE_DOWNLOADS,
+    settings.RQ_QUEUE_LONG_DOWNLOADS,
+    settings.RQ_QUEUE_MAINTENANCE,
+    settings.RQ_QUEUE_FETCH,
+    settings.RQ_QUEUE_PREPARATION,
+    settings.RQ_QUEUE_PUBLISH,
+    settings.RQ_QUEUE_FEED,
+)
+TASK_ROUTES = {
+    "generate_rss": settings.RQ_QUEUE_RSS,
+    "generate_rss_batch": settings.RQ_QUEUE_RSS,
+    "regenerate_rss": settings.RQ_QUEUE_MAINTENANCE,
+    "retry_failed_downloads": settings.RQ_QUEUE_MAINTENANCE,
+    "download_episode": settings.RQ_QUEUE_LONG_DOWNLOADS,
+    "fetch_episode": settings.RQ_QUEUE_FETCH,
+    "prepare_episode": settings.RQ_QUEUE_PREPARATION,
+    "publish_episode": settings.RQ_QUEUE_PUBLISH,
+    "feed_episode": settings.RQ_QUEUE_FEED,
+}
+
+
+def get_queue(name: str, connection: Redis) -> rq.Queue:
+    return rq.Queue(name=name, connection=connection, default_timeout=settings.RQ_DEFAULT_TIMEOUT)
+
+
+def get_queues(connection: Redis) -> Dict[str, rq.Queue]:
+    return {name: get_queue(name, connection) for name in QUEUE_NAMES}
+
+
+def get_download_queue_name(episode_length: Optional[int]) -> str:
+    """Short episodes are downloaded ahead of long ones (unknown length is treated as long)"""
+
+    if episode_length and episode_length <= settings.RQ_SHORT_DOWNLOAD_MAX_LENGTH:
+        return settings.RQ_QUEUE_DOWNLOADS
+
+    return settings.RQ_QUEUE_LONG_DOWNLOADS
+
+
+def route_task(task: Callable) -> str:
+    """Name of queue for requested task (by task's name)"""
+    return TASK_ROUTES.get(task.__name__, settings.RQ_QUEUE_DOWNLOADS)
@@ -0,0 +1,123 @@
+import random
+import re
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional
+
+import botocore.exceptions
+
+import settings
+from common.excpetions import NotEnoughScratchSpaceError, StorageUploadError
+from common.redis import RedisClient
+
+ERROR_TRANSIENT = "transient"
+ERROR_PERMANENT = "permanent"
+ATTEMPTS_HISTORY_LIMIT = 50  # the latest attempts of the source which are kept in history
+TRANSIENT_ERROR_CLASSES = (
+    ConnectionError,  # reset / refused / aborted connections
+    TimeoutError,
+    NotEnoughScratchSpaceError,  # space is released by finished jobs and sweeper
+    StorageUploadError,
+    botocore.exceptions.ConnectionError,  # endpoint connection / connect timeout
+    botocore.exceptions.HTTPClientError,  # read timeout / closed connection
+)
+TRANSIENT_S3_CODES = {
+    "InternalError",
+    "RequestTimeout",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+}
+# yt-dlp (and boto3's transfer manager) pass original errors as text only
+TRANSIENT_MESSAGE_PATTERN = re.compile(
+    r"HTTP Error (429|5\d\d)|timed? ?out|connection (reset|refused|aborted)|"
+    r"temporary failure|remote end closed|incomplete ?read|" + "|".join(sorted(TRANSIENT_S3_CODES)),
+    re.IGNORECASE,
+)
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int  # including the first one
+    base_delay: float  # seconds
+    max_delay: float  # seconds
+
+
+def get_retry_policy(stage: str) -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=settings.RETRY_STAGE_ATTEMPTS.get(stage, 1),
+        base_delay=settings.RETRY_BACKOFF_BASE,
+        max_delay=settings.RETRY_BACKOFF_MAX,
+    )
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Allows to find out if error is transient (next attempt can succeed: network resets,
+    throttling, 5xx of S3, etc.) or permanent (video is unavailable, file is broken, etc.)
+    """
+
+    for cause in _iter_causes(error):
+        if isinstance(cause, TRANSIENT_ERROR_CLASSES):
+            return ERROR_TRANSIENT
+
+        if isinstance(cause, botocore.exceptions.ClientError):
+            response = cause.response
+            status_code = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+            if status_code >= 500 or response.get("Error", {}).get("Code") in TRANSIENT_S3_CODES:
+                return ERROR_TRANSIENT
+
+        if TRANSIENT_MESSAGE_PATTERN.search(str(cause)):
+            return ERROR_TRANSIENT
+
+    return ERROR_PERMANENT
+
+
+def get_backoff_delay(attempt: int, policy: RetryPolicy) -> float:
+    """
+    Exponential backoff with jitter: delay is random in [d/2, d], where d = base * 2^(attempt-1)
+    (capped by max delay), so retries of many failed jobs aren't performed at the same moment.
+    """
+
+    delay = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def get_attempts_key(source_id: str) -> str:
+    return f"download_attempts:{source_id}"
+
+
+def record_attempt(
+    source_id: str, stage: str, attempt: int, error: BaseException, retry_in: Optional[float]
+) -> dict:
+    """Allows to append failed attempt (with its error and scheduled retry) to source's history"""
+
+    attempt_info = {
+        "stage": stage,
+        "attempt": attempt,
+        "error": repr(error),
+        "error_kind": classify_error(error),
+        "failed_at": datetime.utcnow().isoformat(),
+        "retry_in": round(retry_in, 1) if retry_in is not None else None,
+    }
+    key = get_attempts_key(source_id)
+    redis_client = RedisClient()
+    history = (redis_client.get(key) or []) + [attempt_info]
+    redis_client.set(key, history[-ATTEMPTS_HISTORY_LIMIT:], ttl=settings.RETRY_HISTORY_TTL)
+    return attempt_info
+
+
+def get_attempts_history(source_id: str) -> List[dict]:
+    return RedisClient().get(get_attempts_key(source_id)) or []
+
+
+def _iter_causes(error: Optional[BaseException]) -> Iterator[BaseException]:
+    """Error itself and errors which caused it (chained or wrapped ones)"""
+
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        # yt-dlp's DownloadError keeps original error in `exc_info`
+        exc_info = getattr(error, "exc_info", None)
+        wrapped_error = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = error.__cause__ or wrapped_error or error.__context__
@@ -1,19 +1,41 @@
-import os
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta, datetime
+from itertools import islice
+from typing import Optional, List, Union, Dict, Callable, Iterator
+
+import rq
+from redis import Redis
+from rq.job import Dependency
 
 import settings
-from common.storage import StorageS3
+from common.models import database
+from common.redis import RedisClient, LeaseLock
+from common.storage import StorageS3, IterableReader
+from common.excpetions import NotEnoughScratchSpaceError, StorageUploadError
+from common.workdir import JobWorkDir, ScratchSpace
+from common.worker import stage_slot
 from common.utils import get_logger
-from modules.podcast.models import Episode, Podcast
-from modules.youtube.exceptions import YoutubeException
+from modules.podcast.models import Episode, Podcast, FeedArchivePage, MediaFile
+from modules.youtube.exceptions import YoutubeException, FFMPegPreparationError
 from modules.youtube import utils as youtube_utils
 from modules.podcast import utils as podcast_utils
+from modules.podcast import queues, retries
 
 logger = get_logger(__name__)
 
 EPISODE_DOWNLOADING_OK = 0
 EPISODE_DOWNLOADING_IGNORED = 1
 EPISODE_DOWNLOADING_ERROR = 2
+EPISODE_DOWNLOADING_SCHEDULED = 3
+STAGE_DOWNLOAD = "download"
+STAGE_PREPARATION = "preparation"
+STAGE_UPLOADING = "uploading"
+STAGE_FEED = "feed"
+STAGE_STREAMING = "streaming"
+RSS_UPLOADED_COUNTER_KEY = "rss_counters:uploaded"
+RSS_SKIPPED_COUNTER_KEY = "rss_counters:skipped"
 
 
 def _update_all_rss(source_id: str):
@@ -24,12 +46,27 @@ def _update_all_rss(source_id: str):
         source_id,
     )
 
-    affected_episodes = list(Episode.select(Episode.podcast).where(Episode.source_id == source_id))
-    podcast_ids = [episode.podcast_id for episode in affected_episodes]
+    podcast_ids_query = (
+        Episode.select(Episode.podcast_id).where(Episode.source_id == source_id).distinct()
+    )
+    podcast_ids = [podcast_id for (podcast_id,) in podcast_ids_query.tuples()]
     logger.info("Found podcasts for rss updates: %s", podcast_ids)
 
-    for podcast_id in podcast_ids:
-        generate_rss(podcast_id)
+    # inside of worker's job: generation is delegated to the (coalesced) rss job
+    current_job = rq.get_current_job()
+    if current_job:
+        rss_queue = queues.get_queue(settings.RQ_QUEUE_RSS, current_job.connection)
+        schedule_rss_generation(rss_queue, *podcast_ids)
+    else:
+        generate_rss_batch(podcast_ids)
+
+
+def _get_job_queue(job: rq.job.Job) -> rq.Queue:
+    return rq.Queue(
+        name=job.origin,
+        connection=job.connection,
+        default_timeout=settings.RQ_DEFAULT_TIMEOUT,
+    )
 
 
 def _update_episode_data(source_id: str, update_data: dict):
@@ -52,32 +89,72 @@ def _update_episodes(source_id: str, file_size: int, status: str = Episode.STATU
     _update_episode_data(source_id, update_data)
 
 
-# TODO: refactor me! use class-style for this task
-# TODO: transaction atomic is need here
+def get_download_job_id(source_id: str) -> str:
+    """Deterministic ID of rq job (duplicated enqueueing of the same source becomes no-op)"""
+    return f"download_episode:{source_id}"
+
+
+def get_download_lock_key(source_id: str) -> str:
+    return f"download_lock:{source_id}"
+
+
 def download_episode(youtube_link: str, episode_id: int):
-    """Allows to download youtube video and recreate specific rss (by requested episode_id)"""
+    """
+    Allows to download youtube video and recreate specific rss (by requested episode_id).
+    Only one worker can process the same source at once (guarded by lease lock on source_id)
+    """
 
     episode = Episode.get_by_id(episode_id)
+    lock = RedisClient().lease_lock(
+        get_download_lock_key(episode.source_id), ttl=settings.DOWNLOAD_LOCK_TTL
+    )
+    if not lock.acquire():
+        logger.warning(
+            "[%s] Episode is already processing by another worker. Downloading will be ignored.",
+            episode.source_id,
+        )
+        return EPISODE_DOWNLOADING_IGNORED
+
+    try:
+        result = _download_episode(youtube_link, episode, lock)
+    finally:
+        lock.release()
+
+    if result == EPISODE_DOWNLOADING_SCHEDULED:
+        # stage jobs take the same lock: the pipeline is started after lock's releasing
+        _start_pipeline(youtube_link, episode)
+
+    return result
+
+
+# TODO: refactor me! use class-style for this task
+# TODO: transaction atomic is need here
+def _download_episode(youtube_link: str, episode: Episode, lock: LeaseLock = None):
     logger.info(
         "=== [%s] START downloading process URL: %s FILENAME: %s ===",
         episode.source_id,
         youtube_link,
         episode.file_name,
     )
-    stored_file_size = StorageS3().get_file_size(episode.file_name)
+    media_file = MediaFile.get_or_none(MediaFile.source_id == episode.source_id)
 
-    if stored_file_size and stored_file_size == episode.file_size:
+    if media_file and media_file.is_uploaded:
         logger.info(
-            "[%s] Episode already downloaded and file correct. Downloading will be ignored.",
+            "[%s] Episode already downloaded (%s). Downloading will be ignored.",
+            episode.source_id,
+            media_file,
+        )
+        _update_episode_data(
             episode.source_id,
+            {"file_name": media_file.file_name, "remote_url": media_file.remote_url},
         )
-        _update_episodes(episode.source_id, stored_file_size)
+        _update_episodes(episode.source_id, media_file.size)
         _update_all_rss(episode.source_id)
         return EPISODE_DOWNLOADING_IGNORED
 
     elif episode.status not in (Episode.STATUS_NEW, Episode.STATUS_DOWNLOADING):
         logger.error(
-            "[%s] Episode is %s but file-size seems not correct. "
+            "[%s] Episode is %s but its file isn't registered as uploaded. "
             "Removing not-correct file %s and reloading it from youtube.",
             episode.source_id,
             episode.status,
@@ -96,76 +173,741 @@ def download_episode(youtube_link: str, episode_id: int):
     )
     query.execute()
 
-    try:
-        result_filename = youtube_utils.download_audio(youtube_link, episode.file_name)
-    except YoutubeException as error:
-        logger.exception(
-            "=== [%s] Downloading FAILED: Could not download track: %s. "
-            "All episodes will be rolled back to NEW state",
-            episode.source_id,
-            error,
-        )
-        Episode.update(status=Episode.STATUS_NEW).where(
-            Episode.source_id == episode.source_id
-        ).execute()
+    if settings.DOWNLOAD_STREAMING:
+        try:
+            return _stream_episode(youtube_link, episode)
+        except (YoutubeException, StorageUploadError) as error:
+            if not _schedule_retry(episode, STAGE_STREAMING, error):
+                _rollback_downloading(episode, error)
+
+            return EPISODE_DOWNLOADING_ERROR
+
+    # stages' results are kept in work dir: re-run of the job continues from unfinished stage
+    if settings.DOWNLOAD_PIPELINE and rq.get_current_job():
+        logger.info("=== [%s] Downloading is delegated to the pipeline ===", episode.source_id)
+        return EPISODE_DOWNLOADING_SCHEDULED
+
+    work_dir = ScratchSpace().job_dir(get_episode_work_dir_name(episode.source_id))
+    if not _fetch_audio(youtube_link, episode, work_dir):
         return EPISODE_DOWNLOADING_ERROR
 
+    if _is_lease_lost(lock, episode.source_id, STAGE_PREPARATION):
+        return EPISODE_DOWNLOADING_IGNORED
+
+    if not _prepare_audio(episode, work_dir):
+        return EPISODE_DOWNLOADING_ERROR
+
+    if _is_lease_lost(lock, episode.source_id, STAGE_UPLOADING):
+        return EPISODE_DOWNLOADING_IGNORED
+
+    if not _publish_audio(episode, work_dir):
+        return EPISODE_DOWNLOADING_ERROR
+
+    with stage_timer(episode.source_id, STAGE_FEED):
+        _update_all_rss(episode.source_id)
+
+    work_dir.cleanup()
+    logger.info("=== [%s] DOWNLOADING total finished ===", episode.source_id)
+    return EPISODE_DOWNLOADING_OK
+
+
+def _is_lease_lost(lock: Optional[LeaseLock], source_id: str, next_stage: str) -> bool:
+    """
+    Lease is lost if it couldn't be renewed in time (e.g. redis was unavailable):
+    another worker could take the source already, so the next stage mustn't be performed
+    """
+
+    if lock and lock.lost.is_set():
+        logger.error("[%s] Lease lock was lost. Stage %s is aborted", source_id, next_stage)
+        return True
+
+    return False
+
+
+def _fetch_audio(youtube_link: str, episode: Episode, work_dir: JobWorkDir) -> bool:
+    """Download stage: source audio is downloaded to the work dir (returns False on failure)"""
+
+    # work dir is shared by source's episodes: stage is skipped only if it produced the same file
+    if work_dir.get_result(STAGE_DOWNLOAD) == episode.file_name:
+        logger.info("=== [%s] DOWNLOADING was done by previous run. SKIP", episode.source_id)
+        return True
+
+    try:
+        with stage_slot(STAGE_DOWNLOAD), stage_timer(episode.source_id, STAGE_DOWNLOAD):
+            ScratchSpace().admit(_estimate_scratch_size(episode))
+            youtube_utils.download_audio(youtube_link, episode.file_name, dst_dir=work_dir.path)
+    except (YoutubeException, NotEnoughScratchSpaceError) as error:
+        # partially downloaded file is kept: it will be resumed by the next run
+        if not _schedule_retry(episode, STAGE_DOWNLOAD, error):
+            _rollback_downloading(episode, error)
+
+        return False
+
+    work_dir.mark_done(STAGE_DOWNLOAD, result=episode.file_name)
     logger.info("=== [%s] DOWNLOADING was done ===", episode.source_id)
+    return True
+
+
+def _prepare_audio(episode: Episode, work_dir: JobWorkDir) -> bool:
+    """Preparation stage: downloaded audio is converted by ffmpeg (returns False on failure)"""
 
-    youtube_utils.ffmpeg_preparation(result_filename)
+    if work_dir.get_result(STAGE_PREPARATION) == episode.file_name:
+        logger.info("=== [%s] POST PROCESSING was done by previous run. SKIP", episode.source_id)
+        return True
+
+    try:
+        with stage_slot(STAGE_PREPARATION), stage_timer(episode.source_id, STAGE_PREPARATION):
+            youtube_utils.ffmpeg_preparation(episode.file_name, src_dir=work_dir.path)
+    except FFMPegPreparationError as error:
+        logger.exception("=== [%s] POST PROCESSING FAILED: %s", episode.source_id, error)
+        if not _schedule_retry(episode, STAGE_PREPARATION, error):
+            _update_episodes(episode.source_id, file_size=0, status=Episode.STATUS_ERROR)
+            work_dir.cleanup()
+
+        return False
+
+    work_dir.mark_done(STAGE_PREPARATION, result=episode.file_name)
     logger.info("=== [%s] POST PROCESSING was done === ", episode.source_id)
+    return True
+
+
+def _publish_audio(episode: Episode, work_dir: JobWorkDir) -> Optional[str]:
+    """
+    Uploading stage: prepared audio is uploaded to the storage, episodes (with the same source)
+    are marked as published. Returns URL of uploaded file (None on failure)
+    """
 
-    # ----- uploading file to cloud -----
-    remote_url = podcast_utils.upload_episode(result_filename)
+    result_filename = episode.file_name
+    remote_url = work_dir.get_result(STAGE_UPLOADING)
     if not remote_url:
-        logger.warning("=== [%s] UPLOADING was broken === ")
-        _update_episodes(episode.source_id, file_size=0, status=Episode.STATUS_ERROR)
+        with stage_slot(STAGE_UPLOADING), stage_timer(episode.source_id, STAGE_UPLOADING):
+            remote_url = podcast_utils.upload_episode(
+                result_filename, src_path=work_dir.file_path(result_filename)
+            )
+        if not remote_url:
+            logger.warning("=== [%s] UPLOADING was broken === ", episode.source_id)
+            # storage client doesn't raise errors: failed uploading is considered as transient
+            error = StorageUploadError(f"Couldn't upload {result_filename} to the storage")
+            if not _schedule_retry(episode, STAGE_UPLOADING, error):
+                _update_episodes(episode.source_id, file_size=0, status=Episode.STATUS_ERROR)
+
+            return None
+
+        work_dir.mark_done(STAGE_UPLOADING, result=remote_url)
+
+    # size and checksum are taken from local file: uploaded file isn't requested from storage
+    src_path = work_dir.file_path(result_filename)
+    file_size = podcast_utils.get_file_size(src_path)
+    _store_media_file(
+        episode.source_id,
+        result_filename,
+        remote_url,
+        file_size,
+        checksum=podcast_utils.get_file_checksum(src_path),
+    )
+    logger.info("=== [%s] UPLOADING was done === ", episode.source_id)
+    _update_episodes(episode.source_id, file_size=file_size)
+    return remote_url
+
+
+def _store_media_file(
+    source_id: str, file_name: str, remote_url: str, file_size: int, checksum: Optional[str]
+):
+    """Register uploaded file and update all episodes (exclude archived) which share it"""
+
+    with database.atomic():
+        MediaFile.store_query(source_id, file_name, remote_url, file_size, checksum).execute()
+        _update_episode_data(source_id, {"file_name": file_name, "remote_url": remote_url})
+
+
+def _start_pipeline(youtube_link: str, episode: Episode):
+    """
+    Allows to enqueue the first stage job of download pipeline:
+    fetch -> prepare -> publish -> feed (each stage has own queue, so own pool of workers).
+    Files are handed off through the work dir, so workers of all stages must share scratch space
+    """
+
+    work_dir = ScratchSpace().job_dir(get_episode_work_dir_name(episode.source_id))
+    artefact = {
+        "episode_id": episode.id,
+        "source_id": episode.source_id,
+        "youtube_link": youtube_link,
+        "work_dir": work_dir.path,
+    }
+    _enqueue_pipeline_stage(fetch_episode, artefact, rq.get_current_job().connection)
+
+
+def fetch_episode(artefact: dict) -> int:
+    """Pipeline stage: download source audio to the work dir (hands it off to preparation)"""
+
+    def fetch(episode: Episode, work_dir: JobWorkDir) -> Optional[dict]:
+        if _fetch_audio(artefact["youtube_link"], episode, work_dir):
+            return {"downloaded_path": work_dir.file_path(episode.file_name)}
+
+    return _run_pipeline_stage(STAGE_DOWNLOAD, artefact, fetch, next_task=prepare_episode)
+
+
+def prepare_episode(artefact: dict) -> int:
+    """Pipeline stage: convert downloaded audio by ffmpeg (hands it off to publishing)"""
+
+    def prepare(episode: Episode, work_dir: JobWorkDir) -> Optional[dict]:
+        if _prepare_audio(episode, work_dir):
+            return {"prepared_path": work_dir.file_path(episode.file_name)}
+
+    return _run_pipeline_stage(STAGE_PREPARATION, artefact, prepare, next_task=publish_episode)
+
+
+def publish_episode(artefact: dict) -> int:
+    """Pipeline stage: upload prepared audio and publish episodes (hands them off to feed)"""
+
+    def publish(episode: Episode, work_dir: JobWorkDir) -> Optional[dict]:
+        if remote_url := _publish_audio(episode, work_dir):
+            work_dir.cleanup()
+            return {"remote_url": remote_url}
+
+    return _run_pipeline_stage(STAGE_UPLOADING, artefact, publish, next_task=feed_episode)
+
+
+def feed_episode(artefact: dict) -> int:
+    """Pipeline stage: regenerate RSS of all podcasts which include published episode"""
+
+    def feed(episode: Episode, _: JobWorkDir) -> dict:
+        with stage_timer(episode.source_id, STAGE_FEED):
+            _update_all_rss(episode.source_id)
+
+        logger.info("=== [%s] DOWNLOADING total finished ===", episode.source_id)
+        return {}
+
+    return _run_pipeline_stage(STAGE_FEED, artefact, feed)
+
+
+def _run_pipeline_stage(
+    stage: str,
+    artefact: dict,
+    perform: Callable[[Episode, JobWorkDir], Optional[dict]],
+    next_task: Callable[[dict], int] = None,
+) -> int:
+    """
+    Allows to perform stage of download pipeline (under the same lease lock as download_episode)
+    and to hand off its artefacts (updated `artefact` dict) to the job of the next stage.
+    """
+
+    source_id = artefact["source_id"]
+    if handed_off_at := artefact.get("handed_off_at"):
+        # time in queue shows which pool of workers has to be scaled
+        _record_stage_timing(source_id, f"{stage}_wait", time.time() - handed_off_at)
+
+    episode = Episode.get_by_id(artefact["episode_id"])
+    lock = RedisClient().lease_lock(
+        get_download_lock_key(source_id), ttl=settings.DOWNLOAD_LOCK_TTL
+    )
+    if not lock.acquire():
+        logger.warning("[%s] Episode is already processing by another worker. SKIP", source_id)
+        return EPISODE_DOWNLOADING_IGNORED
+
+    try:
+        # duplicated pipeline of the same source mustn't touch already published file
+        media_file = MediaFile.get_or_none(MediaFile.source_id == source_id)
+        if stage != STAGE_FEED and media_file and media_file.is_uploaded:
+            logger.warning("[%s] File was already published. Stage %s SKIP", source_id, stage)
+            return EPISODE_DOWNLOADING_IGNORED
+
+        result = perform(episode, JobWorkDir.from_path(artefact["work_dir"]))
+    finally:
+        lock.release()
+
+    if result is None:
+        logger.warning("=== [%s] Pipeline was stopped on stage %s ===", source_id, stage)
         return EPISODE_DOWNLOADING_ERROR
 
-    _update_episode_data(
-        episode.source_id, {"file_name": result_filename, "remote_url": remote_url}
+    if next_task and _is_lease_lost(lock, source_id, next_task.__name__):
+        return EPISODE_DOWNLOADING_IGNORED
+
+    if next_task:
+        current_job = rq.get_current_job()
+        _enqueue_pipeline_stage(next_task, {**artefact, **result}, current_job.connection)
+
+    return EPISODE_DOWNLOADING_OK
+
+
+def _enqueue_pipeline_stage(task: Callable[[dict], int], artefact: dict, connection: Redis):
+    rq_queue = queues.get_queue(queues.route_task(task), connection)
+    rq_queue.enqueue(
+        task,
+        {**artefact, "handed_off_at": time.time()},
+        job_id=f"{task.__name__}:{artefact['source_id']}",
     )
-    logger.info("=== [%s] UPLOADING was done === ", episode.source_id)
-    # -----------------------------------
+    logger.info(
+        "[%s] Pipeline: %s was enqueued to %s", artefact["source_id"], task.__name__, rq_queue.name
+    )
+
+
+def get_stage_timings_key(source_id: str) -> str:
+    return f"download_stages:{source_id}"
+
+
+def get_stage_timings(source_id: str) -> Dict[str, float]:
+    """Durations (in seconds) of download stages (and waiting for them) of requested source"""
+    return RedisClient().hgetall(get_stage_timings_key(source_id))
+
+
+def _record_stage_timing(source_id: str, stage: str, duration: float):
+    key = get_stage_timings_key(source_id)
+    RedisClient().hset(key, stage, round(duration, 3), ttl=settings.DOWNLOAD_STAGE_TIMINGS_TTL)
+
+
+@contextmanager
+def stage_timer(source_id: str, stage: str):
+    """Allows to record duration of episode's stage (failed stages are recorded too)"""
+
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        duration = time.monotonic() - start_time
+        logger.info("[%s] Stage %s took %.3fs", source_id, stage, duration)
+        _record_stage_timing(source_id, stage, duration)
+
+
+def _schedule_retry(episode: Episode, stage: str, error: Exception) -> bool:
+    """
+    Allows to re-enqueue current job (with exponential backoff and jitter) if error is transient
+    and attempts of the stage aren't exhausted (counters of attempts are kept in job's meta).
+    Failed attempt is recorded to the source's history in any case.
+    :return: True if retry was scheduled
+    """
+
+    current_job = rq.get_current_job()
+    attempts = dict(current_job.meta.get("attempts", {})) if current_job else {}
+    attempt = attempts.get(stage, 0) + 1
+    policy = retries.get_retry_policy(stage)
+    retry_in = None
+    if (
+        current_job
+        and attempt < policy.max_attempts
+        and retries.classify_error(error) == retries.ERROR_TRANSIENT
+    ):
+        retry_in = retries.get_backoff_delay(attempt, policy)
+        rq_queue = queues.get_queue(current_job.origin, current_job.connection)
+        base_job_id = current_job.id.partition(":retry")[0]
+        rq_queue.enqueue_in(
+            timedelta(seconds=retry_in),
+            current_job.func,
+            *current_job.args,
+            job_id=f"{base_job_id}:retry:{stage}:{attempt}",
+            meta={"attempts": {**attempts, stage: attempt}},
+            **current_job.kwargs,
+        )
+
+    retries.record_attempt(episode.source_id, stage, attempt, error, retry_in)
+    if retry_in is None:
+        logger.error(
+            "[%s] Stage %s FAILED (attempt %i): %r. No more retries",
+            episode.source_id,
+            stage,
+            attempt,
+            error,
+        )
+        return False
+
+    logger.warning(
+        "[%s] Stage %s FAILED (attempt %i): %r. Retry in %.1fs",
+        episode.source_id,
+        stage,
+        attempt,
+        error,
+        retry_in,
+    )
+    return True
+
+
+def retry_failed_downloads(podcast_id: int = None) -> List[int]:
+    """
+    Allows to re-enqueue downloading of all failed episodes (of requested podcast or of all ones):
+    episodes with error status and new episodes whose previous downloading attempts failed
+    (counters of attempts are reset for enqueued jobs).
+    :return: IDs of episodes which downloading was enqueued
+    """
+
+    query = Episode.select().where(Episode.status.in_([Episode.STATUS_ERROR, Episode.STATUS_NEW]))
+    if podcast_id:
+        query = query.where(Episode.podcast_id == podcast_id)
+
+    failed_episodes: Dict[str, Episode] = {}
+    for episode in query.order_by(Episode.id):
+        if episode.source_id in failed_episodes:
+            continue
+
+        # new episode without attempts in history wasn't downloaded yet (it isn't failed)
+        if episode.status == Episode.STATUS_ERROR or retries.get_attempts_history(
+            episode.source_id
+        ):
+            failed_episodes[episode.source_id] = episode
+
+    if not failed_episodes:
+        logger.info("Retry of failed downloads: there are no failed episodes. SKIP")
+        return []
+
+    Episode.update(status=Episode.STATUS_DOWNLOADING).where(
+        Episode.source_id.in_(list(failed_episodes)),
+        Episode.status != Episode.STATUS_ARCHIVED,
+    ).execute()
+
+    current_job = rq.get_current_job()
+    connection = current_job.connection if current_job else Redis(*settings.REDIS_CON)
+    for source_id, episode in failed_episodes.items():
+        rq_queue = queues.get_queue(queues.get_download_queue_name(episode.length), connection)
+        rq_queue.enqueue(
+            download_episode,
+            youtube_link=episode.watch_url,
+            episode_id=episode.id,
+            job_id=get_download_job_id(source_id),
+        )
+
+    episode_ids = [episode.id for episode in failed_episodes.values()]
+    logger.info("Retry of failed downloads: downloading of episodes %s enqueued", episode_ids)
+    return episode_ids
+
+
+def _rollback_downloading(episode: Episode, error: Exception):
+    logger.exception(
+        "=== [%s] Downloading FAILED: Could not download track: %s. "
+        "All episodes will be rolled back to NEW state",
+        episode.source_id,
+        error,
+    )
+    Episode.update(status=Episode.STATUS_NEW).where(
+        Episode.source_id == episode.source_id
+    ).execute()
+
+
+def get_episode_work_dir_name(source_id: str) -> str:
+    return f"episode_{source_id}"
 
-    # ----- update episodes data -------
-    _update_episodes(episode.source_id, file_size=StorageS3().get_file_size(result_filename))
-    _update_all_rss(episode.source_id)
-    podcast_utils.delete_file(os.path.join(settings.TMP_AUDIO_PATH, result_filename))
-    # -----------------------------------
+
+def _estimate_scratch_size(episode: Episode) -> int:
+    """Approximate size of episode's files in scratch space (unknown length - 1 hour)"""
+    return (episode.length or 3600) * settings.SCRATCH_EPISODE_BYTES_PER_SECOND
+
+
+def _stream_episode(youtube_link: str, episode: Episode):
+    """Download, convert and upload episode's file by single streaming pass (without tmp files)"""
+
+    # all stages are performed at once: streaming takes network and ffmpeg slots
+    with stage_slot(STAGE_DOWNLOAD), stage_slot(STAGE_PREPARATION):
+        with stage_timer(episode.source_id, STAGE_STREAMING):
+            remote_url = youtube_utils.stream_audio(youtube_link, episode.file_name)
+
+    logger.info("=== [%s] STREAMING (download + convert + upload) was done ===", episode.source_id)
+
+    # there is no local file after streaming: size is requested from the storage once
+    file_size = StorageS3().get_file_size(episode.file_name)
+    _store_media_file(episode.source_id, episode.file_name, remote_url, file_size, checksum=None)
+    _update_episodes(episode.source_id, file_size=file_size)
+    with stage_timer(episode.source_id, STAGE_FEED):
+        _update_all_rss(episode.source_id)
 
     logger.info("=== [%s] DOWNLOADING total finished ===", episode.source_id)
     return EPISODE_DOWNLOADING_OK
 
 
 def generate_rss(podcast_id: int) -> Optional[str]:
-    """Allows to download and recreate specific rss (by requested podcast.publish_id)"""
+    """
+    Allows to download and recreate specific rss (by requested podcast.publish_id).
+    Uploading is skipped if content of RSS wasn't changed since last generation.
+    """
 
+    RedisClient().delete(get_rss_pending_key(podcast_id))
     podcast = Podcast.get_by_id(podcast_id)
-    logger.info("START rss generation for %s", podcast)
+    return _publish_rss(podcast, StorageS3())
+
 
-    src_file = podcast_utils.render_rss_to_file(podcast_id)
-    filename = os.path.basename(src_file)
+def generate_rss_batch(podcast_ids: List[int]) -> Dict[int, Optional[str]]:
+    """
+    Allows to recreate RSS for several podcasts at once:
+    podcasts are fetched by single query and the same S3 client is used for all uploads.
+    """
+
+    redis_client = RedisClient()
+    redis_client.delete(*[get_rss_pending_key(podcast_id) for podcast_id in podcast_ids])
     storage = StorageS3()
-    result_url = storage.upload_file(src_file, filename, remote_path=settings.S3_BUCKET_RSS_PATH)
+    result_urls, failed_ids = {}, []
+    for podcast in Podcast.select().where(Podcast.id.in_(podcast_ids)):
+        try:
+            result_urls[podcast.id] = _publish_rss(podcast, storage)
+        except StorageUploadError as error:
+            logger.error("RSS for %s wasn't generated: %r", podcast, error)
+            result_urls[podcast.id] = None
+            failed_ids.append(podcast.id)
+
+    published_ids = [
+        podcast_id
+        for podcast_id in podcast_ids
+        if podcast_id in result_urls and podcast_id not in failed_ids
+    ]
+    if published_ids:
+        redis_client.delete(*[get_rss_attempts_key(podcast_id) for podcast_id in published_ids])
+
+    # pending markers were removed above: failed podcasts are scheduled again (with delay)
+    if failed_ids and (current_job := rq.get_current_job()):
+        if retry_ids := _get_rss_retry_ids(redis_client, failed_ids):
+            schedule_rss_generation(_get_job_queue(current_job), *retry_ids)
+
+    return result_urls
+
+
+def _get_rss_retry_ids(redis_client: RedisClient, failed_ids: List[int]) -> List[int]:
+    """Count failed attempts of RSS generation: podcasts are retried up to RSS_MAX_RETRIES times"""
+
+    retry_ids, exhausted_ids = [], []
+    for podcast_id in failed_ids:
+        attempts = redis_client.incr(get_rss_attempts_key(podcast_id))
+        if attempts <= settings.RSS_MAX_RETRIES:
+            retry_ids.append(podcast_id)
+        else:
+            exhausted_ids.append(podcast_id)
+
+    if exhausted_ids:
+        logger.error(
+            "RSS generation for podcasts %s failed %i times. Retrying STOP",
+            exhausted_ids,
+            settings.RSS_MAX_RETRIES + 1,
+        )
+        # next generation (e.g. after episode's publishing) starts counting from scratch
+        redis_client.delete(*[get_rss_attempts_key(podcast_id) for podcast_id in exhausted_ids])
+
+    return retry_ids
+
+
+def _publish_rss(podcast: Podcast, storage: StorageS3) -> Optional[str]:
+    """Render podcast's RSS (with archive pages) and upload it to the storage (if changed)"""
+
+    logger.info("START rss generation for %s", podcast)
+    _generate_rss_archive(podcast, storage)
+
+    start_time = time.monotonic()
+    rss_content, rss_digest = podcast_utils.render_rss_to_spool(podcast)
+    render_time = time.monotonic() - start_time
+    with rss_content:
+        if podcast.rss_link and podcast.rss_digest == rss_digest:
+            logger.info(
+                "RSS for %s wasn't changed (digest %s, rendered in %.3fs). Uploading SKIP",
+                podcast,
+                rss_digest,
+                render_time,
+            )
+            RedisClient().incr(RSS_SKIPPED_COUNTER_KEY)
+            return podcast.rss_link
+
+        filename = f"{podcast.publish_id}.xml"
+        result_url = storage.upload_fileobj(
+            rss_content,
+            filename,
+            remote_path=settings.S3_BUCKET_RSS_PATH,
+            object_type="rss",
+        )
+
     if not result_url:
-        logger.error("Couldn't upload RSS file to storage. SKIP")
-        exit(1)
+        raise StorageUploadError(f"Couldn't upload RSS file {filename} to the storage")
 
     podcast.rss_link = result_url
+    podcast.rss_digest = rss_digest
+    podcast.rss_published_at = datetime.utcnow()
     podcast.save()
-    logger.info("RSS file uploaded, podcast record updated")
+    RedisClient().incr(RSS_UPLOADED_COUNTER_KEY)
+    logger.info(
+        "RSS for %s uploaded, podcast record updated (render %.3fs | render+upload %.3fs)",
+        podcast,
+        render_time,
+        time.monotonic() - start_time,
+    )
+    logger.info("FINISH generation")
+    return result_url
+
+
+def _generate_rss_archive(podcast: Podcast, storage: StorageS3) -> int:
+    """
+    Allows to (re)generate archive pages of podcast's RSS (older episodes which aren't included
+    to the main feed). Pages with unchanged source data aren't rendered and uploaded again.
+    :return: count of archive pages
+    """
+
+    stored_pages = {
+        archive_page.page: archive_page
+        for archive_page in FeedArchivePage.select().where(FeedArchivePage.podcast == podcast.id)
+    }
+    pages_count = 0
+    for page, episodes in podcast_utils.iterate_rss_archive_pages(podcast):
+        pages_count = page
+        digest = podcast_utils.get_rss_page_digest(podcast, episodes, page)
+        archive_page = stored_pages.get(page) or FeedArchivePage(podcast=podcast, page=page)
+        if archive_page.digest == digest:
+            logger.debug("RSS archive page %s for %s wasn't changed. SKIP", page, podcast)
+            continue
+
+        filename = FeedArchivePage.get_file_name(podcast.publish_id, page)
+        rss_chunks = podcast_utils.render_rss_stream(podcast, reversed(episodes), page=page)
+        rss_link = storage.upload_fileobj(
+            IterableReader(rss_chunks),
+            filename,
+            remote_path=settings.S3_BUCKET_RSS_PATH,
+            object_type="rss",
+        )
+        if not rss_link:
+            logger.error("Couldn't upload RSS archive page %s to storage. SKIP", filename)
+            continue
 
-    if not settings.TEST_MODE:
-        logger.info("Removing file [%s]", src_file)
-        podcast_utils.delete_file(filepath=src_file)
-        src_file = None
+        archive_page.digest = digest
+        archive_page.rss_link = rss_link
+        archive_page.items_count = len(episodes)
+        archive_page.updated_at = datetime.utcnow()
+        archive_page.save()
+        logger.info("RSS archive page %s for %s was uploaded", page, podcast)
 
-    logger.info("FINISH generation")
-    return src_file
+    stale_pages = [page for number, page in stored_pages.items() if number > pages_count]
+    if stale_pages:
+        logger.info("Removing stale RSS archive pages for %s: %s", podcast, stale_pages)
+        for archive_page in stale_pages:
+            filename = FeedArchivePage.get_file_name(podcast.publish_id, archive_page.page)
+            storage.delete_file(filename, remote_path=settings.S3_BUCKET_RSS_PATH)
+
+        stale_ids = [archive_page.id for archive_page in stale_pages]
+        FeedArchivePage.delete().where(FeedArchivePage.id.in_(stale_ids)).execute()
+
+    return pages_count
+
+
+def get_rss_pending_key(podcast_id: int) -> str:
+    return f"rss_pending:{podcast_id}"
+
+
+def get_rss_attempts_key(podcast_id: int) -> str:
+    return f"rss_attempts:{podcast_id}"
+
+
+def schedule_rss_generation(rq_queue: rq.Queue, *podcast_ids: int) -> List[int]:
+    """
+    Allows to coalesce RSS generation requests for the same podcasts:
+    podcast is included to the (delayed by RSS_REGENERATION_DELAY) job only if there is
+    no pending generation for it yet, so all requests which come before job's start
+    are folded into the single generation.
+    :return: IDs of podcasts which were scheduled
+    """
+
+    redis_client = RedisClient()
+    ttl = settings.RSS_REGENERATION_PENDING_TTL
+    scheduled_ids = [
+        podcast_id
+        for podcast_id in podcast_ids
+        if redis_client.set_nx(get_rss_pending_key(podcast_id), {"podcast_id": podcast_id}, ttl)
+    ]
+    if skipped_ids := set(podcast_ids) - set(scheduled_ids):
+        logger.info("RSS generation for podcasts %s is already pending. SKIP", skipped_ids)
+
+    if not scheduled_ids:
+        return []
+
+    if settings.RSS_REGENERATION_DELAY:
+        delay = timedelta(seconds=settings.RSS_REGENERATION_DELAY)
+        rq_queue.enqueue_in(delay, generate_rss_batch, scheduled_ids)
+    else:
+        rq_queue.enqueue(generate_rss_batch, scheduled_ids)
+
+    logger.info("RSS generation for podcasts %s was scheduled", scheduled_ids)
+    return scheduled_ids
 
 
 def regenerate_rss():
-    podcasts = list(Podcast.select())
-    for podcast in podcasts:
-        generate_rss(podcast.id)
+    """
+    Allows to regenerate RSS for all podcasts.
+    Podcasts are split to chunks which are processed by separate jobs (in parallel),
+    summary job collects timings and failures after all chunks are finished.
+    """
+
+    podcast_ids = [podcast.id for podcast in Podcast.select(Podcast.id).order_by(Podcast.id)]
+    logger.info("RSS regeneration for %i podcasts has been started", len(podcast_ids))
+
+    current_job = rq.get_current_job()
+    if not current_job:
+        return regenerate_rss_summary([regenerate_rss_chunk(podcast_ids)])
+
+    rq_queue = _get_job_queue(current_job)
+    chunk_jobs = [
+        rq_queue.enqueue(regenerate_rss_chunk, chunk_ids)
+        for chunk_ids in _split_chunks(podcast_ids, settings.RSS_REGENERATION_CHUNK_SIZE)
+    ]
+    rq_queue.enqueue(
+        regenerate_rss_summary,
+        [job.id for job in chunk_jobs],
+        depends_on=Dependency(jobs=chunk_jobs, allow_failure=True),
+    )
+    logger.info("RSS regeneration: %i chunk jobs were enqueued", len(chunk_jobs))
+
+
+def _split_chunks(items: List[int], chunk_size: int) -> Iterator[List[int]]:
+    items_iterator = iter(items)
+    while chunk := list(islice(items_iterator, chunk_size)):
+        yield chunk
+
+
+def regenerate_rss_chunk(podcast_ids: List[int]) -> dict:
+    """Allows to regenerate RSS for requested podcasts (in bounded thread pool)"""
+
+    timings, failures = {}, {}
+    with ThreadPoolExecutor(max_workers=settings.RSS_REGENERATION_THREADS) as executor:
+        futures = {
+            executor.submit(_generate_rss_timed, podcast_id): podcast_id
+            for podcast_id in podcast_ids
+        }
+        for future in as_completed(futures):
+            podcast_id = futures[future]
+            try:
+                timings[podcast_id] = future.result()
+            except Exception as error:
+                logger.exception("Couldn't regenerate RSS for podcast #%s: %r", podcast_id, error)
+                failures[podcast_id] = repr(error)
+
+    return {"timings": timings, "failures": failures}
+
+
+def regenerate_rss_summary(chunk_results: List[Union[str, dict]]) -> dict:
+    """
+    Allows to collect results of RSS regeneration chunks
+    :param chunk_results: results of chunks (or IDs of chunk jobs)
+    """
+
+    timings, failures = {}, {}
+    current_job = rq.get_current_job()
+    for chunk_result in chunk_results:
+        if isinstance(chunk_result, str):
+            chunk_job = rq.job.Job.fetch(chunk_result, connection=current_job.connection)
+            chunk_result = chunk_job.return_value() or {
+                "failures": {chunk_job.id: f"Chunk job is {chunk_job.get_status()}"}
+            }
+
+        timings.update(chunk_result.get("timings", {}))
+        failures.update(chunk_result.get("failures", {}))
+
+    total_time = sum(timings.values())
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:10]
+    logger.info(
+        "RSS regeneration FINISHED: succeeded %i | failed %i | total render+upload time %.2fs",
+        len(timings),
+        len(failures),
+        total_time,
+    )
+    logger.info("RSS regeneration: the slowest podcasts (id, seconds): %s", slowest)
+    if failures:
+        logger.error("RSS regeneration: failed podcasts: %s", failures)
+
+    return {"timings": timings, "failures": failures}
+
+
+def _generate_rss_timed(podcast_id: int) -> float:
+    """Generate RSS (in separate thread) and return spent time"""
+
+    start_time = time.monotonic()
+    with database.connection_context():
+        generate_rss(podcast_id)
+
+    return round(time.monotonic() - start_time, 3)
@@ -7,6 +7,12 @@ urls = (
     url("/progress/", views.ProgressView, name="progress"),
     url("/api/progress/", views.ProgressApiView, name="api_progress"),
     url("/api/playlist/", views.PlayListVideosApiView, name="api_playlist"),
+    url(
+        "/api/podcasts/{podcast_id}/playlist/import/",
+        views.PlayListImportApiView,
+        name="api_playlist_import",
+    ),
+    url("/rss/{publish_id}.xml", views.RSSFeedView, name="rss_feed"),
     url("/podcasts/", views.PodcastListCreateApiView, name="podcast_list"),
     url(
         "/podcasts/default/",
@@ -33,6 +39,11 @@ urls = (
         views.PodcastUpdateRSSApiView,
         name="podcast_rss_update",
     ),
+    url(
+        "/podcasts/{podcast_id}/retry-failed/",
+        views.PodcastRetryFailedApiView,
+        name="podcast_retry_failed",
+    ),
     url(
         "/podcasts/{podcast_id}/episodes/",
         views.EpisodeCreateApiView,
@@ -1,19 +1,35 @@
 import enum
+import hashlib
+import math
 import os
+import tempfile
 import uuid
-from functools import partial
+from functools import partial, lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Union, Iterable, Optional
+from typing import Union, Iterable, Optional, List, Iterator, Dict, Tuple, IO
 
+import peewee
 from jinja2 import Template
 
 import settings
+from common.models import iterate_server_side
 from common.redis import RedisClient
 from common.storage import StorageS3
 from common.utils import get_logger
-from modules.podcast.models import Podcast, Episode
+from modules.podcast.models import Podcast, Episode, FeedArchivePage
 
 logger = get_logger(__name__)
+RSS_ITEM_FIELDS = (
+    "title",
+    "description",
+    "watch_url",
+    "published_at",
+    "remote_url",
+    "file_name",
+    "file_size",
+    "author",
+)
 
 
 class EpisodeStatuses(str, enum.Enum):
@@ -27,31 +43,236 @@ class EpisodeStatuses(str, enum.Enum):
     finished = "finished"
 
 
-def render_rss_to_file(podcast_id: int) -> str:
-    """Generate rss for Podcast and Episodes marked as "published" """
-
-    logger.info(f"Podcast #{podcast_id}: RSS generation has been started.")
-    podcast = Podcast.get_by_id(podcast_id)
+def get_published_episodes(podcast: Podcast) -> peewee.Query:
+    """Episodes which are included to the podcast's RSS (the newest first)"""
 
     # noinspection PyComparisonWithNone
-    episodes = podcast.get_episodes(podcast.created_by).where(
-        Episode.status == Episode.STATUS_PUBLISHED,
-        Episode.published_at != None,  # noqa: E711
+    return (
+        podcast.get_episodes(podcast.created_by_id)
+        .where(
+            Episode.status == Episode.STATUS_PUBLISHED,
+            Episode.published_at != None,  # noqa: E711
+        )
+        .order_by(Episode.published_at.desc(), Episode.created_at.desc(), Episode.id.desc())
     )
-    context = {"episodes": episodes, "settings": settings}
-    with open(os.path.join(settings.TEMPLATE_PATH, "rss", "feed_template.xml")) as fh:
-        template = Template(fh.read())
 
+
+def get_rss_url(podcast: Podcast, page: int = None) -> str:
+    """URL of main feed or archive page (if page is set)"""
+
+    if page:
+        filename = FeedArchivePage.get_file_name(podcast.publish_id, page)
+    else:
+        filename = f"{podcast.publish_id}.xml"
+
+    return StorageS3.get_file_url(filename, remote_path=settings.S3_BUCKET_RSS_PATH)
+
+
+def get_rss_archive_pages_count(podcast: Podcast) -> int:
+    max_items = podcast.safe_rss_max_items
+    if not max_items:
+        return 0
+
+    archived_count = max(0, get_published_episodes(podcast).count() - max_items)
+    return math.ceil(archived_count / max_items)
+
+
+def get_rss_feed_links(podcast: Podcast, page: int = None) -> Dict[str, str]:
+    """Links between main feed and archive pages (RFC 5005: "Paged Feeds")"""
+
+    if page is None:
+        pages_count = get_rss_archive_pages_count(podcast)
+        return {"prev-archive": get_rss_url(podcast, pages_count)} if pages_count else {}
+
+    feed_links = {"current": get_rss_url(podcast)}
+    if page > 1:
+        feed_links["prev-archive"] = get_rss_url(podcast, page - 1)
+
+    return feed_links
+
+
+def iterate_rss_archive_pages(podcast: Podcast) -> Iterator[Tuple[int, List[Episode]]]:
+    """
+    Allows to iterate over archived episodes (which aren't included to the main feed)
+    grouped by pages. Pages are numbered from the oldest episodes, so full pages stay stable
+    when new episodes are published.
+    """
+
+    max_items = podcast.safe_rss_max_items
+    if not max_items:
+        return
+
+    archived_count = get_published_episodes(podcast).count() - max_items
+    if archived_count <= 0:
+        return
+
+    query = (
+        get_published_episodes(podcast)
+        .order_by(Episode.published_at.asc(), Episode.created_at.asc(), Episode.id.asc())
+        .limit(archived_count)
+    )
+    episodes = iterate_server_side(query, array_size=settings.RSS_RENDER_CHUNK_SIZE)
+    page = 1
+    while page_episodes := list(islice(episodes, max_items)):
+        yield page, page_episodes
+        page += 1
+
+
+def get_rss_page_digest(podcast: Podcast, episodes: List[Episode], page: int) -> str:
+    """Digest of source data for archive page (allows to detect changes without rendering)"""
+
+    template = get_rss_template("feed_template.xml")
+    source_data = [
+        template.version,
+        podcast.name,
+        podcast.description or "",
+        podcast.safe_image_url,
+        *get_rss_feed_links(podcast, page).values(),
+        *[get_rss_item_key(episode) for episode in episodes],
+    ]
+    return hashlib.sha256("|".join(source_data).encode()).hexdigest()
+
+
+def render_rss_stream(
+    podcast: Podcast,
+    episodes: Iterable[Episode] = None,
+    page: int = None,
+    feed_links: Dict[str, str] = None,
+) -> Iterator[str]:
+    """
+    Generate rss for Podcast and Episodes marked as "published" chunk by chunk.
+    Episodes are fetched via server-side cursor and items are rendered by small batches,
+    so memory usage doesn't depend on size of the feed.
+
+    :param podcast: podcast for rendering
+    :param episodes: episodes for archive page (main feed's episodes are fetched by default)
+    :param page: number of archive page (main feed is rendered if page is not set)
+    :param feed_links: prepared links to another pages (are calculated by default)
+    """
+
+    feed_name = f"archive page {page}" if page else "main feed"
+    logger.info(f"Podcast #{podcast.id}: RSS generation has been started ({feed_name}).")
+    if episodes is None:
+        query = get_published_episodes(podcast)
+        if podcast.safe_rss_max_items:
+            query = query.limit(podcast.safe_rss_max_items)
+
+        episodes = iterate_server_side(query, array_size=settings.RSS_RENDER_CHUNK_SIZE)
+
+    template = get_rss_template("feed_template.xml")
+    yield from template.generate(
+        podcast=podcast,
+        items=_render_rss_items_stream(episodes),
+        feed_links=get_rss_feed_links(podcast, page) if feed_links is None else feed_links,
+        is_archive=page is not None,
+        settings=settings,
+    )
+    logger.info(f"Podcast #{podcast.id}: RSS generation has been finished.")
+
+
+def render_rss_to_file(podcast_id: int) -> str:
+    """Generate rss for Podcast and Episodes marked as "published" to the local file"""
+
+    podcast = Podcast.get_by_id(podcast_id)
     rss_filename = os.path.join(settings.TMP_RSS_PATH, f"{podcast.publish_id}.xml")
     logger.info(f"Podcast #{podcast.publish_id}: Generation new file rss [{rss_filename}]")
     with open(rss_filename, "w") as fh:
-        result_rss = template.render(podcast=podcast, **context)
-        fh.write(result_rss)
+        fh.writelines(render_rss_stream(podcast))
 
-    logger.info(f"Podcast #{podcast_id}: RSS generation has been finished.")
     return rss_filename
 
 
+def render_rss_to_spool(podcast: Podcast) -> Tuple[IO[bytes], str]:
+    """
+    Render podcast's RSS once: content is kept in spooled buffer (in memory up to
+    RSS_SPOOL_MAX_SIZE, in tmp file above) and digest is calculated on the fly.
+    :return: buffer (rewound to start) with rendered content and its digest
+    """
+
+    hasher = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(
+        max_size=settings.RSS_SPOOL_MAX_SIZE, dir=settings.TMP_RSS_PATH
+    )
+    try:
+        for chunk in render_rss_stream(podcast):
+            content = chunk.encode()
+            hasher.update(content)
+            spool.write(content)
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, hasher.hexdigest()
+
+
+def _render_rss_items_stream(episodes: Iterable[Episode]) -> Iterator[str]:
+    """Allows to render items for (possibly huge) episodes iterable by batches"""
+
+    episodes = iter(episodes)
+    while episodes_batch := list(islice(episodes, settings.RSS_RENDER_CHUNK_SIZE)):
+        yield from render_rss_items(episodes_batch)
+
+
+@lru_cache()
+def get_rss_template(template_name: str) -> Template:
+    """Compiled (once per process) jinja template from `templates/rss` directory"""
+
+    with open(os.path.join(settings.TEMPLATE_PATH, "rss", template_name)) as fh:
+        template_source = fh.read()
+
+    template = Template(template_source)
+    template.version = hashlib.md5(template_source.encode()).hexdigest()[:8]
+    return template
+
+
+def get_rss_item_key(episode: Episode) -> str:
+    """
+    Allows to build cache key for rendered episode's <item>:
+    episode's ID + fingerprint of all fields, which are used in the item's template.
+    """
+    template = get_rss_template("feed_item.xml")
+    fingerprint_data = [template.version] + [
+        str(getattr(episode, field)) for field in RSS_ITEM_FIELDS
+    ]
+    fingerprint = hashlib.md5("|".join(fingerprint_data).encode()).hexdigest()
+    return f"rss_item:{episode.id}:{fingerprint}"
+
+
+def render_rss_items(episodes: Iterable[Episode]) -> List[str]:
+    """
+    Allows to get rendered <item> fragments for requested episodes.
+    Fragments are cached in redis, so only changed (or new) episodes will be re-rendered.
+    """
+
+    episodes = list(episodes)
+    if not episodes:
+        return []
+
+    redis_client = RedisClient()
+    item_keys = [get_rss_item_key(episode) for episode in episodes]
+    cached_items = redis_client.get_many(item_keys, pkey="item_key")
+
+    items, rendered_items = [], {}
+    template = get_rss_template("feed_item.xml")
+    for episode, item_key in zip(episodes, item_keys):
+        if item_key in cached_items:
+            items.append(cached_items[item_key]["content"])
+            continue
+
+        content = template.render(episode=episode).strip()
+        rendered_items[item_key] = {"item_key": item_key, "content": content}
+        items.append(content)
+
+    if rendered_items:
+        redis_client.set_many(rendered_items, ttl=settings.RSS_ITEM_CACHE_TTL)
+
+    logger.debug(
+        "RSS items: rendered %i, got from cache %i", len(rendered_items), len(cached_items)
+    )
+    return items
+
+
 def delete_file(filepath: Union[str, Path]):
     """Delete local file"""
 
@@ -76,6 +297,21 @@ def get_file_size(file_path: str):
         return 0
 
 
+def get_file_checksum(file_path: str) -> Optional[str]:
+    """SHA-256 of file's content (None if file doesn't exist)"""
+
+    hasher = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as fh:
+            while chunk := fh.read(1024 * 1024):
+                hasher.update(chunk)
+    except FileNotFoundError:
+        logger.info("File %s not found. Return empty checksum", file_path)
+        return None
+
+    return hasher.hexdigest()
+
+
 async def check_state(episodes: Iterable[Episode]) -> list:
     """Allows to get info about download progress for requested episodes"""
 
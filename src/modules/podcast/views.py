@@ -1,16 +1,20 @@
-import asyncio
 import http
 import re
 from abc import ABC
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from email.utils import format_datetime
 from functools import partial
-from typing import List, Iterable
+from typing import Dict, List, Iterable, NamedTuple, Optional
 import logging
 
 import aiohttp_jinja2
 import peewee
+import rq
 from aiohttp import web
 from cerberus import Validator
-import yt_dlp
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
 
 from app_i18n import aiohttp_translations
 from common.storage import StorageS3
@@ -25,22 +29,51 @@ from common.decorators import (
     errors_api_wrapped,
 )
 from common.excpetions import YoutubeFetchError, InvalidParameterError
+from common.cache import AsyncLRUCache
+from common.executors import run_in_executor, EXECUTOR_QUEUE, EXECUTOR_RENDER
 from common.models import BaseModel
-from common.utils import redirect, add_message, is_mobile_app, cut_string
+from common.utils import redirect, add_message, is_mobile_app, cut_string, get_object_or_404
 from common.views import BaseApiView
-from modules.podcast import tasks
-from modules.podcast.models import Podcast, Episode
-from modules.podcast.utils import get_file_name, EpisodeStatuses
-from modules.youtube.utils import get_youtube_info, get_video_id
+from modules.podcast import tasks, queues
+from modules.podcast.models import Podcast, Episode, FeedArchivePage, MediaFile
+from modules.podcast.utils import (
+    get_file_name,
+    get_published_episodes,
+    get_rss_url,
+    render_rss_stream,
+    EpisodeStatuses,
+)
+from modules.youtube.utils import (
+    YoutubeInfo,
+    get_youtube_info,
+    get_youtube_infos,
+    get_playlist_info,
+    get_video_id,
+)
 from modules.podcast.utils import check_state
 
 
 _ = aiohttp_translations.gettext
 logger = logging.getLogger(__name__)
+ACTIVE_JOB_STATUSES = (
+    JobStatus.QUEUED,
+    JobStatus.STARTED,
+    JobStatus.DEFERRED,
+    JobStatus.SCHEDULED,
+)
+ENQUEUE_MARKER_TTL = 30  # seconds: check of job's status and its enqueueing are performed under it
+
+
+def get_enqueue_marker_key(job_id: str) -> str:
+    return f"enqueue_marker:{job_id}"
 
 
 class BasePodcastApiView(BaseApiView, ABC):
     kwarg_pk = "pk"
+    symbols_regex = re.compile("[&^<>*#]")
+    http_link_regex = re.compile(
+        "http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*(),]|(?:%-[0-9a-fA-F][0-9a-fA-F]))+"
+    )
 
     async def _get_object(self) -> BaseModel:
         instance_id = self.request.match_info.get(self.kwarg_pk)
@@ -55,17 +88,72 @@ class BasePodcastApiView(BaseApiView, ABC):
         return instance
 
     async def _generate_rss(self, podcast_id):
-        await self._enqueue_task(tasks.generate_rss, podcast_id)
+        rq_queue = self.request.app.rq_queues[settings.RQ_QUEUE_RSS]
+        await run_in_executor(EXECUTOR_QUEUE, tasks.schedule_rss_generation, rq_queue, podcast_id)
+
+    async def _enqueue_task(
+        self, task, *args, job_id: str = None, queue_name: str = None, **kwargs
+    ):
+        rq_queue = self.request.app.rq_queues[queue_name or queues.route_task(task)]
+        await run_in_executor(
+            EXECUTOR_QUEUE, self._enqueue_unique, rq_queue, task, job_id, *args, **kwargs
+        )
+
+    @staticmethod
+    def _enqueue_unique(rq_queue: rq.Queue, task, job_id: Optional[str], *args, **kwargs):
+        """Enqueue task with deterministic job ID: it is skipped if the same job is in progress"""
+
+        if not job_id:
+            return rq_queue.enqueue(task, *args, **kwargs)
+
+        # marker makes check + enqueue atomic: concurrent request for the same job is skipped
+        connection = rq_queue.connection
+        marker_key = get_enqueue_marker_key(job_id)
+        if not connection.set(marker_key, 1, ex=ENQUEUE_MARKER_TTL, nx=True):
+            logger.info("Job %s is being enqueued by another request. Enqueue SKIP", job_id)
+            return None
 
-    async def _enqueue_task(self, task, *args, **kwargs):
-        loop = asyncio.get_running_loop()
-        handler = partial(self.request.app.rq_queue.enqueue, task, *args, **kwargs)
-        await loop.run_in_executor(None, handler)
+        try:
+            try:
+                job_status = Job.fetch(job_id, connection=connection).get_status()
+            except NoSuchJobError:
+                job_status = None
+
+            if job_status in ACTIVE_JOB_STATUSES:
+                logger.info("Job %s is already %s. Enqueue SKIP", job_id, job_status.value)
+                return None
+
+            return rq_queue.enqueue(task, *args, job_id=job_id, **kwargs)
+        finally:
+            connection.delete(marker_key)
 
     def _check_owner(self, target_object: BaseModel):
         if self.user.id != target_object.created_by_id:
             raise web.HTTPForbidden(body=f"You have not access to {target_object}")
 
+    def _replace_special_symbols(self, value):
+        res = self.http_link_regex.sub("[LINK]", value)
+        return self.symbols_regex.sub("", res)
+
+    async def _release_media_files(self, episodes: Iterable[Episode]) -> List[str]:
+        """
+        Remove references of deleted episodes from media files registry
+        (must be called in the same transaction as episodes' deletion).
+        :return: names of files which aren't used by any episode anymore
+        """
+
+        refs_by_source = Counter(episode.source_id for episode in episodes)
+        sources_by_count = defaultdict(list)
+        for source_id, count in refs_by_source.items():
+            sources_by_count[count].append(source_id)
+
+        objects = self.request.app.objects
+        for count, source_ids in sources_by_count.items():
+            await objects.execute(MediaFile.release_query(source_ids, count=count))
+
+        unused_files = await objects.execute(MediaFile.delete_unused_query(list(refs_by_source)))
+        return [media_file.file_name for media_file in unused_files if media_file.file_name]
+
 
 class IndexView(web.View):
     template_name = "index.html"
@@ -108,6 +196,13 @@ class PodcastRetrieveUpdateApiView(BasePodcastApiView):
         {
             "name": {"type": "string", "minlength": 1, "maxlength": 256, "required": False},
             "description": {"type": "string", "minlength": 1, "required": False},
+            "rss_max_items": {
+                "type": "integer",
+                "min": 0,
+                "nullable": True,
+                "required": False,
+                "coerce": lambda value: int(value) if value not in ("", None) else None,
+            },
         }
     )
 
@@ -121,7 +216,15 @@ class PodcastRetrieveUpdateApiView(BasePodcastApiView):
     @login_required
     async def delete(self):
         podcast = await self._get_object()
-        await self.request.app.objects.delete(podcast)
+        objects = self.request.app.objects
+        episodes = await podcast.get_episodes_async(objects, self.user.id)
+        async with objects.transaction():
+            file_names = await self._release_media_files(episodes)
+            await objects.delete(podcast)
+
+        if file_names:
+            await StorageS3().delete_files_async(file_names)
+
         return web.json_response({"status": "OK"})
 
     @login_required
@@ -129,9 +232,12 @@ class PodcastRetrieveUpdateApiView(BasePodcastApiView):
     async def post(self):
         podcast = await self._get_object()
         cleaned_data = await self._validate()
+        rss_max_items = podcast.rss_max_items
         for key, value in cleaned_data.items():
             setattr(podcast, key, value)
         await self.request.app.objects.update(podcast)
+        if podcast.rss_max_items != rss_max_items:
+            await self._generate_rss(podcast.id)
         redirect_url = self.request.headers.get("Referer") or self.request.path
         return redirect(self.request, "podcast_details", url=redirect_url)
 
@@ -140,36 +246,33 @@ class PodcastDeleteApiView(BasePodcastApiView):
     model_class = Podcast
     kwarg_pk = "podcast_id"
 
-    async def _delete_files(self, podcast: Podcast, episodes: List[Episode]):
-        podcast_file_names = {episode.file_name for episode in episodes}
-        same_file_episodes = await self.request.app.objects.execute(
-            Episode.select().where(
-                Episode.podcast_id != podcast.id,
-                Episode.file_name.in_(podcast_file_names),
-            )
-        )
-        exist_file_names = {episode.file_name for episode in same_file_episodes or []}
-
-        files_to_remove = podcast_file_names - exist_file_names
-        files_to_skip = exist_file_names & podcast_file_names
-        if files_to_skip:
-            self.logger.warning(
-                "There are another episodes with files %s. Skip this files removing.",
-                files_to_skip,
-            )
+    async def _delete_files(self, podcast: Podcast, file_names: List[str]):
+        """Removing RSS files of podcast and media files which aren't used by other episodes"""
 
-        storage = StorageS3()
-        await storage.delete_files_async(list(files_to_remove))
-        await storage.delete_files_async(
-            [f"{podcast.publish_id}.xml"], remote_path=settings.S3_BUCKET_RSS_PATH
+        archive_pages = await self.request.app.objects.execute(
+            FeedArchivePage.select().where(FeedArchivePage.podcast_id == podcast.id)
         )
+        rss_file_names = [f"{podcast.publish_id}.xml"] + [
+            FeedArchivePage.get_file_name(podcast.publish_id, archive_page.page)
+            for archive_page in archive_pages
+        ]
+        storage = StorageS3()
+        if file_names:
+            await storage.delete_files_async(file_names)
+
+        await storage.delete_files_async(rss_file_names, remote_path=settings.S3_BUCKET_RSS_PATH)
 
     @login_required
     async def get(self):
         podcast: Podcast = await self._get_object()
-        episodes = await podcast.get_episodes_async(self.request.app.objects, self.user.id)
-        await self._delete_files(podcast, episodes)
-        await self.request.app.objects.delete(podcast, recursive=True)
+        objects = self.request.app.objects
+        episodes = await podcast.get_episodes_async(objects, self.user.id)
+        async with objects.transaction():
+            file_names = await self._release_media_files(episodes)
+            await objects.delete(podcast, recursive=True)
+
+        # files are removed after committing: rolled back deletion doesn't lose them
+        await self._delete_files(podcast, file_names)
         add_message(self.request, f'Podcast "{podcast.name}" was deleted')
         return redirect(self.request, "podcast_list")
 
@@ -186,6 +289,20 @@ class PodcastUpdateRSSApiView(BasePodcastApiView):
         return redirect(self.request, "podcast_details", podcast_id=podcast.id)
 
 
+class PodcastRetryFailedApiView(BasePodcastApiView):
+    model_class = Podcast
+    kwarg_pk = "podcast_id"
+
+    @login_required
+    async def get(self):
+        podcast = await self._get_object()
+        await self._enqueue_task(tasks.retry_failed_downloads, podcast.id)
+        add_message(
+            self.request, f"Downloading of failed episodes for {podcast.name} will be retried soon"
+        )
+        return redirect(self.request, "podcast_details", podcast_id=podcast.id)
+
+
 class PodcastListCreateApiView(BasePodcastApiView):
     template_name = "podcast/list.html"
     model_class = Podcast
@@ -242,7 +359,14 @@ class EpisodeRetrieveUpdateApiView(BasePodcastApiView):
     @login_required
     async def delete(self):
         episode = await self._get_object()
-        await self.request.app.objects.delete(episode)
+        objects = self.request.app.objects
+        async with objects.transaction():
+            file_names = await self._release_media_files([episode])
+            await objects.delete(episode)
+
+        if file_names:
+            await StorageS3().delete_files_async(file_names)
+
         return web.json_response({"status": "OK"})
 
     @login_required
@@ -267,32 +391,20 @@ class EpisodeDeleteApiView(BasePodcastApiView):
     model_class = Episode
     kwarg_pk = "episode_id"
 
-    async def _delete_file(self, episode: Episode):
-        """Removing file associated with requested episode"""
-
-        same_file_episodes = await self.request.app.objects.execute(
-            Episode.select().where(
-                Episode.source_id == episode.source_id,
-                Episode.status != Episode.STATUS_NEW,
-                Episode.id != episode.id,
-            )
-        )
-        if same_file_episodes:
-            episode_ids = ",".join([f"#{episode.id}" for episode in same_file_episodes])
-            self.logger.warning(
-                f"There are another episodes for file {episode.file_name}: {episode_ids}. "
-                f"Skip file removing."
-            )
-            return
-
-        return await StorageS3().delete_files_async([episode.file_name])
-
     @login_required
     async def get(self):
         podcast_id = self.request.match_info.get("podcast_id")
         episode: Episode = await self._get_object()
-        await self._delete_file(episode)
-        await self.request.app.objects.delete(episode, recursive=True)
+        objects = self.request.app.objects
+        async with objects.transaction():
+            file_names = await self._release_media_files([episode])
+            await objects.delete(episode, recursive=True)
+
+        if file_names:
+            await StorageS3().delete_files_async(file_names)
+        else:
+            self.logger.info(f"File of {episode} is used by another episodes. Skip removing.")
+
         await self._generate_rss(podcast_id)
         self.logger.info(f"Episode {episode} successful removed.")
         add_message(self.request, f"Episode for youtube ID {episode.source_id} was removed.")
@@ -314,16 +426,14 @@ class EpisodeDownloadApiView(BasePodcastApiView):
             tasks.download_episode,
             youtube_link=episode.watch_url,
             episode_id=episode.id,
+            job_id=tasks.get_download_job_id(episode.source_id),
+            queue_name=queues.get_download_queue_name(episode.length),
         )
         return redirect(self.request, "progress")
 
 
 class EpisodeCreateApiView(BasePodcastApiView):
     template_name = "podcast/list.html"
-    symbols_regex = re.compile("[&^<>*#]")
-    http_link_regex = re.compile(
-        "http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*(),]|(?:%-[0-9a-fA-F][0-9a-fA-F]))+"
-    )
     model_class = Podcast
     kwarg_pk = "podcast_id"
     validator = Validator(
@@ -386,7 +496,10 @@ class EpisodeCreateApiView(BasePodcastApiView):
         except YoutubeFetchError:
             return redirect(self.request, "podcast_details", podcast_id=podcast_id)
 
-        episode = await self.request.app.objects.create(Episode, **episode_data)
+        objects = self.request.app.objects
+        async with objects.transaction():
+            episode = await objects.create(Episode, **episode_data)
+            await objects.execute(MediaFile.register_query(episode.source_id, episode.file_name))
 
         if podcast.download_automatically:
             episode.status = Episode.STATUS_DOWNLOADING
@@ -395,6 +508,8 @@ class EpisodeCreateApiView(BasePodcastApiView):
                 tasks.download_episode,
                 youtube_link=episode.watch_url,
                 episode_id=episode.id,
+                job_id=tasks.get_download_job_id(episode.source_id),
+                queue_name=queues.get_download_queue_name(episode.length),
             )
             add_message(
                 self.request,
@@ -411,10 +526,6 @@ class EpisodeCreateApiView(BasePodcastApiView):
             episode_id=str(episode.id),
         )
 
-    def _replace_special_symbols(self, value):
-        res = self.http_link_regex.sub("[LINK]", value)
-        return self.symbols_regex.sub("", res)
-
     async def _get_episode_data(
         self, same_episode: Episode, podcast_id: int, video_id: str, youtube_link: str
     ) -> dict:
@@ -546,30 +657,317 @@ class PlayListVideosApiView(BaseApiView):
     @login_api_required
     async def post(self):
         cleaned_data = await self._validate(allow_empty=True)
-        playlist_url = cleaned_data.get("playlist_url")
-        loop = asyncio.get_running_loop()
-
-        with yt_dlp.YoutubeDL({"logger": self.logger, "noplaylist": False}) as ydl:
-            extract_info = partial(ydl.extract_info, playlist_url, download=False)
-            youtube_details = await loop.run_in_executor(None, extract_info)
-
-        yt_content_type = youtube_details.get("_type")
-        if not yt_content_type == "playlist":
-            logger.warning("Unknown type of returned youtube details: %s", yt_content_type)
-            logger.debug("Returned info: {%s}", youtube_details)
-            raise InvalidParameterError(
-                details=f"It seems like incorrect playlist. {yt_content_type=}"
-            )
+        try:
+            playlist = await get_playlist_info(cleaned_data.get("playlist_url"))
+        except YoutubeExtractInfoError as error:
+            raise InvalidParameterError(details=str(error))
 
         entries = [
             {
-                "id": video["id"],
-                "title": video["title"],
-                "description": cut_string(video["description"], 200),
-                "thumbnail_url": video["thumbnails"][0]["url"] if video.get("thumbnails") else "",
-                "url": video["webpage_url"],
+                "id": video.video_id,
+                "title": video.title,
+                "description": cut_string(video.description, 200),
+                "thumbnail_url": video.thumbnail_url,
+                "url": video.watch_url,
             }
-            for video in youtube_details["entries"]
+            for video in playlist.entries
         ]
-        res = {"id": youtube_details["id"], "title": youtube_details["title"], "entries": entries}
+        res = {"id": playlist.playlist_id, "title": playlist.title, "entries": entries}
         return res, http.HTTPStatus.OK
+
+
+class PlayListImportApiView(BasePodcastApiView):
+    """
+    Allows to create episodes for videos of youtube playlist (all of them or selected ones) at once:
+    episodes are inserted by single query and downloads are enqueued by single redis pipeline.
+    Videos' info is taken from playlist's extraction (or from cache, filled by playlist's listing)
+    """
+
+    model_class = Podcast
+    kwarg_pk = "podcast_id"
+    validator = Validator(
+        {
+            "playlist_url": {"type": "string", "minlength": 6, "maxlength": 256, "required": False},
+            "video_ids": {
+                "type": "list",
+                "maxlength": settings.PLAYLIST_IMPORT_MAX_VIDEOS,
+                "schema": {"type": "string", "regex": "^[0-9A-Za-z_-]{11}$"},
+                "required": False,
+            },
+        }
+    )
+
+    @json_response
+    @errors_api_wrapped
+    @login_api_required
+    async def post(self):
+        podcast: Podcast = await self._get_object()
+        cleaned_data = await self._validate()
+        playlist_url = cleaned_data.get("playlist_url")
+        video_ids = list(dict.fromkeys(cleaned_data.get("video_ids") or []))
+        if not (playlist_url or video_ids):
+            raise InvalidParameterError(details="playlist_url or video_ids are required")
+
+        youtube_infos = await self._get_youtube_infos(playlist_url, video_ids)
+        requested_ids = video_ids or list(youtube_infos)
+        exist_episodes = await self.request.app.objects.execute(
+            Episode.select(Episode.source_id).where(
+                Episode.podcast_id == podcast.id, Episode.source_id.in_(requested_ids)
+            )
+        )
+        exist_ids = {episode.source_id for episode in exist_episodes}
+        new_infos = [info for info in youtube_infos.values() if info.video_id not in exist_ids]
+        episodes = await self._create_episodes(podcast, new_infos) if new_infos else []
+
+        downloading_episodes = [
+            episode for episode in episodes if episode.status == Episode.STATUS_DOWNLOADING
+        ]
+        if downloading_episodes:
+            await run_in_executor(
+                EXECUTOR_QUEUE,
+                self._enqueue_downloads,
+                self.request.app.rq_queues,
+                downloading_episodes,
+            )
+
+        if any(episode.status == Episode.STATUS_PUBLISHED for episode in episodes):
+            await self._generate_rss(podcast.id)
+
+        self.logger.info(
+            "Playlist import to %s: %i episodes created, %i enqueued for downloading",
+            podcast,
+            len(episodes),
+            len(downloading_episodes),
+        )
+        result = {
+            "created": [
+                {"id": episode.id, "source_id": episode.source_id, "status": episode.status}
+                for episode in episodes
+            ],
+            "skipped": [video_id for video_id in requested_ids if video_id in exist_ids],
+            "failed": [video_id for video_id in requested_ids if video_id not in youtube_infos],
+        }
+        return result, http.HTTPStatus.CREATED
+
+    @staticmethod
+    async def _get_youtube_infos(
+        playlist_url: Optional[str], video_ids: List[str]
+    ) -> Dict[str, YoutubeInfo]:
+        """Info of requested videos (ordered as requested)"""
+
+        if playlist_url:
+            try:
+                playlist = await get_playlist_info(playlist_url)
+            except YoutubeExtractInfoError as error:
+                raise InvalidParameterError(details=str(error))
+
+            # the same limit as for selected videos: the whole playlist can't be bigger
+            if not video_ids and len(playlist.entries) > settings.PLAYLIST_IMPORT_MAX_VIDEOS:
+                raise InvalidParameterError(
+                    details=(
+                        f"Playlist has {len(playlist.entries)} videos "
+                        f"(max {settings.PLAYLIST_IMPORT_MAX_VIDEOS} per request): "
+                        f"select video_ids for import"
+                    )
+                )
+
+            youtube_infos = {video.video_id: video for video in playlist.entries}
+        else:
+            youtube_infos = await get_youtube_infos(video_ids)
+
+        if not video_ids:
+            return youtube_infos
+
+        return {
+            video_id: youtube_infos[video_id] for video_id in video_ids if video_id in youtube_infos
+        }
+
+    async def _create_episodes(
+        self, podcast: Podcast, youtube_infos: List[YoutubeInfo]
+    ) -> List[Episode]:
+        """
+        Insert episodes by single query (and register their media files).
+        Episodes with already uploaded files are published at once (they aren't downloaded again)
+        """
+
+        objects = self.request.app.objects
+        media_files = await objects.execute(
+            MediaFile.select().where(
+                MediaFile.source_id.in_([youtube_info.video_id for youtube_info in youtube_infos])
+            )
+        )
+        media_files = {media_file.source_id: media_file for media_file in media_files}
+        created_at = datetime.utcnow()
+        rows = []
+        for youtube_info in youtube_infos:
+            media_file: Optional[MediaFile] = media_files.get(youtube_info.video_id)
+            # file of the source is shared: name is taken from registry if source is known
+            file_name = media_file.file_name if media_file else None
+            episode_data = {
+                "source_id": youtube_info.video_id,
+                "podcast_id": podcast.id,
+                "watch_url": youtube_info.watch_url,
+                "title": self._replace_special_symbols(youtube_info.title),
+                "description": self._replace_special_symbols(youtube_info.description),
+                "image_url": youtube_info.thumbnail_url,
+                "author": youtube_info.author,
+                "length": youtube_info.length,
+                "file_name": file_name or get_file_name(youtube_info.video_id),
+                "remote_url": None,
+                "file_size": 0,
+                "status": Episode.STATUS_NEW,
+                "published_at": None,
+                "created_at": created_at,
+                "created_by_id": self.user.id,
+            }
+            if media_file and media_file.is_uploaded:
+                episode_data.update(
+                    {
+                        "status": Episode.STATUS_PUBLISHED,
+                        "remote_url": media_file.remote_url,
+                        "file_size": media_file.size,
+                        "published_at": created_at,
+                    }
+                )
+            elif podcast.download_automatically:
+                episode_data["status"] = Episode.STATUS_DOWNLOADING
+
+            rows.append(episode_data)
+
+        async with objects.transaction():
+            episodes = list(await objects.execute(Episode.insert_many(rows).returning(Episode)))
+            await objects.execute(
+                MediaFile.register_many_query(
+                    {episode.source_id: episode.file_name for episode in episodes}
+                )
+            )
+
+        return episodes
+
+    @staticmethod
+    def _enqueue_downloads(rq_queues: Dict[str, rq.Queue], episodes: List[Episode]):
+        """Enqueue downloading of episodes by single redis pipeline (jobs in progress are skipped)"""
+
+        connection = rq_queues[settings.RQ_QUEUE_DOWNLOADS].connection
+        job_ids = [tasks.get_download_job_id(episode.source_id) for episode in episodes]
+        # the same markers as for single job (see `_enqueue_unique`) are set by single round trip
+        marker_keys = [get_enqueue_marker_key(job_id) for job_id in job_ids]
+        with connection.pipeline() as pipeline:
+            for marker_key in marker_keys:
+                pipeline.set(marker_key, 1, ex=ENQUEUE_MARKER_TTL, nx=True)
+            marked = pipeline.execute()
+
+        marked_job_ids = [job_id for job_id, is_marked in zip(job_ids, marked) if is_marked]
+        try:
+            active_job_ids = {
+                job.id
+                for job in Job.fetch_many(marked_job_ids, connection=connection)
+                if job and job.get_status(refresh=False) in ACTIVE_JOB_STATUSES
+            }
+            job_datas = defaultdict(list)
+            for episode, job_id, is_marked in zip(episodes, job_ids, marked):
+                if not is_marked:
+                    logger.info("Job %s is being enqueued by another request. Enqueue SKIP", job_id)
+                    continue
+
+                if job_id in active_job_ids:
+                    logger.info("Job %s is already in progress. Enqueue SKIP", job_id)
+                    continue
+
+                job_datas[queues.get_download_queue_name(episode.length)].append(
+                    rq.Queue.prepare_data(
+                        tasks.download_episode,
+                        kwargs={"youtube_link": episode.watch_url, "episode_id": episode.id},
+                        job_id=job_id,
+                    )
+                )
+
+            with connection.pipeline() as pipeline:
+                for queue_name, queue_job_datas in job_datas.items():
+                    rq_queues[queue_name].enqueue_many(queue_job_datas, pipeline=pipeline)
+                pipeline.execute()
+        finally:
+            if marked_job_ids:
+                connection.delete(*[get_enqueue_marker_key(job_id) for job_id in marked_job_ids])
+
+
+class RSSFeedView(web.View):
+    """
+    Allows to get podcast's RSS directly from the web app.
+    Rendered feeds are cached in-process (until new version is published by `generate_rss`)
+    and conditional requests (ETag / Last-Modified) are answered with 304.
+    Feeds with more than RSS_WEB_MAX_ITEMS items aren't rendered: request is redirected
+    to the published file.
+    """
+
+    class RenderedFeed(NamedTuple):
+        content: Optional[bytes]  # None: feed is too big for rendering by web app
+
+    async def get(self):
+        publish_id = self.request.match_info.get("publish_id")
+        podcast: Podcast = await get_object_or_404(self.request, Podcast, publish_id=publish_id)
+        if not podcast.rss_digest:
+            raise web.HTTPNotFound(body=f"RSS for podcast {publish_id} is not published yet.")
+
+        # published version is known before rendering: conditional requests don't touch the cache
+        headers = {
+            "ETag": f'"{podcast.rss_digest}"',
+            "Cache-Control": settings.S3_CACHE_CONTROL_RSS,
+        }
+        if podcast.rss_published_at:
+            published_at = podcast.rss_published_at.replace(tzinfo=timezone.utc)
+            headers["Last-Modified"] = format_datetime(published_at, usegmt=True)
+
+        if self._is_not_modified(podcast):
+            return web.Response(status=http.HTTPStatus.NOT_MODIFIED, headers=headers)
+
+        rss_cache: AsyncLRUCache = self.request.app.rss_cache
+        feed: RSSFeedView.RenderedFeed = await rss_cache.get_or_create(
+            publish_id, factory=partial(self._render_feed, podcast), version=podcast.rss_digest
+        )
+        if feed.content is None:
+            raise web.HTTPFound(podcast.rss_link)
+
+        response = web.Response(
+            body=feed.content, content_type="application/rss+xml", charset="utf-8", headers=headers
+        )
+        response.enable_compression()
+        return response
+
+    def _is_not_modified(self, podcast: Podcast) -> bool:
+        if_none_match = self.request.if_none_match
+        if if_none_match:
+            return any(etag.value in (podcast.rss_digest, "*") for etag in if_none_match)
+
+        if_modified_since = self.request.if_modified_since
+        if if_modified_since and podcast.rss_published_at:
+            published_at = podcast.rss_published_at.replace(tzinfo=timezone.utc, microsecond=0)
+            return published_at <= if_modified_since
+
+        return False
+
+    async def _render_feed(self, podcast: Podcast) -> RenderedFeed:
+        logger.info("Rendering RSS for %s (not found in cache)", podcast)
+        db_objects = self.request.app.objects
+        max_items = podcast.safe_rss_max_items
+        if not max_items or max_items > settings.RSS_WEB_MAX_ITEMS:
+            # one extra item shows that feed is too big (without counting of all episodes)
+            max_items = settings.RSS_WEB_MAX_ITEMS + 1
+
+        episodes = list(await db_objects.execute(get_published_episodes(podcast).limit(max_items)))
+        if len(episodes) > settings.RSS_WEB_MAX_ITEMS:
+            logger.info("RSS for %s is too big for rendering. Redirect to published file", podcast)
+            return self.RenderedFeed(content=None)
+
+        archive_pages_count = await db_objects.count(
+            FeedArchivePage.select().where(FeedArchivePage.podcast_id == podcast.id)
+        )
+        feed_links = {}
+        if archive_pages_count:
+            feed_links["prev-archive"] = get_rss_url(podcast, archive_pages_count)
+
+        def render() -> bytes:
+            return "".join(render_rss_stream(podcast, episodes, feed_links=feed_links)).encode()
+
+        content = await run_in_executor(EXECUTOR_RENDER, render)
+        return self.RenderedFeed(content=content)
@@ -1,18 +1,42 @@
 import asyncio
+import json
 import os
 import re
 import subprocess
+import sys
+import threading
+import time
+from collections import deque
 from functools import partial
-from typing import Optional, NamedTuple
+from typing import Optional, NamedTuple, IO, List, Callable, Dict
 
 import yt_dlp
 
 import settings
-from modules.youtube.exceptions import YoutubeExtractInfoError, FFMPegPreparationError
+from common.cache import SingleFlight
+from common.executors import run_in_executor, EXECUTOR_EXTRACTION
+from common.redis import RedisClient
+from common.excpetions import StorageUploadError
+from common.storage import StorageS3
+from modules.youtube.exceptions import (
+    YoutubeException,
+    YoutubeExtractInfoError,
+    FFMPegPreparationError,
+)
 from modules.podcast.utils import get_file_size, episode_process_hook, EpisodeStatuses
 from common.utils import get_logger
 
 logger = get_logger(__name__)
+STREAM_PROGRESS_PREFIX = "stream-progress:"
+STREAM_PROGRESS_TEMPLATE = (
+    f"download:{STREAM_PROGRESS_PREFIX}"
+    "%(progress.downloaded_bytes)s:%(progress.total_bytes)s:%(progress.total_bytes_estimate)s"
+)
+STREAM_PROGRESS_INTERVAL = 1  # seconds between progress updates (in redis)
+PREPARATION_AUTO = "auto"
+PREPARATION_REMUX = "remux"
+PREPARATION_TRANSCODE = "transcode"
+_info_extractions = SingleFlight()  # concurrent requests of the same video share extraction
 
 
 class YoutubeInfo(NamedTuple):
@@ -27,6 +51,14 @@ class YoutubeInfo(NamedTuple):
     length: int
 
 
+class PlaylistInfo(NamedTuple):
+    """Structure of information about youtube playlist (with info of its videos)"""
+
+    playlist_id: str
+    title: str
+    entries: List[YoutubeInfo]
+
+
 def get_video_id(youtube_link: str) -> Optional[str]:
     matched_url = re.findall(r"(?:v=|/)([0-9A-Za-z_-]{11}).*", youtube_link)
     if not matched_url:
@@ -50,79 +82,289 @@ def download_process_hook(event: dict):
     )
 
 
-def download_audio(youtube_link: str, filename: str) -> str:
+def download_audio(youtube_link: str, filename: str, dst_dir: str = None) -> str:
     """
     Download youtube video and perform to audio (.mp3) file
+    (partially downloaded file from previous call is continued)
 
     :param youtube_link: URL to youtube video which are needed to download
     :param filename: autogenerated filename for episode
+    :param dst_dir: directory for result file (settings.TMP_AUDIO_PATH by default)
     :return result file name
     """
     params = {
         "format": "bestaudio/best",
-        "outtmpl": os.path.join(settings.TMP_AUDIO_PATH, filename),
+        "outtmpl": os.path.join(dst_dir or settings.TMP_AUDIO_PATH, filename),
+        "continuedl": True,
         "logger": get_logger("youtube_dl.YoutubeDL"),
         "progress_hooks": [download_process_hook],
     }
     with yt_dlp.YoutubeDL(params) as ydl:
-        ydl.download([youtube_link])
+        try:
+            ydl.download([youtube_link])
+        except yt_dlp.utils.DownloadError as error:
+            raise YoutubeException(error) from error
 
     return filename
 
 
+def get_youtube_info_key(video_id: str) -> str:
+    return f"youtube_info:{video_id}"
+
+
+def get_watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
 async def get_youtube_info(youtube_link: str) -> YoutubeInfo:
+    """
+    Allows to get info about youtube video. Extracted info (or extraction's failure)
+    is cached in redis by video ID, concurrent requests of the same video share single extraction
+    """
+
+    video_id = get_video_id(youtube_link)
+    if not video_id:
+        return await _extract_youtube_info(youtube_link)
+
+    return await _info_extractions.run(
+        video_id, partial(_get_cached_youtube_info, video_id, youtube_link)
+    )
+
+
+async def get_youtube_infos(video_ids: List[str]) -> Dict[str, YoutubeInfo]:
+    """
+    Allows to get info about several videos: cached info is requested from redis at once,
+    not cached videos are extracted concurrently. Videos which can't be extracted are skipped
+    """
+
+    cached_infos = await RedisClient().async_get_many(
+        [get_youtube_info_key(video_id) for video_id in video_ids], pkey="video_id"
+    )
+    youtube_infos, not_cached_ids = {}, []
+    for video_id in video_ids:
+        cached_info = cached_infos.get(video_id)
+        if not cached_info:
+            not_cached_ids.append(video_id)
+        elif "error" not in cached_info:
+            youtube_infos[video_id] = YoutubeInfo(**cached_info)
+
+    extractions = [
+        _info_extractions.run(
+            video_id, partial(_extract_and_cache_youtube_info, video_id, get_watch_url(video_id))
+        )
+        for video_id in not_cached_ids
+    ]
+    results = await asyncio.gather(*extractions, return_exceptions=True)
+    for video_id, result in zip(not_cached_ids, results):
+        if isinstance(result, YoutubeExtractInfoError):
+            continue
+        if isinstance(result, BaseException):
+            raise result
+
+        youtube_infos[video_id] = result
+
+    return youtube_infos
+
+
+async def get_playlist_info(playlist_url: str) -> PlaylistInfo:
+    """
+    Allows to extract info about youtube playlist with its videos (by single extraction).
+    Info of the videos is cached, so it is reused by get_youtube_info(s) later
+    """
+
+    logger.info(f"Started fetching playlist data for {playlist_url}")
+    try:
+        with yt_dlp.YoutubeDL({"logger": logger, "noplaylist": False}) as ydl:
+            youtube_details = await run_in_executor(
+                EXECUTOR_EXTRACTION, ydl.extract_info, playlist_url, download=False
+            )
+
+    except Exception as error:
+        logger.exception(f"youtube.prefetch failed: {playlist_url} ({error})")
+        raise YoutubeExtractInfoError(error)
+
+    yt_content_type = youtube_details.get("_type")
+    if not yt_content_type == "playlist":
+        logger.warning("Unknown type of returned youtube details: %s", yt_content_type)
+        logger.debug("Returned info: {%s}", youtube_details)
+        raise YoutubeExtractInfoError(f"It seems like incorrect playlist. {yt_content_type=}")
+
+    # unavailable videos of playlist are returned as empty entries
+    entries = [_parse_youtube_info(video) for video in youtube_details["entries"] if video]
+    if entries:
+        await RedisClient().async_set_many(
+            {get_youtube_info_key(entry.video_id): entry._asdict() for entry in entries},
+            ttl=settings.YOUTUBE_INFO_CACHE_TTL,
+        )
+
+    return PlaylistInfo(
+        playlist_id=youtube_details["id"], title=youtube_details["title"], entries=entries
+    )
+
+
+async def _get_cached_youtube_info(video_id: str, youtube_link: str) -> YoutubeInfo:
+    if cached_info := await RedisClient().async_get(get_youtube_info_key(video_id)):
+        if "error" in cached_info:
+            logger.info("Extraction of info for %s failed recently: %s", video_id, cached_info)
+            raise YoutubeExtractInfoError(cached_info["error"])
+
+        logger.debug("Info for %s found in cache", video_id)
+        return YoutubeInfo(**cached_info)
+
+    return await _extract_and_cache_youtube_info(video_id, youtube_link)
+
+
+async def _extract_and_cache_youtube_info(video_id: str, youtube_link: str) -> YoutubeInfo:
+    redis_client = RedisClient()
+    cache_key = get_youtube_info_key(video_id)
+    try:
+        youtube_info = await _extract_youtube_info(youtube_link)
+    except YoutubeExtractInfoError as error:
+        if settings.YOUTUBE_INFO_ERROR_TTL:
+            await redis_client.async_set(
+                cache_key,
+                {"video_id": video_id, "error": str(error)},
+                ttl=settings.YOUTUBE_INFO_ERROR_TTL,
+            )
+        raise
+
+    await redis_client.async_set(
+        cache_key, youtube_info._asdict(), ttl=settings.YOUTUBE_INFO_CACHE_TTL
+    )
+    return youtube_info
+
+
+async def _extract_youtube_info(youtube_link: str) -> YoutubeInfo:
     """Allows extract info about youtube video from Youtube webpage (powered by youtube_dl)"""
 
     logger.info(f"Started fetching data for {youtube_link}")
-    loop = asyncio.get_running_loop()
 
     try:
         with yt_dlp.YoutubeDL({"logger": logger, "noplaylist": True}) as ydl:
-            extract_info = partial(ydl.extract_info, youtube_link, download=False)
-            youtube_details = await loop.run_in_executor(None, extract_info)
+            youtube_details = await run_in_executor(
+                EXECUTOR_EXTRACTION, ydl.extract_info, youtube_link, download=False
+            )
 
     except Exception as error:
         logger.exception(f"youtube.prefetch failed: {youtube_link} ({error})")
         raise YoutubeExtractInfoError(error)
 
-    youtube_info = YoutubeInfo(
+    return _parse_youtube_info(youtube_details)
+
+
+def _parse_youtube_info(youtube_details: dict) -> YoutubeInfo:
+    thumbnail_url = youtube_details.get("thumbnail")
+    if not thumbnail_url and youtube_details.get("thumbnails"):
+        thumbnail_url = youtube_details["thumbnails"][0]["url"]
+
+    return YoutubeInfo(
         title=youtube_details["title"],
-        description=youtube_details["description"],
+        description=youtube_details.get("description") or "",
         watch_url=youtube_details["webpage_url"],
         video_id=youtube_details["id"],
-        thumbnail_url=youtube_details["thumbnail"],
-        author=youtube_details["uploader"],
-        length=youtube_details["duration"],
+        thumbnail_url=thumbnail_url or "",
+        author=youtube_details.get("uploader"),
+        length=youtube_details.get("duration"),
     )
-    return youtube_info
 
 
-def ffmpeg_preparation(filename: str):
+class AudioProbe(NamedTuple):
+    """Structure of audio stream's details (provided by ffprobe)"""
+
+    format_name: str
+    codec_name: str
+    duration: float
+    bit_rate: int
+
+
+def probe_audio(src_path: str) -> AudioProbe:
+    """Allows to get details about first audio stream of the file (powered by ffprobe)"""
+
+    proc = subprocess.run(
+        [
+            *("ffprobe", "-v", "error", "-print_format", "json"),
+            *("-show_format", "-show_streams", "-select_streams", "a:0", src_path),
+        ],
+        capture_output=True,
+        timeout=settings.FFMPEG_TIMEOUT,
+    )
+    if proc.returncode != 0:
+        raise FFMPegPreparationError(f"ffprobe failed ({proc.returncode}): {proc.stderr[-1000:]}")
+
+    probe_result = json.loads(proc.stdout or "{}")
+    streams = probe_result.get("streams") or [{}]
+    file_format = probe_result.get("format") or {}
+    return AudioProbe(
+        format_name=file_format.get("format_name", ""),
+        codec_name=streams[0].get("codec_name", ""),
+        duration=float(file_format.get("duration") or streams[0].get("duration") or 0),
+        bit_rate=int(file_format.get("bit_rate") or streams[0].get("bit_rate") or 0),
+    )
+
+
+def choose_preparation_strategy(audio_probe: Optional[AudioProbe]) -> str:
+    """
+    Remux (stream copy + rewriting of Xing/LAME header) is enough for mp3 source:
+    it fixes duration's metadata without re-encoding. Other codecs are transcoded to mp3.
+    """
+
+    if settings.FFMPEG_PREPARATION_STRATEGY != PREPARATION_AUTO:
+        return settings.FFMPEG_PREPARATION_STRATEGY
+
+    if audio_probe and audio_probe.codec_name in settings.FFMPEG_REMUX_CODECS:
+        return PREPARATION_REMUX
+
+    return PREPARATION_TRANSCODE
+
+
+def get_preparation_args(strategy: str, src_path: str, dst_path: str) -> List[str]:
+    if strategy == PREPARATION_REMUX:
+        codec_args = ["-map", "0:a:0", "-c:a", "copy", "-write_xing", "1", "-id3v2_version", "3"]
+    else:
+        codec_args = ["-strict", "-2"]
+
+    return ["ffmpeg", "-i", src_path, *codec_args, "-y", dst_path]
+
+
+def ffmpeg_preparation(filename: str, src_dir: str = None):
     """
     FFmpeg allows to fix problem with length of audio track
-    (in metadata value for this is incorrect, but fact length is fully correct)
+    (in metadata value for this is incorrect, but fact length is fully correct).
+    Strategy of preparation (remux or full transcode) is chosen by ffprobe's details of source.
     """
 
     logger.info(f"Start FFMPEG preparations for {filename} === ")
-    src_path = os.path.join(settings.TMP_AUDIO_PATH, filename)
+    src_dir = src_dir or settings.TMP_AUDIO_PATH
+    src_path = os.path.join(src_dir, filename)
     episode_process_hook(
         status=EpisodeStatuses.episode_postprocessing,
         filename=filename,
         total_bytes=get_file_size(src_path),
         processed_bytes=0,
     )
-    tmp_filename = os.path.join(settings.TMP_AUDIO_PATH, f"tmp_{filename}")
-    proc = subprocess.Popen(["ffmpeg", "-i", src_path, "-strict", "-2", "-y", tmp_filename])
-    outs, errs = proc.communicate(timeout=settings.FFMPEG_TIMEOUT)
-    if outs:
-        logger.info(outs)
-    if errs:
-        logger.error(errs)
+    try:
+        audio_probe = probe_audio(src_path)
+    except (FFMPegPreparationError, subprocess.SubprocessError, OSError, ValueError) as error:
+        logger.warning("Couldn't probe %s (full transcoding will be used): %r", filename, error)
+        audio_probe = None
+
+    tmp_filename = os.path.join(src_dir, f"tmp_{filename}")
+    strategy = choose_preparation_strategy(audio_probe)
+    logger.info("FFMPEG preparation for %s: strategy %s (%s)", filename, strategy, audio_probe)
+    duration = audio_probe.duration if audio_probe else 0
+    progress_handler = PreparationProgress(filename, get_file_size(src_path), duration)
+    try:
+        _run_preparation(strategy, src_path, tmp_filename, progress_handler)
+    except FFMPegPreparationError:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
         episode_process_hook(status=EpisodeStatuses.error, filename=filename)
+        raise
 
     try:
-        os.remove(src_path)
-        os.rename(tmp_filename, src_path)
+        # replacing is atomic: source file isn't lost if worker is killed here
+        os.replace(tmp_filename, src_path)
     except IOError as err:
         logger.exception("Failed to rename/remove tmp file after ffmpeg preparation")
         episode_process_hook(status=EpisodeStatuses.error, filename=filename)
@@ -136,3 +378,302 @@ def ffmpeg_preparation(filename: str):
         processed_bytes=total_file_size,
     )
     logger.info("FFMPEG Preparation for %s was done", filename)
+
+
+class PreparationProgress:
+    """
+    Allows to report real progress of ffmpeg's post processing: processed time (against probed
+    duration) is converted to bytes of source file. It is called by `_run_ffmpeg`
+    """
+
+    def __init__(self, filename: str, total_bytes: int, duration: float):
+        self.filename = filename
+        self.total_bytes = total_bytes
+        self.duration = duration
+        self._reported_at = 0.0
+
+    def __call__(self, processed_seconds: float):
+        if not self.duration:
+            return
+
+        if time.monotonic() - self._reported_at < STREAM_PROGRESS_INTERVAL:
+            return
+
+        self._reported_at = time.monotonic()
+        processed_ratio = min(processed_seconds / self.duration, 1)
+        episode_process_hook(
+            status=EpisodeStatuses.episode_postprocessing,
+            filename=self.filename,
+            total_bytes=self.total_bytes,
+            processed_bytes=int(self.total_bytes * processed_ratio),
+        )
+
+
+def _run_preparation(
+    strategy: str, src_path: str, dst_path: str, progress_handler: Callable[[float], None] = None
+):
+    """Run ffmpeg with requested strategy (fallback to full transcoding if remux failed)"""
+
+    try:
+        _run_ffmpeg(get_preparation_args(strategy, src_path, dst_path), progress_handler)
+    except FFMPegPreparationError as error:
+        if strategy == PREPARATION_TRANSCODE:
+            raise
+
+        logger.warning(
+            "FFMPEG %s failed for %s: %r. Fallback to transcoding", strategy, src_path, error
+        )
+        args = get_preparation_args(PREPARATION_TRANSCODE, src_path, dst_path)
+        _run_ffmpeg(args, progress_handler)
+
+
+def parse_ffmpeg_progress(line: str) -> Optional[float]:
+    """Extract processed time (in seconds) from ffmpeg's progress line (`-progress pipe:1`)"""
+
+    key, _, value = line.strip().partition("=")
+    if key not in ("out_time_ms", "out_time_us"):
+        return None
+
+    try:
+        # NOTE: ffmpeg provides microseconds in both of fields (out_time_ms is misnamed)
+        return max(int(value), 0) / 1_000_000
+    except ValueError:
+        return None
+
+
+def _run_ffmpeg(args: List[str], progress_handler: Callable[[float], None] = None):
+    """
+    Run ffmpeg and report processed time (in seconds) to progress_handler.
+    ffmpeg is killed (and reaped) if it didn't finish in FFMPEG_TIMEOUT seconds.
+    """
+
+    command, *options = args
+    proc = subprocess.Popen(
+        [command, "-nostats", "-progress", "pipe:1", *options],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stderr_lines = deque(maxlen=20)
+    stderr_reader = _read_lines(proc.stderr, stderr_lines.append)
+    timed_out = threading.Event()
+
+    def on_timeout():
+        # Timer.cancel() sets watchdog's own `finished` event: timeout is marked separately
+        timed_out.set()
+        proc.kill()
+
+    watchdog = threading.Timer(settings.FFMPEG_TIMEOUT, on_timeout)
+    watchdog.start()
+    try:
+        for line in iter(proc.stdout.readline, b""):
+            processed_seconds = parse_ffmpeg_progress(line.decode(errors="replace"))
+            if processed_seconds is not None and progress_handler:
+                progress_handler(processed_seconds)
+
+        proc.wait()
+    finally:
+        watchdog.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+        proc.stdout.close()
+        stderr_reader.join()
+
+    if timed_out.is_set():
+        raise FFMPegPreparationError(f"ffmpeg timeout ({settings.FFMPEG_TIMEOUT}s)")
+
+    if proc.returncode != 0:
+        stderr = "\n".join(stderr_lines)
+        raise FFMPegPreparationError(f"ffmpeg failed ({proc.returncode}): {stderr}")
+
+
+class StreamProgress:
+    """Progress of streaming pipeline (is shared between reading threads and uploading)"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.uploaded_bytes = 0
+        self.download_finished = threading.Event()
+        self._reported_at = 0.0
+
+    def download_hook(self, line: str):
+        downloaded_bytes, total_bytes = parse_stream_progress(line)
+        self.downloaded_bytes = downloaded_bytes or self.downloaded_bytes
+        self.total_bytes = total_bytes or self.total_bytes
+        if self._is_time_to_report():
+            episode_process_hook(
+                status=EpisodeStatuses.episode_downloading,
+                filename=self.filename,
+                total_bytes=self.total_bytes,
+                processed_bytes=self.downloaded_bytes,
+            )
+
+    def finish_download(self):
+        self.download_finished.set()
+        episode_process_hook(
+            status=EpisodeStatuses.episode_postprocessing,
+            filename=self.filename,
+            total_bytes=self.downloaded_bytes,
+            processed_bytes=self.downloaded_bytes,
+        )
+
+    def upload_hook(self, chunk: int):
+        """It is called by `s3.upload_fileobj` (uploading is reported after source was read)"""
+        self.uploaded_bytes += chunk
+        if self.download_finished.is_set() and self._is_time_to_report():
+            episode_process_hook(
+                status=EpisodeStatuses.episode_uploading,
+                filename=self.filename,
+                total_bytes=max(self.uploaded_bytes, self.downloaded_bytes),
+                processed_bytes=self.uploaded_bytes,
+            )
+
+    def _is_time_to_report(self) -> bool:
+        if time.monotonic() - self._reported_at < STREAM_PROGRESS_INTERVAL:
+            return False
+
+        self._reported_at = time.monotonic()
+        return True
+
+
+def parse_stream_progress(line: str) -> tuple:
+    """Extract (downloaded_bytes, total_bytes) from yt-dlp's progress line (see --progress-template)"""
+
+    if not line.startswith(STREAM_PROGRESS_PREFIX):
+        return 0, 0
+
+    values = []
+    for value in line.removeprefix(STREAM_PROGRESS_PREFIX).strip().split(":"):
+        try:
+            values.append(int(float(value)))
+        except ValueError:
+            values.append(0)
+
+    downloaded_bytes, total_bytes, total_bytes_estimate = (values + [0, 0, 0])[:3]
+    return downloaded_bytes, total_bytes or total_bytes_estimate
+
+
+def _read_lines(stream: IO[bytes], handler, on_finish=None) -> threading.Thread:
+    """Drain stream (stderr of subprocess) line by line in background thread"""
+
+    def read():
+        for line in iter(stream.readline, b""):
+            handler(line.decode(errors="replace").strip())
+        stream.close()
+        if on_finish:
+            on_finish()
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    return thread
+
+
+def stream_audio(youtube_link: str, filename: str) -> str:
+    """
+    Download youtube video, perform it to audio (.mp3) and upload result to S3 without
+    intermediate files: yt-dlp (stdout) -> ffmpeg (stdin -> stdout) -> S3 multipart uploading.
+    Buffers between stages are bounded: OS pipes between processes and limited count of
+    in-memory parts for uploading of non-seekable stream (boto3's TransferConfig).
+
+    :param youtube_link: URL to youtube video which are needed to download
+    :param filename: autogenerated filename for episode
+    :return URL of uploaded file
+    """
+
+    logger.info("Start streaming of %s to %s", youtube_link, filename)
+    progress = StreamProgress(filename)
+    episode_process_hook(
+        status=EpisodeStatuses.episode_downloading, filename=filename, processed_bytes=0
+    )
+    downloader = subprocess.Popen(
+        [
+            sys.executable,
+            *("-m", "yt_dlp", youtube_link),
+            *("--format", "bestaudio/best", "--output", "-"),
+            *("--quiet", "--progress", "--newline"),
+            *("--progress-template", STREAM_PROGRESS_TEMPLATE),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    converter = subprocess.Popen(
+        [
+            *("ffmpeg", "-hide_banner", "-loglevel", "error"),
+            *("-i", "pipe:0", "-strict", "-2", "-f", settings.RESULT_FILE_EXT, "pipe:1"),
+        ],
+        stdin=downloader.stdout,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # converter is the only reader: downloader gets SIGPIPE if converter exits
+    downloader.stdout.close()
+    downloader_errors, converter_errors = [], []
+
+    def downloader_output(line: str):
+        if line.startswith(STREAM_PROGRESS_PREFIX):
+            progress.download_hook(line)
+        elif line:
+            downloader_errors.append(line)
+
+    readers = [
+        _read_lines(downloader.stderr, downloader_output, on_finish=progress.finish_download),
+        _read_lines(converter.stderr, converter_errors.append),
+    ]
+    result_url = None
+    timed_out = False
+    try:
+        result_url = StorageS3().upload_fileobj(
+            converter.stdout, filename, callback=progress.upload_hook
+        )
+        # nobody reads converter's output after failed uploading: processes would be blocked
+        # on full pipes, so they are killed (by finally-block below) instead of waiting
+        if result_url:
+            downloader.wait(timeout=settings.FFMPEG_TIMEOUT)
+            converter.wait(timeout=settings.FFMPEG_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+    finally:
+        for proc in (downloader, converter):
+            if proc.poll() is None:
+                logger.warning(
+                    "Killing %s (pid %s): streaming wasn't finished", proc.args[0], proc.pid
+                )
+                proc.kill()
+                proc.wait()
+
+        converter.stdout.close()
+        for reader in readers:
+            reader.join()
+
+    error = None
+    if timed_out:
+        error = YoutubeException(f"Streaming wasn't finished in {settings.FFMPEG_TIMEOUT}s")
+    elif not result_url:
+        error = StorageUploadError(f"Couldn't upload streamed file {filename} to the storage")
+    elif downloader.returncode != 0:
+        error = YoutubeException(f"yt-dlp failed ({downloader.returncode}): {downloader_errors}")
+    elif converter.returncode != 0:
+        error = FFMPegPreparationError(
+            f"ffmpeg failed ({converter.returncode}): {converter_errors}"
+        )
+
+    if error:
+        logger.error("Streaming of %s failed: %s", filename, error)
+        if result_url:
+            StorageS3().delete_file(filename)
+
+        episode_process_hook(status=EpisodeStatuses.error, filename=filename)
+        raise error
+
+    episode_process_hook(
+        status=EpisodeStatuses.episode_uploading,
+        filename=filename,
+        total_bytes=progress.uploaded_bytes,
+        processed_bytes=progress.uploaded_bytes,
+    )
+    logger.info("Streaming of %s was done (%i bytes uploaded)", filename, progress.uploaded_bytes)
+    return result_url
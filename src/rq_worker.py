@@ -1,8 +1,8 @@
+import argparse
 import logging
-import sys
 
 from redis import Redis
-from rq import Connection, Worker
+from rq import Connection
 import sentry_sdk
 from sentry_sdk.integrations.logging import LoggingIntegration
 from sentry_sdk.integrations.rq import RqIntegration
@@ -10,6 +10,8 @@ from sentry_sdk.integrations.rq import RqIntegration
 import settings
 from app import database
 from common.utils import get_logger, database_init
+from common.worker import ConcurrentWorker, WeightedWorker, parse_weighted_queues
+from common.workdir import ScratchSpace
 
 logger = get_logger("rq.worker")
 
@@ -22,9 +24,31 @@ def run_worker():
         sentry_logging = LoggingIntegration(level=logging.INFO, event_level=logging.ERROR)
         sentry_sdk.init(settings.SENTRY_DSN, integrations=[RqIntegration(), sentry_logging])
 
+    ScratchSpace().start_sweeper()
+    p = argparse.ArgumentParser()
+    p.add_argument("queues", nargs="*", help="queues with weights, e.g.: podcast_rss:5")
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.RQ_WORKER_CONCURRENCY,
+        help="count of jobs which are performed at once (in threads of the worker's process)",
+    )
+    args = p.parse_args()
+    weighted_queues = parse_weighted_queues(args.queues or settings.RQ_WORKER_QUEUES.split(","))
+    logger.info(
+        "Starting worker for queues (with weights): %s | concurrency: %i",
+        weighted_queues,
+        args.concurrency,
+    )
     with Connection(Redis(*settings.REDIS_CON)):
-        qs = sys.argv[1:] or ["default"]
-        Worker(qs).work()
+        if args.concurrency > 1:
+            worker = ConcurrentWorker(
+                list(weighted_queues), weights=weighted_queues, concurrency=args.concurrency
+            )
+        else:
+            worker = WeightedWorker(list(weighted_queues), weights=weighted_queues)
+
+        worker.work(with_scheduler=True)
 
 
 if __name__ == "__main__":
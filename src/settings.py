@@ -33,9 +33,12 @@ REDIS_CON = REDIS_HOST, REDIS_PORT
 
 DEBUG = os.getenv("APP_DEBUG", "") in ("1", "True")
 RESULT_AUDIO_PATH = os.path.join(PROJECT_ROOT_DIR, "media", "audio")
-TMP_AUDIO_PATH = tempfile.mkdtemp(prefix="podcast_audio__")
-TMP_RSS_PATH = tempfile.mkdtemp(prefix="podcast_rss__")
-TMP_IMAGE_PATH = tempfile.mkdtemp(prefix="podcast_images__")
+SCRATCH_ROOT = os.getenv("SCRATCH_ROOT", os.path.join(tempfile.gettempdir(), "podcast_scratch"))
+os.makedirs(SCRATCH_ROOT, exist_ok=True)
+TMP_AUDIO_PATH = tempfile.mkdtemp(prefix=f"podcast_audio__{os.getpid()}_", dir=SCRATCH_ROOT)
+TMP_RSS_PATH = tempfile.mkdtemp(prefix=f"podcast_rss__{os.getpid()}_", dir=SCRATCH_ROOT)
+TMP_IMAGE_PATH = tempfile.mkdtemp(prefix=f"podcast_images__{os.getpid()}_", dir=SCRATCH_ROOT)
+WORK_DIR_ROOT = os.getenv("WORK_DIR_ROOT", os.path.join(SCRATCH_ROOT, "jobs"))
 RESULT_RSS_PATH = os.path.join(PROJECT_ROOT_DIR, "media", "rss")
 TEMPLATE_PATH = os.path.join(BASE_DIR, "templates")
 STATIC_PATH = os.path.join(PROJECT_ROOT_DIR, "static")
@@ -53,6 +56,14 @@ S3_BUCKET_IMAGES_PATH = os.getenv("S3_BUCKET_IMAGES_PATH", "images/")
 S3_DEFAULT_PODCAST_IMAGE = os.path.join(
     S3_BUCKET_NAME, S3_BUCKET_IMAGES_PATH, "podcast-default.jpg"
 )
+S3_CACHE_CONTROL_RSS = os.getenv("S3_CACHE_CONTROL_RSS", "public, max-age=300")
+S3_CACHE_CONTROL_AUDIO = os.getenv("S3_CACHE_CONTROL_AUDIO", "public, max-age=31536000, immutable")
+S3_GZIP_RSS = os.getenv("S3_GZIP_RSS", "1") in ("1", "True")
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))  # 8 MB
+S3_MULTIPART_CHUNK_SIZE = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024))  # 8 MB
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 10))  # threads per transfer
+S3_MAX_BANDWIDTH = int(os.getenv("S3_MAX_BANDWIDTH", 0))  # bytes per second (0 - unlimited)
+S3_CALLBACK_MIN_BYTES = int(os.getenv("S3_CALLBACK_MIN_BYTES", 1024 * 1024))  # progress step
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 SENDGRID_API_VERSION = "v3"
@@ -65,6 +76,7 @@ LOCALES_BY_DEFAULT = "en"
 LOCALES = ["en", "ru"]
 
 os.makedirs(TMP_AUDIO_PATH, exist_ok=True)
+os.makedirs(WORK_DIR_ROOT, exist_ok=True)
 os.makedirs(RESULT_RSS_PATH, exist_ok=True)
 os.makedirs(STATIC_PATH, exist_ok=True)
 
@@ -75,7 +87,68 @@ SITE_URL = os.getenv("SITE_URL", "https://podcast.site.com/")
 
 DOWNLOAD_EVENT_REDIS_TTL = 60 * 60  # 60 minutes
 RQ_DEFAULT_TIMEOUT = 24 * 3600  # 24 hours
+RQ_QUEUE_RSS = "podcast_rss"
+RQ_QUEUE_DOWNLOADS = "youtube_downloads"
+RQ_QUEUE_LONG_DOWNLOADS = "youtube_downloads_long"
+RQ_QUEUE_MAINTENANCE = "podcast_maintenance"
+RQ_QUEUE_FETCH = "episode_fetch"  # stages of download pipeline (see DOWNLOAD_PIPELINE)
+RQ_QUEUE_PREPARATION = "episode_preparation"
+RQ_QUEUE_PUBLISH = "episode_publish"
+RQ_QUEUE_FEED = "episode_feed"
+RQ_SHORT_DOWNLOAD_MAX_LENGTH = int(os.getenv("RQ_SHORT_DOWNLOAD_MAX_LENGTH", 30 * 60))  # seconds
+RQ_WORKER_QUEUES = os.getenv(
+    "RQ_WORKER_QUEUES",
+    "podcast_rss:5,youtube_downloads:3,youtube_downloads_long:1,podcast_maintenance:1,"
+    "episode_fetch:3,episode_preparation:1,episode_publish:3,episode_feed:5",
+)  # queues (with weights) which are consumed by worker by default (pipeline's stages included)
+RQ_WORKER_CONCURRENCY = int(os.getenv("RQ_WORKER_CONCURRENCY", 1))  # jobs at once (in threads)
+WORKER_STAGE_CONCURRENCY = {  # limits of jobs' stages at once (per worker process)
+    "download": int(os.getenv("WORKER_DOWNLOAD_CONCURRENCY", 4)),
+    "preparation": int(os.getenv("WORKER_PREPARATION_CONCURRENCY", os.cpu_count() or 1)),
+    "uploading": int(os.getenv("WORKER_UPLOADING_CONCURRENCY", 4)),
+}
+WEB_EXECUTORS = {  # threads of web app for blocking calls (separate pool for each kind of work)
+    "extraction": int(os.getenv("WEB_EXTRACTION_THREADS", 4)),
+    "storage": int(os.getenv("WEB_STORAGE_THREADS", 8)),
+    "queue": int(os.getenv("WEB_QUEUE_THREADS", 4)),
+    "redis": int(os.getenv("WEB_REDIS_THREADS", 8)),
+    "render": int(os.getenv("WEB_RENDER_THREADS", 2)),
+}
+WEB_EXECUTOR_SLOW_WAIT = float(os.getenv("WEB_EXECUTOR_SLOW_WAIT", 1))  # warn about waiting (sec)
 FFMPEG_TIMEOUT = 2 * 60 * 60  # 2 hours
+FFMPEG_PREPARATION_STRATEGY = os.getenv("FFMPEG_PREPARATION_STRATEGY", "auto")  # remux/transcode
+FFMPEG_REMUX_CODECS = os.getenv("FFMPEG_REMUX_CODECS", "mp3").split(",")  # fixed without re-encode
+DOWNLOAD_STREAMING = os.getenv("DOWNLOAD_STREAMING", "") in ("1", "True")  # no tmp audio files
+SCRATCH_MIN_FREE_BYTES = int(os.getenv("SCRATCH_MIN_FREE_BYTES", 1024 * 1024 * 1024))  # 1 GB
+SCRATCH_EPISODE_BYTES_PER_SECOND = 48 * 1024  # estimation: source + prepared copy of episode
+SCRATCH_ORPHAN_TTL = int(os.getenv("SCRATCH_ORPHAN_TTL", 24 * 3600))  # 24 hours
+SCRATCH_SWEEP_INTERVAL = int(os.getenv("SCRATCH_SWEEP_INTERVAL", 3600))  # 1 hour
+DOWNLOAD_LOCK_TTL = int(os.getenv("DOWNLOAD_LOCK_TTL", 60))  # lease of source_id (renewed)
+DOWNLOAD_PIPELINE = os.getenv("DOWNLOAD_PIPELINE", "") in ("1", "True")  # chained stage jobs
+DOWNLOAD_STAGE_TIMINGS_TTL = int(os.getenv("DOWNLOAD_STAGE_TIMINGS_TTL", 7 * 24 * 3600))  # 7 days
+RETRY_BACKOFF_BASE = int(os.getenv("RETRY_BACKOFF_BASE", 30))  # delay of the first retry (sec)
+RETRY_BACKOFF_MAX = int(os.getenv("RETRY_BACKOFF_MAX", 3600))  # max delay between retries (sec)
+RETRY_STAGE_ATTEMPTS = {  # max attempts of download stages (transient errors are retried only)
+    "download": int(os.getenv("RETRY_DOWNLOAD_ATTEMPTS", 5)),
+    "preparation": int(os.getenv("RETRY_PREPARATION_ATTEMPTS", 2)),
+    "uploading": int(os.getenv("RETRY_UPLOADING_ATTEMPTS", 5)),
+    "streaming": int(os.getenv("RETRY_STREAMING_ATTEMPTS", 3)),
+}
+RETRY_HISTORY_TTL = int(os.getenv("RETRY_HISTORY_TTL", 7 * 24 * 3600))  # 7 days
+YOUTUBE_INFO_CACHE_TTL = int(os.getenv("YOUTUBE_INFO_CACHE_TTL", 24 * 3600))  # 24 hours
+YOUTUBE_INFO_ERROR_TTL = int(os.getenv("YOUTUBE_INFO_ERROR_TTL", 5 * 60))  # 0 - no negative cache
+PLAYLIST_IMPORT_MAX_VIDEOS = int(os.getenv("PLAYLIST_IMPORT_MAX_VIDEOS", 200))  # per request
+RSS_ITEM_CACHE_TTL = int(os.getenv("RSS_ITEM_CACHE_TTL", 7 * 24 * 3600))  # 7 days
+RSS_RENDER_CHUNK_SIZE = int(os.getenv("RSS_RENDER_CHUNK_SIZE", 500))  # episodes per fetch
+RSS_SPOOL_MAX_SIZE = int(os.getenv("RSS_SPOOL_MAX_SIZE", 8 * 1024 * 1024))  # 8MB in memory
+RSS_REGENERATION_DELAY = int(os.getenv("RSS_REGENERATION_DELAY", 10))  # 10 seconds
+RSS_REGENERATION_PENDING_TTL = 10 * 60  # 10 minutes
+RSS_MAX_RETRIES = int(os.getenv("RSS_MAX_RETRIES", 5))  # reschedules of failed RSS uploading
+RSS_MAX_ITEMS = int(os.getenv("RSS_MAX_ITEMS", 0))  # default limit for main feed (0 - unlimited)
+RSS_WEB_CACHE_SIZE = int(os.getenv("RSS_WEB_CACHE_SIZE", 128))  # feeds cached by web app
+RSS_WEB_MAX_ITEMS = int(os.getenv("RSS_WEB_MAX_ITEMS", 1000))  # bigger feeds are served by S3
+RSS_REGENERATION_CHUNK_SIZE = int(os.getenv("RSS_REGENERATION_CHUNK_SIZE", 50))  # podcasts per job
+RSS_REGENERATION_THREADS = int(os.getenv("RSS_REGENERATION_THREADS", 4))
 
 TESTING = "nosetests" in sys.argv[0]
 SENTRY_DSN = os.getenv("SENTRY_DSN")
@@ -3,35 +3,43 @@
 (function () {
     'use strict';
 
+    const IMPORT_BATCH_SIZE = 100;  // videos per import request (limited by server)
 
 
-    function createEpisode(podcastId, video) {
-        console.log("Create episode: ID: " + video.id + " URL: " + video.url)
+
+    function markImported(videoIds) {
+        videoIds.forEach(function (videoId) {
+            $("#statusIconVideo_" + videoId).find("svg").removeAttr("hidden")
+        })
+    }
+
+    function importVideos(podcastId, videoIds) {
+        // videos are imported by single request (videos' info is taken from loaded playlist)
         $.ajax({
-            url: '/podcasts/' + podcastId + '/episodes/',
+            url: '/api/podcasts/' + podcastId + '/playlist/import/',
             method: 'POST',
-            data: {'youtube_link': video.url},
-            async:false
-        }).done(function () {
-            console.log("Episode created for VideoID: " + video.id)
-            $("#statusIconVideo_" + video.id).find("svg").removeAttr("hidden")
+            contentType: 'application/json',
+            data: JSON.stringify({'video_ids': videoIds})
+        }).done(function (response) {
+            console.log("Episodes created: " + response.created.length + ", skipped: " + response.skipped.length)
+            markImported(response.created.map(function (episode) { return episode.source_id }))
+            markImported(response.skipped)
+            if (response.failed.length > 0){
+                console.info("Episodes weren't created for videos: ", response.failed);
+            }
         }).fail(function(response){console.info(response.responseJSON);});
-
     }
 
     function createEpisodes(podcastId){
         console.log("Create episodes", "podcast: ", podcastId);
         let inputs = $( "input:checked" );
-        let videoItems = [];
-        inputs.each(function(index, el){ videoItems.push({
-            "id": $(el).data("videoId"),
-            "url": $(el).data("videoUrl")
-        }) })
+        let videoIds = [];
+        inputs.each(function(index, el){ videoIds.push($(el).data("videoId")) })
         console.log(inputs);
 
-        videoItems.forEach(function (video) {
-            createEpisode(podcastId, video)
-        })
+        for (let start = 0; start < videoIds.length; start += IMPORT_BATCH_SIZE) {
+            importVideos(podcastId, videoIds.slice(start, start + IMPORT_BATCH_SIZE))
+        }
 
     }
 
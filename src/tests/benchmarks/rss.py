@@ -0,0 +1,245 @@
+"""
+Benchmark of RSS rendering / publishing on synthetic podcasts (10 ... 50k episodes).
+
+Runs against local (test) PostgreSQL, S3 and Redis are replaced by in-memory stand-ins.
+Usage (from `src` directory):
+    python -m tests.benchmarks.rss --save            # measure and store results as a baseline
+    python -m tests.benchmarks.rss --compare         # measure and compare with stored baseline
+    python -m tests.benchmarks.rss --sizes 10 1000   # custom catalogue sizes
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Tuple
+from unittest.mock import patch
+
+from common.models import database
+from common.redis import RedisClient
+from common.storage import StorageS3
+from common.utils import database_init
+from modules.auth.models import User
+from modules.podcast import tasks
+from modules.podcast.models import Episode, Podcast
+from modules.podcast.utils import render_rss_to_file
+
+DEFAULT_SIZES = (10, 1_000, 10_000, 50_000)
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "rss_baseline.json")
+REGRESSION_THRESHOLD = 0.2  # 20% slower (or more memory) than baseline
+INSERT_BATCH_SIZE = 1000
+
+
+class BenchmarkResult(NamedTuple):
+    duration: float  # seconds
+    peak_memory: int  # bytes
+    bytes_written: int
+
+
+class FakeS3Storage:
+    """In-memory stand-in for StorageS3: consumes uploaded content and counts its size"""
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def upload_fileobj(self, fileobj, filename: str, *_, **__) -> str:
+        while chunk := fileobj.read(64 * 1024):
+            self.bytes_written += len(chunk)
+        return f"http://fake-s3.local/{filename}"
+
+    def delete_file(self, *_, **__):
+        return 0
+
+
+class FakeRedisClient:
+    """In-memory stand-in for RedisClient (only methods used by RSS generation)"""
+
+    def __init__(self):
+        self.storage = {}
+
+    def get_many(self, keys, pkey: str) -> dict:
+        stored_items = (self.storage[key] for key in keys if key in self.storage)
+        return {stored_item[pkey]: stored_item for stored_item in stored_items}
+
+    def set_many(self, items: dict, ttl: int = 120):
+        self.storage.update(items)
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self.storage.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        self.storage[key] = self.storage.get(key, 0) + amount
+        return self.storage[key]
+
+
+def create_podcast(user: User, episodes_count: int) -> Podcast:
+    """Create synthetic podcast with requested count of published episodes"""
+
+    podcast = Podcast.create(
+        publish_id=Podcast.generate_publish_id(),
+        name=f"benchmark_podcast_{episodes_count}",
+        created_by=user,
+    )
+    published_at = datetime.utcnow() - timedelta(minutes=episodes_count)
+    for offset in range(0, episodes_count, INSERT_BATCH_SIZE):
+        batch_size = min(INSERT_BATCH_SIZE, episodes_count - offset)
+        rows = []
+        for index in range(offset, offset + batch_size):
+            source_id = uuid.uuid4().hex[:11]
+            rows.append(
+                {
+                    "source_id": source_id,
+                    "podcast_id": podcast.id,
+                    "title": f"Benchmark episode #{index} ({source_id})",
+                    "watch_url": f"https://www.youtube.com/watch?v={source_id}",
+                    "remote_url": f"http://fake-s3.local/audio/{source_id}.mp3",
+                    "image_url": f"http://fake-s3.local/images/{source_id}.jpg",
+                    "length": 60 * 60,
+                    "description": f"Description of benchmark episode #{index} " * 10,
+                    "file_name": f"{source_id}.mp3",
+                    "file_size": 50 * 1024 * 1024,
+                    "author": "Benchmark author",
+                    "status": Episode.STATUS_PUBLISHED,
+                    "published_at": published_at + timedelta(minutes=index),
+                    "created_by_id": user.id,
+                }
+            )
+        Episode.insert_many(rows).execute()
+
+    return podcast
+
+
+def measure(func: Callable[[], int]) -> BenchmarkResult:
+    """
+    Run func twice: for timing (without tracing overhead) and for peak memory (by tracemalloc)
+    :param func: callable which returns count of written bytes
+    """
+
+    start_time = time.perf_counter()
+    bytes_written = func()
+    duration = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        duration=round(duration, 4), peak_memory=peak_memory, bytes_written=bytes_written
+    )
+
+
+def run_benchmarks(sizes: List[int]) -> Dict[str, dict]:
+    storage = FakeS3Storage()
+    redis_client = FakeRedisClient()
+
+    def render_to_file(podcast: Podcast) -> int:
+        redis_client.storage.clear()
+        rss_filename = render_rss_to_file(podcast.id)
+        bytes_written = os.path.getsize(rss_filename)
+        os.remove(rss_filename)
+        return bytes_written
+
+    def generate_rss(podcast: Podcast) -> int:
+        redis_client.storage.clear()
+        # reset digest: generation mustn't be skipped as "content not changed"
+        Podcast.update(rss_link=None, rss_digest=None).where(Podcast.id == podcast.id).execute()
+        storage.bytes_written = 0
+        tasks.generate_rss(podcast.id)
+        return storage.bytes_written
+
+    cases: Tuple[Tuple[str, Callable[[Podcast], int]], ...] = (
+        ("render_rss_to_file", render_to_file),
+        ("generate_rss", generate_rss),
+    )
+    results = {}
+    user = User.create(email=f"b_{uuid.uuid4().hex[:10]}@bench.com", password="benchmark")
+    try:
+        with patch.object(StorageS3, "__new__", lambda *_, **__: storage), patch.object(
+            RedisClient, "__new__", lambda *_, **__: redis_client
+        ):
+            for size in sizes:
+                print(f"Preparing podcast with {size} episodes...")
+                podcast = create_podcast(user, size)
+                for case_name, case_func in cases:
+                    result = measure(lambda: case_func(podcast))
+                    results[f"{case_name}[{size}]"] = result._asdict()
+                    print(f"  {case_name}[{size}]: {format_result(result._asdict())}")
+    finally:
+        Episode.delete().where(Episode.created_by == user.id).execute()
+        Podcast.delete().where(Podcast.created_by == user.id).execute()
+        user.delete_instance()
+
+    return results
+
+
+def format_result(result: dict) -> str:
+    return (
+        f"{result['duration']:.4f}s | "
+        f"peak {result['peak_memory'] / 1024 / 1024:.2f} MiB | "
+        f"{result['bytes_written'] / 1024:.1f} KiB written"
+    )
+
+
+def compare_results(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Find benchmarks whose duration or peak memory exceed baseline by more than threshold"""
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name}: no baseline. SKIP")
+            continue
+
+        for metric in ("duration", "peak_memory"):
+            base_value, value = baseline[name][metric], result[metric]
+            change = (value - base_value) / base_value if base_value else 0
+            print(f"{name} {metric}: {base_value} -> {value} ({change:+.1%})")
+            if change > threshold:
+                regressions.append(f"{name} {metric}: {base_value} -> {value} ({change:+.1%})")
+
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--save", action="store_true", help="store results as a new baseline")
+    p.add_argument("--compare", action="store_true", help="compare results with baseline")
+    p.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = p.parse_args()
+    if args.compare and not os.path.exists(args.baseline):
+        print(f"Baseline {args.baseline} is not found: run benchmarks with --save first")
+        sys.exit(1)
+
+    database_init(database)
+    print(" ===== RSS benchmarks ===== ")
+    results = run_benchmarks(args.sizes)
+
+    if args.compare:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+
+        print(" ===== Comparison with baseline ===== ")
+        if regressions := compare_results(results, baseline, args.threshold):
+            print(" ===== Regressions found ===== ")
+            print("\n".join(regressions))
+            sys.exit(1)
+
+        print("No regressions found")
+
+    if args.save:
+        with open(args.baseline, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark of multipart uploading of (hour-long) episodes with different transfer configurations.
+
+Runs against S3-compatible storage from settings (S3_STORAGE_URL, e.g. local MinIO stand-in).
+Usage (from `src` directory):
+    python -m tests.benchmarks.upload                                # default matrix
+    python -m tests.benchmarks.upload --size-mb 120 --chunk-sizes 8 16 --concurrency 4 10
+    python -m tests.benchmarks.upload --bandwidth 5242880            # with bandwidth cap (B/s)
+"""
+
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from typing import List, NamedTuple
+
+from common.storage import StorageS3, get_transfer_config
+
+MB = 1024 * 1024
+DEFAULT_SIZE_MB = 60  # ~ hour-long episode (128 kbps)
+DEFAULT_CHUNK_SIZES_MB = (5, 8, 16, 32)
+DEFAULT_CONCURRENCY = (4, 10, 20)
+REMOTE_PATH = "benchmarks/"
+
+
+class UploadResult(NamedTuple):
+    chunk_size_mb: int
+    concurrency: int
+    duration: float  # seconds
+    throughput: float  # MB per second
+    callbacks: int
+
+
+def create_source_file(size_mb: int) -> str:
+    """Create temporary file with random (incompressible) content"""
+
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as fh:
+        for _ in range(size_mb):
+            fh.write(os.urandom(MB))
+
+    return fh.name
+
+
+def run_benchmarks(
+    size_mb: int, chunk_sizes: List[int], concurrency: List[int], bandwidth: int = None
+) -> List[UploadResult]:
+    storage = StorageS3()
+    src_path = create_source_file(size_mb)
+    filename = os.path.basename(src_path)
+    results = []
+    try:
+        for chunk_size_mb, max_concurrency in itertools.product(chunk_sizes, concurrency):
+            transfer_config = get_transfer_config(
+                multipart_chunksize=chunk_size_mb * MB,
+                max_concurrency=max_concurrency,
+                max_bandwidth=bandwidth,
+            )
+            callbacks = []
+            start_time = time.perf_counter()
+            result_url = storage.upload_file(
+                src_path,
+                filename,
+                callback=callbacks.append,
+                remote_path=REMOTE_PATH,
+                transfer_config=transfer_config,
+            )
+            duration = time.perf_counter() - start_time
+            if not result_url:
+                raise RuntimeError(f"Couldn't upload benchmark file to {REMOTE_PATH}")
+
+            result = UploadResult(
+                chunk_size_mb=chunk_size_mb,
+                concurrency=max_concurrency,
+                duration=round(duration, 3),
+                throughput=round(size_mb / duration, 2),
+                callbacks=len(callbacks),
+            )
+            results.append(result)
+            print(
+                f"chunk {chunk_size_mb:>3} MB | concurrency {max_concurrency:>3} | "
+                f"{result.duration:>8.3f}s | {result.throughput:>8.2f} MB/s | "
+                f"{result.callbacks} callbacks"
+            )
+    finally:
+        storage.delete_file(filename, remote_path=REMOTE_PATH)
+        os.remove(src_path)
+
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--size-mb", type=int, default=DEFAULT_SIZE_MB)
+    p.add_argument("--chunk-sizes", type=int, nargs="+", default=DEFAULT_CHUNK_SIZES_MB)
+    p.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    p.add_argument("--bandwidth", type=int, default=None, help="max bandwidth (bytes/sec)")
+    args = p.parse_args()
+
+    print(f" ===== Upload benchmarks ({args.size_mb} MB file) ===== ")
+    results = run_benchmarks(args.size_mb, args.chunk_sizes, args.concurrency, args.bandwidth)
+    best_result = max(results, key=lambda result: result.throughput)
+    print(
+        f"Best: chunk {best_result.chunk_size_mb} MB, concurrency {best_result.concurrency} "
+        f"({best_result.throughput} MB/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
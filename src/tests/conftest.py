@@ -20,7 +20,7 @@ from common.redis import RedisClient
 from common.storage import StorageS3
 from common.utils import database_init
 from modules.auth.models import User, UserInvite
-from modules.podcast.models import Podcast, Episode
+from modules.podcast.models import Podcast, Episode, MediaFile
 from modules.youtube import utils as youtube_utils
 from .mocks import MockYoutube, MockRedisClient, MockS3Client
 
@@ -55,6 +55,7 @@ def generate_video_id() -> str:
 
 def teardown_module(module):
     print(f"module teardown {module}")
+    MediaFile.truncate_table()
     Episode.truncate_table()
     Podcast.truncate_table()
     User.truncate_table()
@@ -198,11 +199,13 @@ named_urls = namedtuple(
         "podcasts_list",
         "podcasts_details",
         "podcasts_delete",
+        "podcasts_retry_failed",
         "podcasts_default",
         "episodes_list",
         "episodes_details",
         "episodes_delete",
         "episodes_download",
+        "playlist_import",
     ],
 )
 
@@ -218,11 +221,13 @@ def urls_tpl() -> named_urls:
         podcasts_list="/podcasts/",
         podcasts_details="/podcasts/{podcast_id}/",
         podcasts_delete="/podcasts/{podcast_id}/delete/",
+        podcasts_retry_failed="/podcasts/{podcast_id}/retry-failed/",
         podcasts_default="/podcasts/default/",
         episodes_list="/podcasts/{podcast_id}/episodes/",
         episodes_details="/podcasts/{podcast_id}/episodes/{episode_id}/",
         episodes_delete="/podcasts/{podcast_id}/episodes/{episode_id}/delete/",
         episodes_download="/podcasts/{podcast_id}/episodes/{episode_id}/download/",
+        playlist_import="/api/podcasts/{podcast_id}/playlist/import/",
     )
 
 
@@ -43,6 +43,23 @@ class MockRedisClient:
     def __init__(self, content=None):
         self._content = content or {}
         self.get_many = Mock(return_value=self._content)
+        self.set_many = Mock()
+        self.set_nx = Mock(return_value=True)
+        self.delete = Mock()
+        self.incr = Mock()
+        self.get = Mock(return_value=None)
+        self.set = Mock()
+        self.hset = Mock()
+        self.hgetall = Mock(return_value={})
+
+    async def async_get(self, key):
+        return self.get(key)
+
+    async def async_set(self, key, value, ttl=120):
+        return self.set(key, value, ttl=ttl)
+
+    async def async_set_many(self, items, ttl=120):
+        return self.set_many(items, ttl=ttl)
 
     async def async_get_many(self, *_, **__):
         return self.get_many()
@@ -57,11 +74,17 @@ class MockS3Client:
 
     def __init__(self):
         self.upload_file = Mock(return_value="http://test.com/uploaded")
+        self.upload_fileobj = Mock(side_effect=self._upload_fileobj)
+        self.uploaded_content = {}
         self.delete_file = Mock(return_value=self.CODE_OK)
         self.get_file_size = Mock(return_value=0)
         self.get_file_info = Mock(return_value={})
         self.delete_files_async_mock = Mock(return_value=self.CODE_OK)
 
+    def _upload_fileobj(self, fileobj, filename, *_, **__):
+        self.uploaded_content[filename] = fileobj.read().decode()
+        return "http://test.com/uploaded"
+
     def get_mocks(self):
         return [attr for attr, val in self.__dict__.items() if callable(val)]
 
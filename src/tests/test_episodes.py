@@ -1,19 +1,23 @@
 import json
 import time
+import uuid
 from operator import itemgetter
 from typing import List
-from unittest.mock import patch
+from unittest.mock import patch, Mock, ANY
 
 import peewee
 import pytest
 from aiohttp import ClientResponse
+from rq.job import JobStatus
 
+import settings
 from modules.podcast.utils import EpisodeStatuses
 from modules.auth.models import User
 from modules.podcast import tasks
 
-from modules.podcast.models import Podcast, Episode
+from modules.podcast.models import Podcast, Episode, MediaFile
 from modules.youtube.exceptions import YoutubeExtractInfoError
+from modules.youtube.utils import PlaylistInfo
 from .conftest import generate_video_id, get_user_data, make_cookie
 from .mocks import MockYoutube
 
@@ -179,6 +183,9 @@ async def test_episodes__create__same_episode_in_other_podcast__ok(
     assert created_episode.title == updated_title
     assert created_episode.description == updated_description
 
+    media_file = await db_objects.get(MediaFile, source_id=mocked_youtube.video_id)
+    assert media_file.ref_count == 1
+
     assert response_messages == expected_messages
     mocked_youtube.extract_info.assert_called()
 
@@ -245,6 +252,7 @@ async def test_episodes__create__check_for_start_downloading__ok(
         tasks.download_episode,
         episode_id=created_episode.id,
         youtube_link=created_episode.watch_url,
+        job_id=f"download_episode:{created_episode.source_id}",
     )
     assert response.headers["Location"] == f"/podcasts/{podcast.id}/episodes/{created_episode.id}/"
 
@@ -254,6 +262,7 @@ async def test_episodes__delete__ok(client, db_objects, episode_data, urls, urls
     episode_data["source_id"] = f"source_{time.time_ns()}"
     episode_data["filename"] = f"fn_{time.time_ns()}"
     episode = await db_objects.create(Episode, **episode_data)
+    await db_objects.execute(MediaFile.register_query(episode.source_id, episode.file_name))
 
     url = urls_tpl.episodes_delete.format(podcast_id=podcast_id, episode_id=episode.id)
     response = await client.get(url, allow_redirects=False)
@@ -263,14 +272,13 @@ async def test_episodes__delete__ok(client, db_objects, episode_data, urls, urls
     assert response.headers["Location"] == urls_tpl.podcasts_details.format(podcast_id=podcast_id)
     with pytest.raises(peewee.DoesNotExist):
         await db_objects.get(Episode, id=episode.id)
+    with pytest.raises(peewee.DoesNotExist):
+        await db_objects.get(MediaFile, source_id=episode.source_id)
 
 
-@pytest.mark.parametrize(
-    "same_episode_status, delete_called", [("new", True), ("published", False)]
-)
+@pytest.mark.parametrize("same_episode_status", ["new", "published"])
 async def test_episodes__delete__same_episode_exists__ok(
     same_episode_status,
-    delete_called,
     client,
     db_objects,
     podcast,
@@ -293,9 +301,15 @@ async def test_episodes__delete__same_episode_exists__ok(
     another_podcast = await db_objects.create(Podcast, **podcast_data)
     episode_data.update({"podcast_id": another_podcast.id, "status": same_episode_status})
     await db_objects.create(Episode, **episode_data)
+    await db_objects.execute(
+        MediaFile.register_query(episode.source_id, episode.file_name, count=2)
+    )
     url = urls_tpl.episodes_delete.format(podcast_id=podcast.id, episode_id=episode.id)
     response = await client.get(url, allow_redirects=False)
-    assert mocked_s3.delete_files_async_mock.called is delete_called
+    # file is still referenced by the episode from another podcast (even if it isn't downloaded)
+    assert not mocked_s3.delete_files_async_mock.called
+    media_file = await db_objects.get(MediaFile, source_id=episode.source_id)
+    assert media_file.ref_count == 1
 
     response_messages = get_session_messages(response)
     expected_messages = [f"Episode for youtube ID {episode.source_id} was removed."]
@@ -305,6 +319,75 @@ async def test_episodes__delete__same_episode_exists__ok(
     assert response_messages == expected_messages
 
 
+async def test_episodes__playlist_import__ok(
+    client, db_objects, podcast, episode, urls, mocked_redis, mocked_s3
+):
+    new_video_id, uploaded_video_id = uuid.uuid4().hex[:11], uuid.uuid4().hex[:11]
+    await db_objects.execute(
+        MediaFile.store_query(
+            uploaded_video_id,
+            f"{uploaded_video_id}.mp3",
+            remote_url=f"http://test.com/{uploaded_video_id}.mp3",
+            size=1024,
+            checksum=None,
+        )
+    )
+    video_ids = [new_video_id, uploaded_video_id, episode.source_id]
+    mocked_redis.get_many.return_value = {
+        video_id: {
+            "watch_url": f"https://www.youtube.com/watch?v={video_id}",
+            "video_id": video_id,
+            "description": f"Description of {video_id}",
+            "thumbnail_url": "http://path.to-image.com",
+            "title": f"Video {video_id}",
+            "author": "Test author",
+            "length": 110,
+        }
+        for video_id in video_ids
+    }
+    with patch("rq.queue.Queue.enqueue_many") as enqueue_mock, patch(
+        "rq.job.Job.fetch_many", return_value=[None]
+    ):
+        response = await client.post(urls.playlist_import, json={"video_ids": video_ids})
+
+    assert response.status == 201
+    response_data = await response.json()
+    created_statuses = {
+        created["source_id"]: created["status"] for created in response_data["created"]
+    }
+    assert created_statuses == {new_video_id: "downloading", uploaded_video_id: "published"}
+    assert response_data["skipped"] == [episode.source_id]
+    assert response_data["failed"] == []
+
+    (job_datas,), _ = enqueue_mock.call_args
+    assert enqueue_mock.call_count == 1
+    assert [job_data.job_id for job_data in job_datas] == [f"download_episode:{new_video_id}"]
+
+    uploaded_episode = await db_objects.get(
+        Episode, podcast_id=podcast.id, source_id=uploaded_video_id
+    )
+    assert uploaded_episode.remote_url == f"http://test.com/{uploaded_video_id}.mp3"
+    assert uploaded_episode.file_name == f"{uploaded_video_id}.mp3"
+    media_file = await db_objects.get(MediaFile, source_id=new_video_id)
+    assert media_file.ref_count == 1
+
+
+async def test_episodes__playlist_import__playlist_too_big__fail(
+    client, db_objects, podcast, urls, monkeypatch
+):
+    monkeypatch.setattr(settings, "PLAYLIST_IMPORT_MAX_VIDEOS", 1)
+    entries = [Mock(video_id=generate_video_id()) for _ in range(2)]
+    playlist = PlaylistInfo(playlist_id="playlist-id", title="Playlist", entries=entries)
+    with patch("modules.podcast.views.get_playlist_info", return_value=playlist):
+        response = await client.post(
+            urls.playlist_import, json={"playlist_url": "https://www.youtube.com/playlist?list=1"}
+        )
+
+    assert response.status == 400
+    assert "max 1 per request" in (await response.json())["details"]
+    assert await db_objects.count(Episode.select().where(Episode.podcast_id == podcast.id)) == 0
+
+
 async def test_episodes__download__start_downloading__ok(client, podcast, episode, urls):
     with patch("rq.queue.Queue.enqueue") as rq_mock:
         response = await client.get(urls.episodes_download, allow_redirects=False)
@@ -314,6 +397,7 @@ async def test_episodes__download__start_downloading__ok(client, podcast, episod
             tasks.download_episode,
             episode_id=episode.id,
             youtube_link=episode.watch_url,
+            job_id=f"download_episode:{episode.source_id}",
         )
 
     response_messages = get_session_messages(response)
@@ -323,6 +407,20 @@ async def test_episodes__download__start_downloading__ok(client, podcast, episod
     assert response_messages == expected_messages
 
 
+async def test_episodes__download__job_already_queued__enqueue_skipped(
+    client, podcast, episode, urls
+):
+    queued_job = Mock(get_status=Mock(return_value=JobStatus.QUEUED))
+    with patch("rq.queue.Queue.enqueue") as rq_mock, patch(
+        "rq.job.Job.fetch", return_value=queued_job
+    ) as fetch_mock:
+        response = await client.get(urls.episodes_download, allow_redirects=False)
+        assert response.status == 302
+
+    fetch_mock.assert_called_with(f"download_episode:{episode.source_id}", connection=ANY)
+    assert not rq_mock.called
+
+
 async def test_episodes__create__mobile_redirect__ok(
     client, db_objects, podcast, episode_data, urls, mocked_youtube, mocked_s3
 ):
@@ -1,12 +1,16 @@
 import json
 import time
+from datetime import datetime
 from typing import List
+from unittest.mock import patch
 
 import peewee
 import pytest
 from aiohttp import ClientResponse
 
-from modules.podcast.models import Podcast, Episode
+import settings
+from modules.podcast import tasks
+from modules.podcast.models import Podcast, Episode, MediaFile
 
 pytestmark = pytest.mark.asyncio
 
@@ -132,6 +136,9 @@ async def test_podcasts__delete__skip_used_episode_deletion(
     episode_data["file_name"] = f"file_{source_id_2}"
     await db_objects.create(Episode, **episode_data)
 
+    await db_objects.execute(MediaFile.register_query(source_id_1, episode_1.file_name))
+    await db_objects.execute(MediaFile.register_query(source_id_2, f"file_{source_id_2}", count=2))
+
     url = urls_tpl.podcasts_delete.format(podcast_id=podcast_to_delete.id)
     response = await client.get(url, allow_redirects=False)
 
@@ -146,3 +153,73 @@ async def test_podcasts__delete__skip_used_episode_deletion(
     assert actual_call_args == expected_call_args
     assert response.status == 302
     assert response.headers["Location"] == urls_tpl.podcasts_list
+
+
+async def test_podcasts__rss_feed__ok(client, db_objects, podcast, episode_data, mocked_redis):
+    episode_data.update({"status": "published", "published_at": datetime.utcnow()})
+    episode = await db_objects.create(Episode, **episode_data)
+    podcast.rss_digest = "test-digest"
+    podcast.rss_published_at = datetime.utcnow()
+    await db_objects.update(podcast)
+
+    url = f"/rss/{podcast.publish_id}.xml"
+    response = await client.get(url)
+    assert response.status == 200
+    assert episode.title in await response.text()
+    etag = response.headers["ETag"]
+
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status == 304
+
+    response = await client.get(
+        url, headers={"If-Modified-Since": response.headers["Last-Modified"]}
+    )
+    assert response.status == 304
+
+
+async def test_podcasts__rss_feed__not_modified__not_rendered(client, db_objects, podcast):
+    podcast.rss_digest = "test-digest"
+    podcast.rss_published_at = datetime.utcnow()
+    await db_objects.update(podcast)
+
+    with patch("modules.podcast.views.render_rss_stream") as render_rss_mock:
+        response = await client.get(
+            f"/rss/{podcast.publish_id}.xml", headers={"If-None-Match": '"test-digest"'}
+        )
+
+    assert response.status == 304
+    assert response.headers["ETag"] == '"test-digest"'
+    assert not render_rss_mock.called
+
+
+async def test_podcasts__rss_feed__too_big__redirect(
+    client, db_objects, podcast, episode_data, mocked_redis, monkeypatch
+):
+    monkeypatch.setattr(settings, "RSS_WEB_MAX_ITEMS", 1)
+    for source_id in ("source-1", "source-2"):
+        episode_data.update(
+            {"source_id": source_id, "status": "published", "published_at": datetime.utcnow()}
+        )
+        await db_objects.create(Episode, **episode_data)
+
+    podcast.rss_digest = "test-digest"
+    podcast.rss_link = "https://s3.storage/rss/feed.xml"
+    await db_objects.update(podcast)
+
+    response = await client.get(f"/rss/{podcast.publish_id}.xml", allow_redirects=False)
+    assert response.status == 302
+    assert response.headers["Location"] == podcast.rss_link
+
+
+async def test_podcasts__rss_feed__not_published(client, podcast):
+    response = await client.get(f"/rss/{podcast.publish_id}.xml")
+    assert response.status == 404
+
+
+async def test_podcasts__retry_failed__ok(client, podcast, urls):
+    with patch("rq.queue.Queue.enqueue") as rq_mock:
+        response = await client.get(urls.podcasts_retry_failed, allow_redirects=False)
+        assert response.status == 302
+
+    rq_mock.assert_called_with(tasks.retry_failed_downloads, podcast.id)
+    assert response.headers["Location"] == urls.podcasts_details
@@ -1,24 +1,48 @@
-import os
-from datetime import datetime
-from unittest.mock import patch, Mock
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch, Mock, ANY
 
 import settings
 
-from modules.podcast.models import Episode
+from common.excpetions import StorageUploadError
+from common.redis import RedisClient
+from common.workdir import JobWorkDir
+from modules.podcast.models import Episode, Podcast, MediaFile
+from modules.podcast.retries import get_attempts_history
 from modules.podcast.tasks import (
     generate_rss,
+    generate_rss_batch,
+    regenerate_rss,
     download_episode,
+    fetch_episode,
+    prepare_episode,
+    publish_episode,
+    feed_episode,
+    get_stage_timings,
+    retry_failed_downloads,
+    schedule_rss_generation,
+    get_rss_attempts_key,
+    get_rss_pending_key,
+    get_download_lock_key,
+    get_episode_work_dir_name,
+    STAGE_DOWNLOAD,
+    STAGE_PREPARATION,
+    RSS_UPLOADED_COUNTER_KEY,
+    RSS_SKIPPED_COUNTER_KEY,
     EPISODE_DOWNLOADING_IGNORED,
     EPISODE_DOWNLOADING_OK,
     EPISODE_DOWNLOADING_ERROR,
+    EPISODE_DOWNLOADING_SCHEDULED,
 )
+from modules.podcast.utils import get_rss_item_key, get_rss_url, render_rss_to_spool
 from modules.youtube.exceptions import YoutubeException
 from .conftest import generate_video_id, db_allow_sync
-from .mocks import MockYoutube, MockS3Client
+from .mocks import MockYoutube, MockS3Client, MockRedisClient
 
 
 @db_allow_sync
-def test_generate_rss__ok(db_objects, podcast, episode_data, mocked_s3):
+def test_generate_rss__ok(db_objects, podcast, episode_data, mocked_s3, mocked_redis):
     new_episode_data = {
         **episode_data,
         **{"source_id": generate_video_id(), "status": "new"},
@@ -41,14 +65,14 @@ def test_generate_rss__ok(db_objects, podcast, episode_data, mocked_s3):
     }
     episode_published: Episode = Episode.create(**new_episode_data)
 
-    rss_path = generate_rss(podcast.id)
+    rss_link = generate_rss(podcast.id)
+    rss_filename = f"{podcast.publish_id}.xml"
 
-    mocked_s3.upload_file.assert_called_with(
-        rss_path, f"{podcast.publish_id}.xml", remote_path=settings.S3_BUCKET_RSS_PATH
+    mocked_s3.upload_fileobj.assert_called_with(
+        ANY, rss_filename, remote_path=settings.S3_BUCKET_RSS_PATH, object_type="rss"
     )
-
-    with open(rss_path) as file:
-        generated_rss_content = file.read()
+    assert not mocked_s3.upload_file.called
+    generated_rss_content = mocked_s3.uploaded_content[rss_filename]
 
     assert episode_published.title in generated_rss_content
     assert episode_published.description in generated_rss_content
@@ -56,12 +80,204 @@ def test_generate_rss__ok(db_objects, podcast, episode_data, mocked_s3):
 
     assert episode_new.source_id not in generated_rss_content
     assert episode_downloading.source_id not in generated_rss_content
+    assert rss_link == "http://test.com/uploaded"
+
+
+@db_allow_sync
+def test_generate_rss__item_from_cache__ok(
+    db_objects, podcast, episode_data, mocked_s3, mocked_redis: MockRedisClient
+):
+    new_episode_data = {
+        **episode_data,
+        **{"status": "published", "published_at": datetime.utcnow()},
+    }
+    episode_cached: Episode = Episode.create(**new_episode_data)
+    new_episode_data.update({"source_id": generate_video_id(), "title": "changed-episode"})
+    episode_changed: Episode = Episode.create(**new_episode_data)
+
+    cached_key = get_rss_item_key(episode_cached)
+    mocked_redis.get_many.return_value = {
+        cached_key: {"item_key": cached_key, "content": "<item>cached-item</item>"}
+    }
+    generate_rss(podcast.id)
+    generated_rss_content = mocked_s3.uploaded_content[f"{podcast.publish_id}.xml"]
+
+    assert "<item>cached-item</item>" in generated_rss_content
+    assert episode_changed.title in generated_rss_content
+
+    (rendered_items,), _ = mocked_redis.set_many.call_args
+    assert list(rendered_items.keys()) == [get_rss_item_key(episode_changed)]
+
+
+@patch("modules.podcast.tasks.settings.RSS_REGENERATION_DELAY", 10)
+def test_schedule_rss_generation__coalesced(mocked_redis: MockRedisClient):
+    rq_queue = Mock()
+    mocked_redis.set_nx.side_effect = [True, False, False, True]
+
+    results = [schedule_rss_generation(rq_queue, 1) for _ in range(3)]
+    results.append(schedule_rss_generation(rq_queue, 1, 2))
+
+    assert results == [[1], [], [], [2]]
+    rq_queue.enqueue_in.assert_any_call(timedelta(seconds=10), generate_rss_batch, [1])
+    rq_queue.enqueue_in.assert_called_with(timedelta(seconds=10), generate_rss_batch, [2])
+    assert rq_queue.enqueue_in.call_count == 2
+    assert not rq_queue.enqueue.called
+
+
+@db_allow_sync
+def test_generate_rss__content_not_changed__upload_skipped(
+    db_objects, podcast, episode_data, mocked_s3, mocked_redis: MockRedisClient
+):
+    Episode.create(**{**episode_data, "status": "published", "published_at": datetime.utcnow()})
+
+    rss_link = generate_rss(podcast.id)
+    podcast = Podcast.get_by_id(podcast.id)
+    assert mocked_s3.upload_fileobj.call_count == 1
+    spool, digest = render_rss_to_spool(podcast)
+    spool.close()
+    assert podcast.rss_digest == digest
+    mocked_redis.incr.assert_called_with(RSS_UPLOADED_COUNTER_KEY)
+
+    assert generate_rss(podcast.id) == rss_link
+    assert mocked_s3.upload_fileobj.call_count == 1
+    mocked_redis.incr.assert_called_with(RSS_SKIPPED_COUNTER_KEY)
+
+
+@db_allow_sync
+def test_generate_rss__archive_pages__ok(
+    db_objects, podcast, episode_data, mocked_s3, mocked_redis: MockRedisClient
+):
+    podcast.rss_max_items = 2
+    podcast.save()
+    for index in range(5):
+        source_id = generate_video_id()
+        Episode.create(
+            **{
+                **episode_data,
+                "source_id": source_id,
+                "title": f"episode_{index}_{source_id}",
+                "status": "published",
+                "published_at": datetime(2020, 1, index + 1),
+            }
+        )
+
+    generate_rss(podcast.id)
+    main_feed = mocked_s3.uploaded_content[f"{podcast.publish_id}.xml"]
+    archive_page_1 = mocked_s3.uploaded_content[f"{podcast.publish_id}-archive-1.xml"]
+    archive_page_2 = mocked_s3.uploaded_content[f"{podcast.publish_id}-archive-2.xml"]
+
+    assert main_feed.count("<item>") == 2
+    assert "episode_4_" in main_feed and "episode_3_" in main_feed
+    assert f'rel="prev-archive" href="{get_rss_url(podcast, page=2)}"' in main_feed
+
+    assert archive_page_1.count("<item>") == 2
+    assert "episode_0_" in archive_page_1 and "episode_1_" in archive_page_1
+    assert "<fh:archive/>" in archive_page_1
+    assert "prev-archive" not in archive_page_1
+
+    assert archive_page_2.count("<item>") == 1
+    assert "episode_2_" in archive_page_2
+    assert f'rel="prev-archive" href="{get_rss_url(podcast, page=1)}"' in archive_page_2
+    assert f'rel="current" href="{get_rss_url(podcast)}"' in archive_page_2
+
+    mocked_s3.upload_fileobj.reset_mock()
+    generate_rss(podcast.id)
+    assert not mocked_s3.upload_fileobj.called
+
+
+@db_allow_sync
+def test_generate_rss__pending_marker_removed(db_objects, podcast, mocked_s3, mocked_redis):
+    generate_rss(podcast.id)
+    mocked_redis.delete.assert_called_with(get_rss_pending_key(podcast.id))
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks._publish_rss")
+def test_generate_rss_batch__ok(
+    publish_rss_mock, db_objects, podcast, podcast_data, mocked_s3, mocked_redis
+):
+    another_podcast = Podcast.create(**{**podcast_data, "publish_id": str(time.time())})
+    publish_rss_mock.side_effect = lambda podcast, storage: f"url_{podcast.id}"
+
+    result = generate_rss_batch([podcast.id, another_podcast.id])
+
+    assert result == {
+        podcast.id: f"url_{podcast.id}",
+        another_podcast.id: f"url_{another_podcast.id}",
+    }
+    mocked_redis.delete.assert_any_call(
+        get_rss_pending_key(podcast.id), get_rss_pending_key(another_podcast.id)
+    )
+    mocked_redis.delete.assert_called_with(
+        get_rss_attempts_key(podcast.id), get_rss_attempts_key(another_podcast.id)
+    )
+    storages = {call.args[1] for call in publish_rss_mock.call_args_list}
+    assert storages == {mocked_s3}
 
-    os.remove(rss_path)
+
+@db_allow_sync
+@patch("modules.podcast.tasks.rq.get_current_job")
+@patch("modules.podcast.tasks._publish_rss")
+def test_generate_rss_batch__upload_failed__others_published(
+    publish_rss_mock, get_current_job_mock, db_objects, podcast, podcast_data, mocked_redis
+):
+    broken_podcast = Podcast.create(**{**podcast_data, "publish_id": str(time.time())})
+
+    def publish_rss(podcast, _):
+        if podcast.id == broken_podcast.id:
+            raise StorageUploadError("Oops")
+        return f"url_{podcast.id}"
+
+    publish_rss_mock.side_effect = publish_rss
+    get_current_job_mock.return_value = Mock(origin=settings.RQ_QUEUE_RSS)
+    mocked_redis.incr.return_value = 1
+    with patch("modules.podcast.tasks.schedule_rss_generation") as schedule_mock:
+        result = generate_rss_batch([broken_podcast.id, podcast.id])
+
+    assert result == {podcast.id: f"url_{podcast.id}", broken_podcast.id: None}
+    schedule_mock.assert_called_once_with(ANY, broken_podcast.id)
+    mocked_redis.incr.assert_called_once_with(get_rss_attempts_key(broken_podcast.id))
+    mocked_redis.delete.assert_called_with(get_rss_attempts_key(podcast.id))
 
 
 @db_allow_sync
-@patch("modules.podcast.tasks.podcast_utils.render_rss_to_file")
+@patch("modules.podcast.tasks.settings.RSS_MAX_RETRIES", 3)
+@patch("modules.podcast.tasks.rq.get_current_job")
+@patch("modules.podcast.tasks._publish_rss")
+def test_generate_rss_batch__retries_exhausted__not_scheduled(
+    publish_rss_mock, get_current_job_mock, db_objects, podcast, mocked_redis
+):
+    publish_rss_mock.side_effect = StorageUploadError("Oops")
+    get_current_job_mock.return_value = Mock(origin=settings.RQ_QUEUE_RSS)
+    mocked_redis.incr.return_value = 4
+    with patch("modules.podcast.tasks.schedule_rss_generation") as schedule_mock:
+        result = generate_rss_batch([podcast.id])
+
+    assert result == {podcast.id: None}
+    assert not schedule_mock.called
+    mocked_redis.delete.assert_called_with(get_rss_attempts_key(podcast.id))
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.generate_rss")
+def test_regenerate_rss__summary__ok(generate_rss_mock, db_objects, podcast, podcast_data):
+    broken_podcast = Podcast.create(**{**podcast_data, "publish_id": str(time.time())})
+
+    def generate_rss(podcast_id):
+        if podcast_id == broken_podcast.id:
+            raise StorageUploadError("Oops")
+
+    generate_rss_mock.side_effect = generate_rss
+
+    summary = regenerate_rss()
+
+    assert podcast.id in summary["timings"]
+    assert broken_podcast.id not in summary["timings"]
+    assert broken_podcast.id in summary["failures"]
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.podcast_utils.render_rss_stream")
 def test_download_sound__episode_downloaded__file_correct__ignore_downloading__ok(
     generate_rss_mock,
     db_objects,
@@ -80,22 +296,30 @@ def test_download_sound__episode_downloaded__file_correct__ignore_downloading__o
         },
     }
     episode: Episode = Episode.create(**new_episode_data)
-    mocked_s3.get_file_size.return_value = episode.file_size
-    generate_rss_mock.return_value = f"file_{episode.source_id}.mp3"
+    MediaFile.store_query(
+        episode.source_id,
+        episode.file_name,
+        remote_url="http://test.com/uploaded",
+        size=episode.file_size,
+        checksum=None,
+    ).execute()
+    generate_rss_mock.return_value = iter(["<rss></rss>"])
     result = download_episode(episode.watch_url, episode.id)
 
     with db_objects.allow_sync():
         updated_episode: Episode = Episode.select().where(Episode.id == episode.id).first()
 
-    generate_rss_mock.assert_called_with(episode.podcast_id)
+    (rss_podcast,), _ = generate_rss_mock.call_args
+    assert rss_podcast.id == episode.podcast_id
     assert result == EPISODE_DOWNLOADING_IGNORED
     assert not mocked_youtube.download.called
+    assert not mocked_s3.get_file_size.called
     assert updated_episode.status == "published"
     assert updated_episode.published_at == updated_episode.created_at
 
 
 @db_allow_sync
-@patch("modules.podcast.tasks.podcast_utils.render_rss_to_file")
+@patch("modules.podcast.tasks.podcast_utils.render_rss_stream")
 @patch("modules.podcast.tasks.youtube_utils.download_audio")
 def test_download_sound__episode_new__correct_downloading(
     download_audio_mock,
@@ -119,23 +343,32 @@ def test_download_sound__episode_new__correct_downloading(
     episode: Episode = Episode.create(**new_episode_data)
 
     download_audio_mock.return_value = episode.file_name
-    generate_rss_mock.return_value = f"file_{episode.source_id}.mp3"
+    generate_rss_mock.return_value = iter(["<rss></rss>"])
     result = download_episode(episode.watch_url, episode.id)
 
     with db_objects.allow_sync():
         updated_episode: Episode = Episode.select().where(Episode.id == episode.id).first()
 
-    generate_rss_mock.assert_called_with(episode.podcast_id)
-    download_audio_mock.assert_called_with(episode.watch_url, episode.file_name)
-    mocked_ffmpeg.assert_called_with(episode.file_name)
+    (rss_podcast,), _ = generate_rss_mock.call_args
+    assert rss_podcast.id == episode.podcast_id
+    work_dir = JobWorkDir(get_episode_work_dir_name(episode.source_id))
+    download_audio_mock.assert_called_with(
+        episode.watch_url, episode.file_name, dst_dir=work_dir.path
+    )
+    mocked_ffmpeg.assert_called_with(episode.file_name, src_dir=work_dir.path)
 
     assert result == EPISODE_DOWNLOADING_OK
     assert updated_episode.status == "published"
     assert updated_episode.published_at == updated_episode.created_at
 
+    media_file = MediaFile.get(MediaFile.source_id == episode.source_id)
+    assert media_file.file_name == episode.file_name
+    assert media_file.remote_url == updated_episode.remote_url
+    assert media_file.ref_count == 1
+
 
 @db_allow_sync
-@patch("modules.podcast.tasks.podcast_utils.render_rss_to_file")
+@patch("modules.podcast.tasks.podcast_utils.render_rss_stream")
 @patch("modules.podcast.tasks.youtube_utils.download_audio")
 def test_download_sound__episode_downloaded__file_incorrect__reload(
     download_audio_mock,
@@ -159,16 +392,20 @@ def test_download_sound__episode_downloaded__file_incorrect__reload(
     episode: Episode = Episode.create(**new_episode_data)
 
     download_audio_mock.return_value = episode.file_name
-    generate_rss_mock.return_value = f"file_{episode.source_id}.mp3"
+    generate_rss_mock.return_value = iter(["<rss></rss>"])
     mocked_s3.get_file_size.return_value = 32
     result = download_episode(episode.watch_url, episode.id)
 
     with db_objects.allow_sync():
         updated_episode: Episode = Episode.select().where(Episode.id == episode.id).first()
 
-    generate_rss_mock.assert_called_with(episode.podcast_id)
-    download_audio_mock.assert_called_with(episode.watch_url, episode.file_name)
-    mocked_ffmpeg.assert_called_with(episode.file_name)
+    (rss_podcast,), _ = generate_rss_mock.call_args
+    assert rss_podcast.id == episode.podcast_id
+    work_dir = JobWorkDir(get_episode_work_dir_name(episode.source_id))
+    download_audio_mock.assert_called_with(
+        episode.watch_url, episode.file_name, dst_dir=work_dir.path
+    )
+    mocked_ffmpeg.assert_called_with(episode.file_name, src_dir=work_dir.path)
 
     assert result == EPISODE_DOWNLOADING_OK
     assert updated_episode.status == "published"
@@ -202,8 +439,307 @@ def test_download_sound__youtube_exception__download_rollback(
     with db_objects.allow_sync():
         updated_episode: Episode = Episode.select().where(Episode.id == episode.id).first()
 
-    download_audio_mock.assert_called_with(episode.watch_url, episode.file_name)
+    work_dir = JobWorkDir(get_episode_work_dir_name(episode.source_id))
+    download_audio_mock.assert_called_with(
+        episode.watch_url, episode.file_name, dst_dir=work_dir.path
+    )
 
     assert result == EPISODE_DOWNLOADING_ERROR
     assert updated_episode.status == "new"
     assert updated_episode.published_at is None
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.youtube_utils.download_audio")
+def test_download_sound__source_locked__ignore_downloading(
+    download_audio_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+    mocked_s3: MockS3Client,
+):
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    mocked_s3.get_file_size.return_value = 0
+
+    lock = RedisClient().lease_lock(get_download_lock_key(episode.source_id), ttl=10)
+    assert lock.acquire()
+    try:
+        result = download_episode(episode.watch_url, episode.id)
+    finally:
+        lock.release()
+
+    assert result == EPISODE_DOWNLOADING_IGNORED
+    assert not download_audio_mock.called
+    assert Episode.get_by_id(episode.id).status == "new"
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks._publish_audio")
+@patch("modules.podcast.tasks._prepare_audio")
+@patch("modules.podcast.tasks._fetch_audio", return_value=True)
+def test_download_sound__lease_lost__next_stages_aborted(
+    fetch_audio_mock,
+    prepare_audio_mock,
+    publish_audio_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+):
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    lock = Mock(lost=threading.Event())
+    lock.lost.set()
+    with patch.object(RedisClient, "lease_lock", return_value=lock):
+        result = download_episode(episode.watch_url, episode.id)
+
+    assert result == EPISODE_DOWNLOADING_IGNORED
+    assert fetch_audio_mock.called
+    assert not prepare_audio_mock.called
+    assert not publish_audio_mock.called
+    lock.release.assert_called_once()
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.podcast_utils.render_rss_stream")
+@patch("modules.podcast.tasks.youtube_utils.stream_audio")
+@patch("modules.podcast.tasks.youtube_utils.download_audio")
+def test_download_sound__streaming__ok(
+    download_audio_mock,
+    stream_audio_mock,
+    generate_rss_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+    mocked_s3: MockS3Client,
+    monkeypatch,
+):
+    monkeypatch.setattr(settings, "DOWNLOAD_STREAMING", True)
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    mocked_s3.get_file_size.return_value = 1024
+    stream_audio_mock.return_value = "https://s3.storage/streamed.mp3"
+    generate_rss_mock.return_value = iter(["<rss></rss>"])
+
+    result = download_episode(episode.watch_url, episode.id)
+
+    updated_episode: Episode = Episode.get_by_id(episode.id)
+    stream_audio_mock.assert_called_with(episode.watch_url, episode.file_name)
+    assert not download_audio_mock.called
+    assert result == EPISODE_DOWNLOADING_OK
+    assert updated_episode.status == "published"
+    assert updated_episode.remote_url == "https://s3.storage/streamed.mp3"
+    assert updated_episode.file_size == 1024
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.podcast_utils.render_rss_stream")
+@patch("modules.podcast.tasks.youtube_utils.download_audio")
+def test_download_sound__finished_stages_skipped(
+    download_audio_mock,
+    generate_rss_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+    mocked_s3: MockS3Client,
+    mocked_ffmpeg: Mock,
+):
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    work_dir = JobWorkDir(get_episode_work_dir_name(episode.source_id))
+    work_dir.mark_done(STAGE_DOWNLOAD, result=episode.file_name)
+    work_dir.mark_done(STAGE_PREPARATION, result=episode.file_name)
+    generate_rss_mock.return_value = iter(["<rss></rss>"])
+
+    result = download_episode(episode.watch_url, episode.id)
+
+    assert result == EPISODE_DOWNLOADING_OK
+    assert not download_audio_mock.called
+    assert not mocked_ffmpeg.called
+    mocked_s3.upload_file.assert_called_with(
+        work_dir.file_path(episode.file_name), episode.file_name, callback=ANY
+    )
+    assert not work_dir.is_done(STAGE_DOWNLOAD)
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.podcast_utils.render_rss_stream")
+@patch("modules.podcast.tasks.youtube_utils.download_audio")
+def test_download_sound__stages_done_for_another_file__rerun(
+    download_audio_mock,
+    generate_rss_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+    mocked_s3: MockS3Client,
+    mocked_ffmpeg: Mock,
+):
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    work_dir = JobWorkDir(get_episode_work_dir_name(episode.source_id))
+    work_dir.mark_done(STAGE_DOWNLOAD, result=f"another_{episode.file_name}")
+    work_dir.mark_done(STAGE_PREPARATION, result=f"another_{episode.file_name}")
+    generate_rss_mock.return_value = iter(["<rss></rss>"])
+
+    result = download_episode(episode.watch_url, episode.id)
+
+    assert result == EPISODE_DOWNLOADING_OK
+    download_audio_mock.assert_called_with(
+        episode.watch_url, episode.file_name, dst_dir=work_dir.path
+    )
+    mocked_ffmpeg.assert_called_with(episode.file_name, src_dir=work_dir.path)
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.queues.get_queue")
+@patch("modules.podcast.tasks.rq.get_current_job")
+@patch("modules.podcast.tasks.youtube_utils.download_audio")
+def test_download_sound__pipeline__stages_chained(
+    download_audio_mock,
+    get_current_job_mock,
+    get_queue_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+    mocked_s3: MockS3Client,
+    mocked_ffmpeg: Mock,
+    monkeypatch,
+):
+    monkeypatch.setattr(settings, "DOWNLOAD_PIPELINE", True)
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    mocked_s3.get_file_size.return_value = 0
+    rq_queue = get_queue_mock.return_value
+
+    result = download_episode(episode.watch_url, episode.id)
+
+    assert result == EPISODE_DOWNLOADING_SCHEDULED
+    assert not download_audio_mock.called
+    for stage_task in (fetch_episode, prepare_episode, publish_episode, feed_episode):
+        (task, artefact), kwargs = rq_queue.enqueue.call_args
+        assert task == stage_task
+        assert kwargs["job_id"] == f"{stage_task.__name__}:{episode.source_id}"
+        assert task(artefact) == EPISODE_DOWNLOADING_OK
+
+    work_dir = JobWorkDir(get_episode_work_dir_name(episode.source_id))
+    download_audio_mock.assert_called_with(
+        episode.watch_url, episode.file_name, dst_dir=work_dir.path
+    )
+    mocked_ffmpeg.assert_called_with(episode.file_name, src_dir=work_dir.path)
+    assert artefact["remote_url"] == "http://test.com/uploaded"
+
+    updated_episode: Episode = Episode.get_by_id(episode.id)
+    assert updated_episode.status == "published"
+    assert updated_episode.remote_url == "http://test.com/uploaded"
+
+    timings = get_stage_timings(episode.source_id)
+    for stage in ("download", "preparation", "uploading", "feed", "preparation_wait"):
+        assert stage in timings
+
+    # stage of duplicated pipeline (for the same source) doesn't touch already published file
+    assert publish_episode(artefact) == EPISODE_DOWNLOADING_IGNORED
+    assert Episode.get_by_id(episode.id).status == "published"
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.queues.get_queue")
+@patch("modules.podcast.tasks.rq.get_current_job")
+@patch("modules.podcast.tasks.youtube_utils.download_audio")
+def test_download_sound__transient_error__retry_scheduled(
+    download_audio_mock,
+    get_current_job_mock,
+    get_queue_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+    mocked_s3: MockS3Client,
+):
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    current_job = get_current_job_mock.return_value
+    current_job.id = f"download_episode:{episode.source_id}:retry:download:1"
+    current_job.meta = {"attempts": {"download": 1}}
+    current_job.args = ()
+    current_job.kwargs = {"youtube_link": episode.watch_url, "episode_id": episode.id}
+    download_audio_mock.side_effect = YoutubeException("HTTP Error 503: Service Unavailable")
+
+    result = download_episode(episode.watch_url, episode.id)
+
+    assert result == EPISODE_DOWNLOADING_ERROR
+    (delay, func), kwargs = get_queue_mock.return_value.enqueue_in.call_args
+    assert func == current_job.func
+    assert kwargs == {
+        "job_id": f"download_episode:{episode.source_id}:retry:download:2",
+        "meta": {"attempts": {"download": 2}},
+        "youtube_link": episode.watch_url,
+        "episode_id": episode.id,
+    }
+    assert Episode.get_by_id(episode.id).status == "downloading"
+    last_attempt = get_attempts_history(episode.source_id)[-1]
+    assert last_attempt["attempt"] == 2
+    assert last_attempt["error_kind"] == "transient"
+    assert last_attempt["retry_in"] == round(delay.total_seconds(), 1)
+
+
+@db_allow_sync
+@patch("modules.podcast.tasks.queues.get_queue")
+@patch("modules.podcast.tasks.rq.get_current_job")
+@patch("modules.podcast.tasks.youtube_utils.download_audio")
+def test_download_sound__permanent_error__retry_skipped(
+    download_audio_mock,
+    get_current_job_mock,
+    get_queue_mock,
+    db_objects,
+    podcast,
+    episode_data,
+    mocked_youtube: MockYoutube,
+    mocked_s3: MockS3Client,
+):
+    episode: Episode = Episode.create(
+        **{**episode_data, "status": "new", "source_id": mocked_youtube.video_id}
+    )
+    get_current_job_mock.return_value.meta = {}
+    download_audio_mock.side_effect = YoutubeException("Video unavailable")
+
+    result = download_episode(episode.watch_url, episode.id)
+
+    assert result == EPISODE_DOWNLOADING_ERROR
+    assert not get_queue_mock.return_value.enqueue_in.called
+    assert Episode.get_by_id(episode.id).status == "new"
+    assert get_attempts_history(episode.source_id)[-1]["error_kind"] == "permanent"
+
+
+@db_allow_sync
+@patch("rq.queue.Queue.enqueue")
+def test_retry_failed_downloads__failed_episodes_enqueued(
+    rq_mock, db_objects, podcast, episode_data
+):
+    failed_episode: Episode = Episode.create(
+        **{**episode_data, "status": "error", "source_id": generate_video_id()}
+    )
+    Episode.create(**{**episode_data, "status": "new", "source_id": generate_video_id()})
+
+    result = retry_failed_downloads(podcast.id)
+
+    assert result == [failed_episode.id]
+    rq_mock.assert_called_once_with(
+        download_episode,
+        youtube_link=failed_episode.watch_url,
+        episode_id=failed_episode.id,
+        job_id=f"download_episode:{failed_episode.source_id}",
+    )
+    assert Episode.get_by_id(failed_episode.id).status == "downloading"
@@ -0,0 +1,25 @@
+import io
+
+from tests.benchmarks.rss import FakeS3Storage, compare_results
+
+
+def test_compare_results__regression_found():
+    baseline = {
+        "generate_rss[10]": {"duration": 1.0, "peak_memory": 1000, "bytes_written": 10},
+        "generate_rss[100]": {"duration": 2.0, "peak_memory": 1000, "bytes_written": 10},
+    }
+    results = {
+        "generate_rss[10]": {"duration": 1.1, "peak_memory": 1000, "bytes_written": 10},
+        "generate_rss[100]": {"duration": 2.0, "peak_memory": 1500, "bytes_written": 10},
+        "generate_rss[1000]": {"duration": 5.0, "peak_memory": 1000, "bytes_written": 10},
+    }
+    regressions = compare_results(results, baseline, threshold=0.2)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("generate_rss[100] peak_memory")
+
+
+def test_fake_s3_storage__bytes_counted():
+    storage = FakeS3Storage()
+    result_url = storage.upload_fileobj(io.BytesIO(b"x" * 100_000), "test.xml")
+    assert result_url == "http://fake-s3.local/test.xml"
+    assert storage.bytes_written == 100_000
@@ -0,0 +1,82 @@
+import asyncio
+from unittest.mock import Mock
+
+from common.cache import AsyncLRUCache, SingleFlight
+
+
+def test_lru_cache__bounded():
+    cache = AsyncLRUCache(max_size=2)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    assert cache.get("first") == 1
+
+    cache.set("third", 3)
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") == 1
+
+
+def test_lru_cache__outdated_version():
+    cache = AsyncLRUCache(max_size=2)
+    cache.set("feed", "content", version="v1")
+    assert cache.get("feed", version="v1") == "content"
+    assert cache.get("feed", version="v2") is None
+
+
+def test_lru_cache__concurrent_misses__single_creation():
+    cache = AsyncLRUCache(max_size=2)
+    factory_mock = Mock(return_value="content")
+
+    async def factory():
+        await asyncio.sleep(0.01)
+        return factory_mock()
+
+    async def run():
+        return await asyncio.gather(
+            *[cache.get_or_create("feed", factory, version="v1") for _ in range(5)]
+        )
+
+    assert asyncio.run(run()) == ["content"] * 5
+    assert factory_mock.call_count == 1
+
+
+def test_single_flight__failure_shared():
+    single_flight = SingleFlight()
+    factory_mock = Mock(side_effect=RuntimeError("failed"))
+
+    async def factory():
+        await asyncio.sleep(0.01)
+        return factory_mock()
+
+    async def run():
+        return await asyncio.gather(
+            *[single_flight.run("video", factory) for _ in range(3)], return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert [str(result) for result in results] == ["failed"] * 3
+    assert factory_mock.call_count == 1
+    assert len(single_flight) == 0
+
+
+def test_single_flight__first_caller_cancelled__others_get_result():
+    single_flight = SingleFlight()
+    factory_mock = Mock(return_value="content")
+
+    async def factory():
+        await asyncio.sleep(0.02)
+        return factory_mock()
+
+    async def run():
+        first = asyncio.ensure_future(single_flight.run("feed", factory))
+        await asyncio.sleep(0)
+        others = [asyncio.ensure_future(single_flight.run("feed", factory)) for _ in range(2)]
+        await asyncio.sleep(0)
+        first.cancel()
+        return first, await asyncio.gather(*others)
+
+    first, results = asyncio.run(run())
+    assert first.cancelled()
+    assert results == ["content"] * 2
+    assert factory_mock.call_count == 1
+    assert len(single_flight) == 0
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+from common.executors import BoundedExecutor, get_executors_metrics
+
+
+def test_bounded_executor__queue_depth_and_wait_time():
+    executor = BoundedExecutor("test", max_workers=1)
+    release = threading.Event()
+    metrics = {}
+
+    async def run():
+        blocked = asyncio.ensure_future(executor.run(release.wait, 1))
+        queued = [asyncio.ensure_future(executor.run(sum, [1, 2])) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        metrics.update(executor.get_metrics())
+        release.set()
+        return await asyncio.gather(blocked, *queued)
+
+    try:
+        assert asyncio.run(run()) == [True, 3, 3]
+    finally:
+        executor.shutdown()
+
+    assert metrics["queue_depth"] == 2
+    assert metrics["running"] == 1
+    final_metrics = executor.get_metrics()
+    assert final_metrics["queue_depth"] == 0
+    assert final_metrics["completed"] == 3
+    assert final_metrics["wait_time_max"] >= 0.05
+
+
+def test_bounded_executor__cancelled_before_start__left_queue():
+    executor = BoundedExecutor("test", max_workers=1)
+    release = threading.Event()
+
+    async def run():
+        blocked = asyncio.ensure_future(executor.run(release.wait, 1))
+        queued = asyncio.ensure_future(executor.run(sum, [1, 2]))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        return await blocked
+
+    try:
+        assert asyncio.run(run()) is True
+    finally:
+        executor.shutdown()
+
+    assert executor.get_metrics()["queue_depth"] == 0
+    assert executor.get_metrics()["completed"] == 1
+
+
+def test_get_executors_metrics__all_configured():
+    metrics = get_executors_metrics()
+    assert set(metrics) == {"extraction", "storage", "queue", "redis", "render"}
+    assert all(executor_metrics["max_workers"] > 0 for executor_metrics in metrics.values())
@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import Counter
+from unittest.mock import MagicMock, Mock, patch
+
+from rq import Worker
+
+import settings
+from common import worker as worker_module
+from common.worker import ConcurrentWorker, WeightedWorker, parse_weighted_queues, stage_slot
+from modules.podcast import tasks
+from modules.podcast.queues import get_download_queue_name, route_task
+
+
+def test_get_download_queue_name__by_episode_length():
+    assert get_download_queue_name(10 * 60) == settings.RQ_QUEUE_DOWNLOADS
+    assert get_download_queue_name(3 * 60 * 60) == settings.RQ_QUEUE_LONG_DOWNLOADS
+    assert get_download_queue_name(None) == settings.RQ_QUEUE_LONG_DOWNLOADS
+
+
+def test_route_task():
+    assert route_task(tasks.generate_rss) == settings.RQ_QUEUE_RSS
+    assert route_task(tasks.generate_rss_batch) == settings.RQ_QUEUE_RSS
+    assert route_task(tasks.regenerate_rss) == settings.RQ_QUEUE_MAINTENANCE
+    assert route_task(tasks.download_episode) == settings.RQ_QUEUE_LONG_DOWNLOADS
+    assert route_task(tasks.fetch_episode) == settings.RQ_QUEUE_FETCH
+    assert route_task(tasks.prepare_episode) == settings.RQ_QUEUE_PREPARATION
+    assert route_task(tasks.publish_episode) == settings.RQ_QUEUE_PUBLISH
+    assert route_task(tasks.feed_episode) == settings.RQ_QUEUE_FEED
+
+
+def test_parse_weighted_queues():
+    weighted_queues = parse_weighted_queues(["podcast_rss:5", " youtube_downloads:2", "other", ""])
+    assert weighted_queues == {"podcast_rss": 5, "youtube_downloads": 2, "other": 1}
+
+
+def test_weighted_worker__reorder_queues__weighted():
+    worker = WeightedWorker.__new__(WeightedWorker)
+    rss_queue, long_queue = Mock(), Mock()
+    rss_queue.name, long_queue.name = "rss", "long"
+    worker.queues = [long_queue, rss_queue]
+    worker.weights = {"rss": 9, "long": 1}
+
+    first_queues = Counter()
+    for _ in range(1000):
+        worker.reorder_queues(reference_queue=None)
+        first_queues[worker._ordered_queues[0].name] += 1
+
+    assert first_queues["rss"] > first_queues["long"] > 0
+
+
+@patch.dict(worker_module.settings.WORKER_STAGE_CONCURRENCY, {"test_stage": 2})
+def test_stage_slot__concurrency_limited():
+    running, max_running = [], []
+    lock = threading.Lock()
+
+    def perform_stage():
+        with stage_slot("test_stage"):
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=perform_stage) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(max_running) == 2
+
+
+def _concurrent_worker(concurrency: int) -> ConcurrentWorker:
+    worker = ConcurrentWorker.__new__(ConcurrentWorker)
+    worker._slots = threading.BoundedSemaphore(concurrency)
+    worker._stop_requested = False
+    worker.name = "test-worker"
+    worker.redis_worker_namespace_prefix = "rq:worker:"
+    worker.heartbeat = Mock()
+    worker.connection = MagicMock()
+    worker.job_monitoring_interval = 30
+    worker._running_jobs = {}
+    worker._running_jobs_lock = threading.Lock()
+    return worker
+
+
+@patch.object(WeightedWorker, "dequeue_job_and_maintain_ttl", return_value=None)
+def test_concurrent_worker__dequeue__slot_released_without_job(mocked_dequeue):
+    worker = _concurrent_worker(concurrency=1)
+    assert worker.dequeue_job_and_maintain_ttl(timeout=1) is None
+    assert worker.dequeue_job_and_maintain_ttl(timeout=1) is None
+    assert mocked_dequeue.call_count == 2
+
+
+@patch.object(WeightedWorker, "dequeue_job_and_maintain_ttl")
+def test_concurrent_worker__dequeue__waiting_for_free_slot(mocked_dequeue):
+    job, queue = Mock(), Mock()
+    mocked_dequeue.return_value = (job, queue)
+    worker = _concurrent_worker(concurrency=1)
+    assert worker.dequeue_job_and_maintain_ttl(timeout=1) == (job, queue)
+
+    # the only slot is busy: worker doesn't dequeue the next job until stop
+    worker._stop_requested = True
+    with patch.object(worker_module, "SLOT_WAIT_INTERVAL", 0.01):
+        assert worker.dequeue_job_and_maintain_ttl(timeout=1) is None
+
+    assert mocked_dequeue.call_count == 1
+    worker.heartbeat.assert_called()
+
+
+@patch.object(worker_module, "database")
+def test_concurrent_worker__perform_job__slot_released(_):
+    worker = _concurrent_worker(concurrency=1)
+    worker.perform_job = Mock(side_effect=RuntimeError("Oops"))
+    worker._slots.acquire()
+
+    worker._perform_job_in_slot(Mock(), Mock())
+    assert worker._slots.acquire(blocking=False)
+
+
+@patch.object(worker_module, "database")
+def test_concurrent_worker__perform_job__heartbeat_renewed(_):
+    worker = _concurrent_worker(concurrency=1)
+    worker.job_monitoring_interval = 0.01
+    worker.connection.pipeline.return_value.__enter__.return_value.execute.return_value = [0, 1]
+    worker.perform_job = Mock(side_effect=lambda *_: time.sleep(0.1))
+    job = Mock()
+    worker._slots.acquire()
+
+    worker._perform_job_in_slot(job, Mock())
+    assert job.heartbeat.call_count > 1
+    assert job.heartbeat.call_args.kwargs["xx"] is True
+    heartbeat_calls = job.heartbeat.call_count
+
+    time.sleep(0.05)
+    assert job.heartbeat.call_count == heartbeat_calls
+
+
+@patch.object(Worker, "set_current_job_id")
+def test_concurrent_worker__set_current_job_id__running_job_kept(mocked_set_job_id):
+    worker = _concurrent_worker(concurrency=2)
+    thread = threading.Thread(target=worker.set_current_job_id, args=("job-1",))
+    thread.start()
+    thread.join()
+    worker.set_current_job_id("job-2")
+
+    worker.set_current_job_id(None)
+    mocked_set_job_id.assert_called_with("job-1", pipeline=None)
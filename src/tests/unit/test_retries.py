@@ -0,0 +1,75 @@
+import socket
+from unittest.mock import patch
+
+import pytest
+import yt_dlp
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from common.excpetions import NotEnoughScratchSpaceError
+from modules.podcast import retries
+from modules.podcast.retries import ERROR_PERMANENT, ERROR_TRANSIENT, RetryPolicy
+from modules.youtube.exceptions import YoutubeException, FFMPegPreparationError
+from tests.mocks import MockRedisClient
+
+
+def _client_error(code: str, status_code: int) -> ClientError:
+    response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status_code}}
+    return ClientError(response, "PutObject")
+
+
+def _wrapped_download_error(original_error: Exception) -> YoutubeException:
+    download_error = yt_dlp.utils.DownloadError(
+        "ERROR: unable to download", exc_info=(type(original_error), original_error, None)
+    )
+    try:
+        raise YoutubeException(download_error) from download_error
+    except YoutubeException as error:
+        return error
+
+
+@pytest.mark.parametrize(
+    "error, error_kind",
+    [
+        (ConnectionResetError("Connection reset by peer"), ERROR_TRANSIENT),
+        (NotEnoughScratchSpaceError("Not enough scratch space"), ERROR_TRANSIENT),
+        (EndpointConnectionError(endpoint_url="http://s3.test"), ERROR_TRANSIENT),
+        (_client_error("InternalError", 500), ERROR_TRANSIENT),
+        (_client_error("SlowDown", 503), ERROR_TRANSIENT),
+        (_client_error("AccessDenied", 403), ERROR_PERMANENT),
+        (S3UploadFailedError("An error occurred (SlowDown) when calling ..."), ERROR_TRANSIENT),
+        (
+            YoutubeException("ERROR: [youtube] abc: HTTP Error 429: Too Many Requests"),
+            ERROR_TRANSIENT,
+        ),
+        (YoutubeException("ERROR: [youtube] abc: Video unavailable"), ERROR_PERMANENT),
+        (_wrapped_download_error(socket.timeout("timed out")), ERROR_TRANSIENT),
+        (_wrapped_download_error(ValueError("Private video")), ERROR_PERMANENT),
+        (FFMPegPreparationError("ffmpeg failed (1): Invalid data found"), ERROR_PERMANENT),
+    ],
+)
+def test_classify_error(error, error_kind):
+    assert retries.classify_error(error) == error_kind
+
+
+def test_get_backoff_delay__exponential_with_jitter():
+    policy = RetryPolicy(max_attempts=10, base_delay=10, max_delay=100)
+    for attempt, max_delay in ((1, 10), (2, 20), (3, 40), (4, 80), (5, 100), (9, 100)):
+        delays = [retries.get_backoff_delay(attempt, policy) for _ in range(100)]
+        assert all(max_delay / 2 <= delay <= max_delay for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_record_attempt__history_appended():
+    redis_client = MockRedisClient()
+    redis_client.get.return_value = [{"stage": "download", "attempt": 1}]
+    with patch.object(retries, "RedisClient", return_value=redis_client):
+        attempt_info = retries.record_attempt(
+            "source-id", "uploading", 2, ConnectionResetError(), retry_in=12.345
+        )
+
+    assert attempt_info["error_kind"] == ERROR_TRANSIENT
+    assert attempt_info["retry_in"] == 12.3
+    (key, history), _ = redis_client.set.call_args
+    assert key == retries.get_attempts_key("source-id")
+    assert history == [{"stage": "download", "attempt": 1}, attempt_info]
@@ -0,0 +1,54 @@
+import gzip
+import io
+
+from common.storage import (
+    IterableReader,
+    StorageS3,
+    BatchedCallback,
+    gzip_chunks,
+    get_transfer_config,
+)
+
+
+def test_iterable_reader__read_by_chunks():
+    reader = IterableReader(["<rss>", b"<item/>" * 3, "</rss>"])
+    content = b""
+    while chunk := reader.read(4):
+        content += chunk
+
+    assert content == b"<rss><item/><item/><item/></rss>"
+
+
+def test_gzip_chunks__decompressed_content_equal():
+    source = b"<item>episode</item>" * 1000
+    compressed = b"".join(gzip_chunks(io.BytesIO(source), chunk_size=128))
+    assert gzip.decompress(compressed) == source
+
+
+def test_extra_args__by_object_type():
+    audio_args = StorageS3._get_extra_args("episode.mp3", object_type="audio")
+    assert audio_args["ContentType"] == "audio/mpeg"
+    assert "immutable" in audio_args["CacheControl"]
+    assert "ContentEncoding" not in audio_args
+
+    rss_args = StorageS3._get_extra_args("podcast.xml", object_type="rss")
+    assert rss_args["ContentEncoding"] == "gzip"
+    assert rss_args["CacheControl"] == "public, max-age=300"
+
+
+def test_transfer_config__overrides():
+    transfer_config = get_transfer_config(max_concurrency=2, max_bandwidth=1024)
+    assert transfer_config.max_concurrency == 2
+    assert transfer_config.max_bandwidth == 1024
+    assert transfer_config.multipart_chunksize == 8 * 1024 * 1024
+
+
+def test_batched_callback__accumulated():
+    calls = []
+    callback = BatchedCallback(calls.append, min_bytes=100)
+    for _ in range(25):
+        callback(10)
+
+    assert calls == [100, 100]
+    callback.flush()
+    assert calls == [100, 100, 50]
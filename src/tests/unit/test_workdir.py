@@ -0,0 +1,113 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+from common.excpetions import NotEnoughScratchSpaceError
+from common.workdir import JobWorkDir, ScratchSpace
+
+
+def test_work_dir__stages_kept_between_instances(tmp_path):
+    work_dir = JobWorkDir("episode_test", root=str(tmp_path))
+    assert not work_dir.is_done("download")
+
+    work_dir.mark_done("download")
+    work_dir.mark_done("uploading", result="http://test.com/uploaded")
+
+    restored_work_dir = JobWorkDir("episode_test", root=str(tmp_path))
+    assert restored_work_dir.is_done("download")
+    assert restored_work_dir.get_result("uploading") == "http://test.com/uploaded"
+    assert not restored_work_dir.is_done("preparation")
+
+
+def test_work_dir__broken_stages_file__stages_rerun(tmp_path):
+    work_dir = JobWorkDir("episode_test", root=str(tmp_path))
+    with open(work_dir.file_path(JobWorkDir.STAGES_FILE), "w") as fh:
+        fh.write("{broken")
+
+    assert not work_dir.is_done("download")
+
+
+def test_work_dir__cleanup(tmp_path):
+    work_dir = JobWorkDir("episode_test", root=str(tmp_path))
+    with open(work_dir.file_path("episode.mp3.part"), "wb") as fh:
+        fh.write(b"partial")
+
+    work_dir.cleanup()
+    assert not os.path.exists(work_dir.path)
+
+
+def test_scratch_space__admit__not_enough_space(tmp_path, monkeypatch):
+    monkeypatch.setattr("settings.SCRATCH_MIN_FREE_BYTES", 0)
+    scratch_space = ScratchSpace(root=str(tmp_path), jobs_root=str(tmp_path / "jobs"))
+    scratch_space.admit(1024)
+    with pytest.raises(NotEnoughScratchSpaceError):
+        scratch_space.admit(10**18)
+
+
+def test_scratch_space__sweep__orphans_removed(tmp_path):
+    scratch_space = ScratchSpace(root=str(tmp_path), jobs_root=str(tmp_path / "jobs"))
+    old_time = time.time() - 3600
+
+    orphaned_dir = scratch_space.job_dir("episode_orphaned")
+    with open(orphaned_dir.file_path("episode.mp3.part"), "wb") as fh:
+        fh.write(b"partial")
+    os.utime(orphaned_dir.file_path("episode.mp3.part"), (old_time, old_time))
+    os.utime(orphaned_dir.path, (old_time, old_time))
+
+    active_dir = scratch_space.job_dir("episode_active")
+    with open(active_dir.file_path("episode.mp3.part"), "wb") as fh:
+        fh.write(b"partial")
+    os.utime(active_dir.path, (old_time, old_time))
+
+    process_dir = tmp_path / "podcast_audio__test"
+    process_dir.mkdir()
+    (process_dir / "old.mp3").write_bytes(b"old")
+    os.utime(process_dir / "old.mp3", (old_time, old_time))
+    (process_dir / "new.mp3").write_bytes(b"new")
+
+    assert scratch_space.sweep(ttl=60) == 2
+    assert not os.path.exists(orphaned_dir.path)
+    assert os.path.exists(active_dir.file_path("episode.mp3.part"))
+    assert not (process_dir / "old.mp3").exists()
+    assert (process_dir / "new.mp3").exists()
+
+
+def test_scratch_space__sweep__empty_tmp_dirs_removed(tmp_path, monkeypatch):
+    scratch_space = ScratchSpace(root=str(tmp_path), jobs_root=str(tmp_path / "jobs"))
+    old_time = time.time() - 3600
+    dead_process = subprocess.Popen(["true"])
+    dead_process.wait()
+
+    own_dir = tmp_path / f"podcast_audio__{os.getpid()}_own"
+    orphaned_dir = tmp_path / f"podcast_rss__{dead_process.pid}_orphaned"
+    unknown_owner_dir = tmp_path / "podcast_rss__unknown"
+    for tmp_dir in (own_dir, orphaned_dir, unknown_owner_dir):
+        tmp_dir.mkdir()
+        os.utime(tmp_dir, (old_time, old_time))
+
+    used_dir = tmp_path / f"podcast_images__{dead_process.pid}_used"
+    used_dir.mkdir()
+    (used_dir / "image.png").write_bytes(b"image")
+    os.utime(used_dir, (old_time, old_time))
+    monkeypatch.setattr("settings.TMP_AUDIO_PATH", str(own_dir))
+
+    assert scratch_space.sweep(ttl=60) == 2
+    assert not orphaned_dir.exists()
+    assert not unknown_owner_dir.exists()
+    assert own_dir.exists() and os.path.getmtime(own_dir) > old_time
+    assert (used_dir / "image.png").exists()
+
+
+def test_scratch_space__sweep__dirs_of_running_processes_kept(tmp_path):
+    scratch_space = ScratchSpace(root=str(tmp_path), jobs_root=str(tmp_path / "jobs"))
+    old_time = time.time() - 3600
+    with subprocess.Popen(["sleep", "5"]) as running_process:
+        alive_dir = tmp_path / f"podcast_audio__{running_process.pid}_alive"
+        alive_dir.mkdir()
+        os.utime(alive_dir, (old_time, old_time))
+
+        assert scratch_space.sweep(ttl=60) == 0
+        assert alive_dir.exists()
+        running_process.kill()
@@ -0,0 +1,133 @@
+import asyncio
+from contextlib import contextmanager
+from unittest.mock import Mock, patch
+
+import pytest
+
+from common.redis import RedisClient
+from modules.youtube import utils as youtube_utils
+from modules.youtube.exceptions import YoutubeExtractInfoError
+from modules.youtube.utils import (
+    YoutubeInfo,
+    get_playlist_info,
+    get_youtube_info,
+    get_youtube_info_key,
+    get_youtube_infos,
+)
+
+VIDEO_ID = "dQw4w9WgXcQ"
+WATCH_URL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+YOUTUBE_INFO = YoutubeInfo(
+    watch_url=WATCH_URL,
+    video_id=VIDEO_ID,
+    description="Test description",
+    thumbnail_url="http://path.to-image.com",
+    title="Test title",
+    author="Test author",
+    length=110,
+)
+
+
+class FakeRedisClient:
+    def __init__(self):
+        self.storage = {}
+
+    async def async_get(self, key):
+        return self.storage.get(key)
+
+    async def async_set(self, key, value, ttl=120):
+        self.storage[key] = value
+
+    async def async_set_many(self, items, ttl=120):
+        self.storage.update(items)
+
+    async def async_get_many(self, keys, pkey):
+        stored_items = [self.storage[key] for key in keys if key in self.storage]
+        return {stored_item[pkey]: stored_item for stored_item in stored_items}
+
+
+@pytest.fixture
+def redis_client():
+    redis_client = FakeRedisClient()
+    with patch.object(RedisClient, "__new__", lambda *_, **__: redis_client):
+        yield redis_client
+
+
+def run_concurrently(count: int) -> list:
+    async def run():
+        return await asyncio.gather(
+            *[get_youtube_info(WATCH_URL) for _ in range(count)], return_exceptions=True
+        )
+
+    return asyncio.run(run())
+
+
+@contextmanager
+def mocked_extraction(**kwargs):
+    extract_mock = Mock(**kwargs)
+
+    async def extract(_):
+        await asyncio.sleep(0.01)
+        return extract_mock()
+
+    with patch.object(youtube_utils, "_extract_youtube_info", side_effect=extract):
+        yield extract_mock
+
+
+def test_get_youtube_info__concurrent_requests__single_extraction(redis_client):
+    with mocked_extraction(return_value=YOUTUBE_INFO) as extract_mock:
+        assert run_concurrently(3) == [YOUTUBE_INFO] * 3
+        assert run_concurrently(1) == [YOUTUBE_INFO]
+
+    assert extract_mock.call_count == 1
+    assert redis_client.storage[get_youtube_info_key(VIDEO_ID)] == YOUTUBE_INFO._asdict()
+
+
+def test_get_youtube_info__failure__negative_cached(redis_client):
+    error = YoutubeExtractInfoError("Video unavailable")
+    with mocked_extraction(side_effect=error) as extract_mock:
+        results = run_concurrently(2) + run_concurrently(1)
+
+    assert all(isinstance(result, YoutubeExtractInfoError) for result in results)
+    assert extract_mock.call_count == 1
+    assert redis_client.storage[get_youtube_info_key(VIDEO_ID)] == {
+        "video_id": VIDEO_ID,
+        "error": "Video unavailable",
+    }
+
+
+def test_get_playlist_info__videos_info_reused(redis_client):
+    playlist_details = {
+        "_type": "playlist",
+        "id": "PL-test",
+        "title": "Test playlist",
+        "entries": [
+            {
+                "id": VIDEO_ID,
+                "title": YOUTUBE_INFO.title,
+                "description": YOUTUBE_INFO.description,
+                "webpage_url": WATCH_URL,
+                "thumbnails": [{"url": YOUTUBE_INFO.thumbnail_url}],
+                "uploader": YOUTUBE_INFO.author,
+                "duration": YOUTUBE_INFO.length,
+            },
+            None,  # unavailable video
+        ],
+    }
+    ydl_mock = Mock(extract_info=Mock(return_value=playlist_details))
+    ydl_mock.__enter__ = Mock(return_value=ydl_mock)
+    ydl_mock.__exit__ = Mock(return_value=None)
+
+    async def run():
+        playlist = await get_playlist_info("https://www.youtube.com/playlist?list=PL-test")
+        return playlist, await get_youtube_infos([VIDEO_ID])
+
+    with patch.object(youtube_utils.yt_dlp, "YoutubeDL", return_value=ydl_mock), mocked_extraction(
+        return_value=None
+    ) as extract_mock:
+        playlist, youtube_infos = asyncio.run(run())
+
+    assert playlist.title == "Test playlist"
+    assert playlist.entries == [YOUTUBE_INFO]
+    assert youtube_infos == {VIDEO_ID: YOUTUBE_INFO}
+    assert not extract_mock.called
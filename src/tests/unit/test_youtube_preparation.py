@@ -0,0 +1,96 @@
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from modules.youtube.exceptions import FFMPegPreparationError
+from modules.youtube.utils import (
+    _run_ffmpeg,
+    AudioProbe,
+    choose_preparation_strategy,
+    ffmpeg_preparation,
+    get_preparation_args,
+    parse_ffmpeg_progress,
+    PREPARATION_REMUX,
+    PREPARATION_TRANSCODE,
+)
+
+
+def test_choose_preparation_strategy__mp3__remux():
+    audio_probe = AudioProbe(format_name="mp3", codec_name="mp3", duration=10.0, bit_rate=128000)
+    assert choose_preparation_strategy(audio_probe) == PREPARATION_REMUX
+
+
+def test_choose_preparation_strategy__opus__transcode():
+    audio_probe = AudioProbe(
+        format_name="matroska,webm", codec_name="opus", duration=10.0, bit_rate=128000
+    )
+    assert choose_preparation_strategy(audio_probe) == PREPARATION_TRANSCODE
+
+
+def test_choose_preparation_strategy__not_probed__transcode():
+    assert choose_preparation_strategy(None) == PREPARATION_TRANSCODE
+
+
+def test_choose_preparation_strategy__forced_by_settings():
+    audio_probe = AudioProbe(format_name="mp3", codec_name="mp3", duration=10.0, bit_rate=128000)
+    with patch("settings.FFMPEG_PREPARATION_STRATEGY", PREPARATION_TRANSCODE):
+        assert choose_preparation_strategy(audio_probe) == PREPARATION_TRANSCODE
+
+
+def test_get_preparation_args__remux__stream_copy():
+    args = get_preparation_args(PREPARATION_REMUX, "src.mp3", "dst.mp3")
+    assert args[:3] == ["ffmpeg", "-i", "src.mp3"]
+    assert "copy" in args and "-write_xing" in args
+    assert args[-1] == "dst.mp3"
+
+
+def test_parse_ffmpeg_progress():
+    assert parse_ffmpeg_progress("out_time_ms=12500000\n") == 12.5
+    assert parse_ffmpeg_progress("out_time_us=1000000") == 1.0
+    assert parse_ffmpeg_progress("out_time_ms=N/A") is None
+    assert parse_ffmpeg_progress("progress=continue") is None
+
+
+def _patched_popen(command: list):
+    real_popen = subprocess.Popen
+    return patch(
+        "modules.youtube.utils.subprocess.Popen", lambda _, **kwargs: real_popen(command, **kwargs)
+    )
+
+
+def test_run_ffmpeg__killed_by_signal__not_timeout():
+    with _patched_popen(["sh", "-c", "kill -9 $$"]):
+        with pytest.raises(FFMPegPreparationError, match=r"ffmpeg failed \(-9\)"):
+            _run_ffmpeg(["ffmpeg", "-i", "src.mp3", "dst.mp3"])
+
+
+@patch("settings.FFMPEG_TIMEOUT", 0.1)
+def test_run_ffmpeg__timeout():
+    with _patched_popen(["sleep", "5"]):
+        with pytest.raises(FFMPegPreparationError, match="ffmpeg timeout"):
+            _run_ffmpeg(["ffmpeg", "-i", "src.mp3", "dst.mp3"])
+
+
+@pytest.mark.parametrize(
+    "probe_error", [FileNotFoundError("ffprobe"), subprocess.TimeoutExpired("ffprobe", 1)]
+)
+def test_ffmpeg_preparation__probe_failed__transcode(tmp_path, probe_error):
+    (tmp_path / "episode.mp3").write_bytes(b"audio")
+
+    def run_preparation(strategy, src_path, dst_path, progress_handler=None):
+        with open(dst_path, "wb") as file:
+            file.write(b"prepared audio")
+
+    with patch("modules.youtube.utils.subprocess.run", side_effect=probe_error), patch(
+        "modules.youtube.utils.episode_process_hook"
+    ), patch(
+        "modules.youtube.utils._run_preparation", side_effect=run_preparation
+    ) as run_preparation_mock:
+        ffmpeg_preparation("episode.mp3", src_dir=str(tmp_path))
+
+    strategy, src_path, dst_path, _ = run_preparation_mock.call_args.args
+    assert strategy == PREPARATION_TRANSCODE
+    assert src_path == str(tmp_path / "episode.mp3")
+    assert (tmp_path / "episode.mp3").read_bytes() == b"prepared audio"
+    assert not (tmp_path / "tmp_episode.mp3").exists()
@@ -0,0 +1,37 @@
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from common.excpetions import StorageUploadError
+from modules.youtube.utils import parse_stream_progress, stream_audio
+
+
+def test_parse_stream_progress__total_bytes():
+    assert parse_stream_progress("stream-progress:1024:4096:NA") == (1024, 4096)
+
+
+def test_parse_stream_progress__estimated_total():
+    assert parse_stream_progress("stream-progress:1024:NA:8192.5") == (1024, 8192)
+
+
+def test_parse_stream_progress__not_progress_line():
+    assert parse_stream_progress("ERROR: Video unavailable") == (0, 0)
+
+
+def test_stream_audio__upload_failed__processes_killed():
+    real_popen = subprocess.Popen
+    commands = iter([["sh", "-c", "yes"], ["cat"]])
+
+    def popen(_, **kwargs):
+        # endless output: processes are blocked on full pipes if nobody kills them
+        return real_popen(next(commands), **kwargs)
+
+    with patch("modules.youtube.utils.subprocess.Popen", popen), patch(
+        "modules.youtube.utils.episode_process_hook"
+    ), patch("modules.youtube.utils.StorageS3") as storage_mock:
+        storage_mock.return_value.upload_fileobj.return_value = None
+        with pytest.raises(StorageUploadError):
+            stream_audio("https://www.youtube.com/watch?v=source-id", "episode.mp3")
+
+    storage_mock.return_value.delete_file.assert_not_called()
@@ -1,3 +1,5 @@
+from common.urls import url
+from common.views import ExecutorsMetricsApiView
 from modules.auth.urls import urls as auth_urls
 from modules.podcast.urls import urls as podcast_urls
 
@@ -5,4 +7,5 @@ from modules.podcast.urls import urls as podcast_urls
 urls = (
     *auth_urls,
     *podcast_urls,
+    url("/api/metrics/executors/", ExecutorsMetricsApiView, name="api_executors_metrics"),
 )